@@ -0,0 +1,273 @@
+import argparse
+import hashlib
+import os
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+GRID_RESOLUTION = 0.05 # in m, cell size of the GDOP map
+Z_RANGE = (0.2, 2.0) # in m, heights of the flight volume
+VOLUME_MARGIN = 0.3 # in m, the flight volume extends this far beyond the anchors in x and y
+GDOP_LIMIT = 5.0 # trajectories through cells with a higher GDOP are rejected
+GDOP_MAX = 1000.0 # GDOP of cells without a position fix (e.g. in the plane of coplanar anchors)
+MIN_ANCHOR_DISTANCE = 0.01 # in m, closer cells use this distance for the direction to the anchor
+CHUNK_CELLS = 1000000 # cells computed at once, bounds the memory use
+MODES = ('twr', 'tdoa')
+CACHE_DIRECTORY = str(Path(__file__).resolve().parent.parent / "setup_files" / ".gdop_cache") # independent of the working directory
+CACHE_VERSION = 1 # increase when the computation changes, older cache entries are ignored
+
+
+def gdop(anchors, points, mode='twr'):
+    """
+    Geometric dilution of precision of the position at the points, vectorized over all points
+
+    With the unit vectors u_i from the anchors to a point, the DOP is sqrt(trace(S^-1)) with
+    - TWR (ranges to every anchor): S = sum(u_i u_i^T)
+    - TDoA (range differences, unknown common offset): the position block of the pseudorange
+      geometry [u_i, 1], S = sum(u_i u_i^T) - (sum u_i)(sum u_i)^T / N
+    The 3x3 inverse is computed in closed form (cofactors), singular geometries give GDOP_MAX.
+
+    Args:
+    anchors: Array (N, 3) with the anchor positions
+    points: Array (M, 3) with the positions
+    mode: 'twr' or 'tdoa'
+
+    Returns:
+    Array (M,) with the GDOP (float32)
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown ranging mode '{mode}', choose from {', '.join(MODES)}")
+    anchors = np.asarray(anchors, dtype=np.float32)
+    points = np.asarray(points, dtype=np.float32)
+    px, py, pz = (np.ascontiguousarray(points[:, i]) for i in range(3))
+    # Unique entries of S: xx, yy, zz, xy, xz, yz and the sums of the unit vectors
+    s = np.zeros((6, len(points)), dtype=np.float32)
+    u_sum = np.zeros((3, len(points)), dtype=np.float32)
+    ux, uy, uz, r = (np.empty(len(points), dtype=np.float32) for _ in range(4))
+    product = np.empty(len(points), dtype=np.float32)
+    for anchor in anchors:
+        np.subtract(px, anchor[0], out=ux)
+        np.subtract(py, anchor[1], out=uy)
+        np.subtract(pz, anchor[2], out=uz)
+        np.multiply(ux, ux, out=r)
+        r += uy * uy
+        r += uz * uz
+        np.sqrt(r, out=r)
+        np.maximum(r, MIN_ANCHOR_DISTANCE, out=r)
+        for u in (ux, uy, uz):
+            u /= r
+        for row, (u, v) in enumerate(((ux, ux), (uy, uy), (uz, uz), (ux, uy), (ux, uz), (uy, uz))):
+            s[row] += np.multiply(u, v, out=product)
+        u_sum[0] += ux
+        u_sum[1] += uy
+        u_sum[2] += uz
+    if mode == 'tdoa':
+        n = len(anchors)
+        s -= np.stack((u_sum[0] * u_sum[0], u_sum[1] * u_sum[1], u_sum[2] * u_sum[2],
+                       u_sum[0] * u_sum[1], u_sum[0] * u_sum[2], u_sum[1] * u_sum[2])) / n
+    a, b, c, d, e, f = s
+    c11 = b * c - f * f
+    c22 = a * c - e * e
+    c33 = a * b - d * d
+    det = a * c11 - d * (d * c - f * e) + e * (d * f - b * e)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = np.sqrt((c11 + c22 + c33) / det)
+    # Relative to the scale of S, float32 rounding leaves singular geometries slightly off zero
+    result[~np.isfinite(result) | (det <= 1e-6 * (a + b + c) ** 3)] = GDOP_MAX
+    return np.minimum(result, GDOP_MAX)
+
+
+def flight_volume(anchors, resolution=GRID_RESOLUTION, z_range=Z_RANGE, margin=VOLUME_MARGIN):
+    """
+    Grid axes of the flight volume: the anchors' bounding box in x and y (plus margin), z_range in z
+
+    Returns:
+    Tuple (xs, ys, zs) with the cell centers along each axis
+    """
+    anchors = np.asarray(anchors, dtype=float)
+    low = anchors[:, :2].min(axis=0) - margin
+    high = anchors[:, :2].max(axis=0) + margin
+    axes = [low[i] + np.arange(int(np.floor((high[i] - low[i]) / resolution + 1e-9)) + 1) * resolution for i in range(2)]
+    zs = z_range[0] + np.arange(int(np.floor((z_range[1] - z_range[0]) / resolution + 1e-9)) + 1) * resolution
+    return axes[0], axes[1], zs
+
+
+class GdopMap:
+    """
+    GDOP on a regular 3D grid over the flight volume of an anchor setup
+    """
+
+    def __init__(self, values, xs, ys, zs, mode='twr'):
+        """
+        Args:
+        values: Array (len(xs), len(ys), len(zs)) with the GDOP per cell
+        xs, ys, zs: Cell centers along each axis (evenly spaced)
+        mode: Ranging mode the map was computed for
+        """
+        self.values = values
+        self.xs, self.ys, self.zs = xs, ys, zs
+        self.mode = mode
+
+    @classmethod
+    def compute(cls, anchors, resolution=GRID_RESOLUTION, z_range=Z_RANGE, mode='twr'):
+        """
+        Computes the map for the anchors, in chunks of whole z layers
+        """
+        xs, ys, zs = flight_volume(anchors, resolution, z_range)
+        values = np.empty((len(xs), len(ys), len(zs)), dtype=np.float32)
+        gx, gy = np.meshgrid(xs, ys, indexing='ij')
+        layers = max(1, CHUNK_CELLS // gx.size)
+        for k in range(0, len(zs), layers):
+            z = zs[k:k + layers]
+            points = np.column_stack((np.repeat(gx.ravel(), len(z)), np.repeat(gy.ravel(), len(z)), np.tile(z, gx.size)))
+            values[:, :, k:k + len(z)] = gdop(anchors, points, mode).reshape(len(xs), len(ys), len(z))
+        return cls(values, xs, ys, zs, mode)
+
+    def lookup(self, points):
+        """
+        GDOP of the nearest cell for every point, points outside the flight volume get GDOP_MAX
+
+        Args:
+        points: Array (M, 3) with x, y, z
+
+        Returns:
+        Array (M,) with the GDOP
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=float))
+        result = np.full(len(points), GDOP_MAX, dtype=np.float32)
+        index = list()
+        inside = np.ones(len(points), dtype=bool)
+        for axis, centers in enumerate((self.xs, self.ys, self.zs)):
+            step = centers[1] - centers[0] if len(centers) > 1 else 1.0
+            i = np.rint((points[:, axis] - centers[0]) / step).astype(np.int64)
+            inside &= (i >= 0) & (i < len(centers))
+            index.append(i)
+        result[inside] = self.values[index[0][inside], index[1][inside], index[2][inside]]
+        return result
+
+    def coverage(self, limit=GDOP_LIMIT):
+        """
+        Returns:
+        Fraction of the cells with a GDOP below the limit
+        """
+        return float(np.count_nonzero(self.values < limit) / self.values.size)
+
+    def save(self, file):
+        # Written to a temporary file first, so readers never see a partial map
+        tmp_file = str(file) + ".part"
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, values=self.values, xs=self.xs, ys=self.ys, zs=self.zs, mode=self.mode)
+        os.replace(tmp_file, file)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file) as data:
+            return cls(data['values'], data['xs'], data['ys'], data['zs'], str(data['mode']))
+
+
+def file_hash(file):
+    """
+    Returns:
+    SHA-256 of the file content (hex)
+    """
+    return hashlib.sha256(Path(file).read_bytes()).hexdigest()
+
+
+def load_gdop_map(loco_file, resolution=GRID_RESOLUTION, z_range=Z_RANGE, mode='twr', cache_directory=CACHE_DIRECTORY):
+    """
+    GDOP map of an anchor setup file, cached on disk by the file content and the grid parameters
+
+    Args:
+    loco_file: The anchor setup file (YAML)
+    resolution: Cell size in m
+    z_range: Heights (min, max) of the flight volume in m
+    mode: 'twr' or 'tdoa'
+    cache_directory: Directory of the cached maps, None to disable the cache
+
+    Returns:
+    Tuple (GdopMap, True if it was loaded from the cache)
+    """
+    key = f"{file_hash(loco_file)[:16]}_{mode}_{resolution:g}_{z_range[0]:g}_{z_range[1]:g}_v{CACHE_VERSION}"
+    cache_file = None if cache_directory is None else Path(cache_directory) / f"{key}.npz"
+    if cache_file is not None and cache_file.exists():
+        return GdopMap.load(cache_file), True
+
+    import cf_data
+    gdop_map = GdopMap.compute(cf_data.obtain_anchor_positions(loco_file), resolution, z_range, mode)
+    if cache_file is not None:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        gdop_map.save(cache_file)
+    return gdop_map, False
+
+
+def vet_trajectory(gdop_map, positions, height, limit=GDOP_LIMIT, start=None):
+    """
+    Checks a planned trajectory against the GDOP map before takeoff. The path is densified to the grid
+    resolution, so the legs between sparse setpoints (e.g. the corners of a square) are checked as well.
+
+    Args:
+    gdop_map: GdopMap of the anchor setup
+    positions: Array (N, 2+) with the planned x, y (further columns are ignored)
+    height: Flight height in m
+    limit: Highest acceptable GDOP
+    start: Position (x, y) the crazyflie flies from to the first setpoint and back to after the last one,
+           None to check the trajectory only
+
+    Returns:
+    Dictionary with 'ok', the maximal and mean GDOP along the path, the number of path points over the
+    limit (one per grid cell length), the path length over the limit in m and the first position
+    over the limit (None if none)
+    """
+    import trajectory
+    path = np.asarray(positions, dtype=float)[:, :2]
+    if start is not None:
+        start = np.asarray(start, dtype=float)[None, :2]
+        path = np.vstack((start, path, start))
+    spacing = float(gdop_map.xs[1] - gdop_map.xs[0]) if len(gdop_map.xs) > 1 else GRID_RESOLUTION
+    path, _ = trajectory.resample(path, spacing)
+    values = gdop_map.lookup(np.column_stack((path, np.full(len(path), height))))
+    over = np.flatnonzero(values > limit)
+    return {
+        'ok': len(over) == 0,
+        'gdop_max': float(values.max()),
+        'gdop_mean': float(values.mean()),
+        'over_limit': int(len(over)),
+        'over_length': float(len(over) * spacing),
+        'first_over': path[over[0]] if len(over) else None,
+    }
+
+
+# Compare the anchor setups, optionally vetting a trajectory on each
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GDOP maps of anchor setups")
+    parser.add_argument('files', nargs='+', help="anchor setup files (YAML)")
+    parser.add_argument('--resolution', type=float, default=GRID_RESOLUTION, help="in m")
+    parser.add_argument('--mode', default='twr', choices=MODES)
+    parser.add_argument('--limit', type=float, default=GDOP_LIMIT)
+    parser.add_argument('--vet', default=None, help="trajectory shape to check on every setup, e.g. circle")
+    parser.add_argument('--height', type=float, default=1.0, help="in m, flight height of the vetted trajectory")
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args(argv)
+
+    any_cached = False
+    print(f"{'setup':<32}{'cells':>12}{'time':>9}  {'median':>7}{'p95':>9}{'coverage':>10}")
+    for file in args.files:
+        start = time.perf_counter()
+        gdop_map, cached = load_gdop_map(file, args.resolution, mode=args.mode, cache_directory=None if args.no_cache else CACHE_DIRECTORY)
+        elapsed = time.perf_counter() - start
+        any_cached |= cached
+        print(f"{Path(file).name:<32}{gdop_map.values.size:>12}{elapsed:>8.2f}s{'*' if cached else ' '} "
+              f"{np.median(gdop_map.values):>7.2f}{np.percentile(gdop_map.values, 95):>9.2f}{gdop_map.coverage(args.limit):>9.1%}")
+        if args.vet:
+            import trajectory
+            result = vet_trajectory(gdop_map, trajectory.create_for_setup(args.vet, file), args.height, args.limit)
+            print(f"    {args.vet} at {args.height} m: {'ok' if result['ok'] else 'REJECTED'}, "
+                  f"GDOP max {result['gdop_max']:.2f}, mean {result['gdop_mean']:.2f}, {result['over_length']:.2f} m of the path over {args.limit}")
+    if any_cached:
+        print("* loaded from the cache")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import threading
+import time
+
+BATTERY_THRESHOLD_LOW = 2.8 # in V
+BATTERY_HYSTERESIS = 0.05 # in V
+BATTERY_DEBOUNCE = 2 # battery samples in a row below the threshold, before landing is triggered
+BATTERY_MIN_VALID = 2.0 # in V, lower readings are treated as invalid (e.g. no battery attached)
+
+
+class BatterySupervisor:
+    """
+    Event-driven low battery supervisor, fed directly from the telemetry callback.
+
+    The supervisor is pushed every fresh battery sample by `update`, so no polling thread is needed.
+    Once the battery level undercuts `threshold`, `debounce` samples in a row have to be low
+    before `land_event` is set. The low state is only left again, when the level recovers above
+    `threshold + hysteresis`, so noise around the threshold does not restart the debounce window.
+    """
+
+    def __init__(self, land_event, threshold=BATTERY_THRESHOLD_LOW, hysteresis=BATTERY_HYSTERESIS,
+                 debounce=BATTERY_DEBOUNCE, min_valid=BATTERY_MIN_VALID):
+        """
+        Args:
+        land_event: threading.Event set when the battery is low
+        threshold: Low battery threshold in V
+        hysteresis: Voltage in V the level has to recover above the threshold to clear the low state
+        debounce: Number of consecutive low samples that trigger the landing (at least 1)
+        min_valid: Readings below this voltage are ignored
+        """
+        if debounce < 1:
+            raise ValueError("The battery debounce has to be at least one sample")
+        self.land_event = land_event
+        self.threshold = threshold
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        self.min_valid = min_valid
+        self.armed = threading.Event()
+        self.triggered = False
+        self._low_since = None # log timestamp of the first low sample
+        self._low_arrival = None # perf_counter time the first low sample arrived
+        self._low_samples = 0 # consecutive low samples
+
+        # Counters
+        self.updates = 0
+        self.update_time_total = 0.0 # in s, time spent in update
+        self.update_time_max = 0.0 # in s
+        self.trigger_delay = None # in ms log time, first low sample to land_event
+        self.trigger_latency = None # in s wall time, arrival of the first low sample to land_event
+        self.trigger_battery_level = None
+
+    def arm(self):
+        """
+        Resets the supervisor and starts supervising the incoming samples
+        """
+        self.triggered = False
+        self._low_since = None
+        self._low_arrival = None
+        self._low_samples = 0
+        self.armed.set()
+
+    def disarm(self):
+        """
+        Stops supervising, incoming samples are ignored
+        """
+        self.armed.clear()
+
+    def update(self, timestamp, battery_level):
+        """
+        Processes one battery sample, called from the telemetry callback with every fresh sample
+        (not with held values repeated in faster log rows, they would count towards the debounce)
+
+        Args:
+        timestamp: Log timestamp of the sample in ms
+        battery_level: Battery level in V
+
+        Returns:
+        True if this sample triggered the landing, False otherwise
+        """
+        if not self.armed.is_set() or self.triggered:
+            return False
+        start = time.perf_counter()
+        fired = False
+
+        if battery_level < self.min_valid:
+            pass
+        elif battery_level <= self.threshold:
+            if self._low_samples == 0:
+                self._low_since = timestamp
+                self._low_arrival = start
+            self._low_samples += 1
+            if self._low_samples >= self.debounce:
+                self.land_event.set()
+                self.trigger_latency = time.perf_counter() - self._low_arrival
+                self.triggered = True
+                self.trigger_delay = timestamp - self._low_since
+                self.trigger_battery_level = battery_level
+                fired = True
+        elif battery_level > self.threshold + self.hysteresis:
+            self._low_samples = 0
+
+        elapsed = time.perf_counter() - start
+        self.updates += 1
+        self.update_time_total += elapsed
+        self.update_time_max = max(self.update_time_max, elapsed)
+        # Nothing is printed here, this runs in the receive thread of the link (see stats)
+        return fired
+
+    def stats(self):
+        """
+        Returns:
+        Dictionary with the counters of the supervisor
+        """
+        return {
+            'updates': self.updates,
+            'update_time_mean': self.update_time_total / self.updates if self.updates else 0.0,
+            'update_time_max': self.update_time_max,
+            'triggered': self.triggered,
+            'trigger_delay_ms': self.trigger_delay,
+            'trigger_latency': self.trigger_latency,
+            'trigger_battery_level': self.trigger_battery_level,
+        }
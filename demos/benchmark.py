@@ -0,0 +1,504 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from telemetry import TELEMETRY_DTYPE
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+RATES = [10, 100, 1000] # in Hz, logging rates of the synthetic telemetry
+DURATIONS = [1, 10, 60] # in min, flight durations of the synthetic telemetry
+REPEATS = 3 # repetitions of the bulk operations
+TRAJECTORY_REPEATS = 200 # repetitions of the trajectory generation
+SIM_DURATION = 5 # in s, streaming time from the simulated crazyflie
+TELEMETRY_WINDOW = 60000 # in samples, telemetry kept in memory by demo.py
+REGRESSION_THRESHOLD = 0.25 # relative change of ops/s or p99 latency counted as regression
+RESULTS_FILE = "benchmark_results.json"
+IMPORT_REPEATS = 5 # fresh interpreters started to measure the import time of demo.py
+LAZY_MODULES = ['matplotlib', 'pandas', 'yaml', 'pynput'] # must not be imported at the start of demo.py
+
+
+def synthetic_telemetry(rate, minutes, seed=0):
+    """
+    Synthetic telemetry of a circle flight with battery drain, noise and sag spikes
+
+    Args:
+    rate: Logging rate in Hz
+    minutes: Flight duration in min
+
+    Returns:
+    Structured array of TELEMETRY_DTYPE
+    """
+    rng = np.random.default_rng(seed)
+    n = int(rate * minutes * 60)
+    t = np.arange(n) / rate
+    data = np.zeros(n, dtype=TELEMETRY_DTYPE)
+    data['timestamp'] = np.round(t * 1000).astype(np.int64)
+    angle = t * 0.5 / 0.8 # 0.5 m/s on a circle with 0.8 m radius
+    data['x'] = 1.5 + 0.8 * np.cos(angle) + rng.normal(0, 0.02, n)
+    data['y'] = 1.5 + 0.8 * np.sin(angle) + rng.normal(0, 0.02, n)
+    data['z'] = 1.0 + rng.normal(0, 0.02, n)
+    sag = np.where(rng.random(n) < 0.001, 0.3, 0.0)
+    data['batterylevel'] = 4.1 - 0.8 * t / (minutes * 60) - sag + rng.normal(0, 0.01, n)
+    return data
+
+
+def _synthetic_log(directory, rate, minutes):
+    # Text log of the synthetic telemetry in the format of the log writer, created once per size
+    from log_writer import format_header
+    file = os.path.join(directory, f"synthetic_{rate}hz_{minutes}min.txt")
+    if not os.path.exists(file):
+        data = synthetic_telemetry(rate, minutes)
+        header = format_header(['benchmark.py'], 'synthetic', (2, 1, -1), "../setup_files/anchor_positions_4a.yaml")
+        columns = np.column_stack([data[name] for name in ('timestamp', 'x', 'y', 'z', 'batterylevel')])
+        np.savetxt(file + ".tmp", columns, fmt=['%d'] + ['%.9g'] * 4, delimiter=', ', header=header.rstrip('\n'), comments='')
+        os.replace(file + ".tmp", file)
+    return file
+
+
+def _summary(latencies, operations, elapsed):
+    # ops/s over the whole run and the latency percentiles of the single calls (in s)
+    latencies = np.asarray(latencies, dtype=float)
+    return {
+        'ops_per_s': operations / elapsed if elapsed > 0 else float('inf'),
+        'p50': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+        'calls': len(latencies),
+    }
+
+
+def _timed(function, repeats):
+    # Calls the function repeatedly, returns the last result and the time of every call
+    times = list()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+# Benchmark cases: all get (rate, minutes, repeats, directory) and return a dictionary of measures
+
+def bench_log_callback(rate, minutes, repeats, directory):
+    """
+    The log callback of demo.py: telemetry store, battery supervisor and log writer queue.
+    The samples are replayed in chunks, the writer drains its queue between the chunks (not timed).
+    """
+    from battery import BatterySupervisor
+    from log_writer import FlightLogWriter, QUEUE_SIZE
+    from telemetry import TelemetryStore
+
+    data = synthetic_telemetry(rate, minutes)
+    telemetry = TelemetryStore(capacity=TELEMETRY_WINDOW, ring=True)
+    supervisor = BatterySupervisor(threading.Event())
+    supervisor.arm()
+    writer = FlightLogWriter(os.path.join(directory, "callback.txt"), "")
+    writer.start()
+
+    def log_pos_callback(timestamp, data, logconf):
+        row = (timestamp, data['stateEstimate.x'], data['stateEstimate.y'], data['stateEstimate.z'], data['pm.vbat'])
+        telemetry.append(*row)
+        supervisor.update(timestamp, row[4])
+        writer.put(row)
+
+    latencies = np.zeros(len(data))
+    chunk = QUEUE_SIZE // 2
+    clock = time.perf_counter
+    for begin in range(0, len(data), chunk):
+        rows = data[begin:begin + chunk]
+        samples = [({'stateEstimate.x': x, 'stateEstimate.y': y, 'stateEstimate.z': z, 'pm.vbat': v}, t)
+                   for t, x, y, z, v in zip(*(rows[name].tolist() for name in TELEMETRY_DTYPE.names))]
+        for i, (values, timestamp) in enumerate(samples, begin):
+            start = clock()
+            log_pos_callback(timestamp, values, None)
+            latencies[i] = clock() - start
+        while writer.stats()['queue_depth']:
+            time.sleep(0.001)
+    writer.close()
+    os.remove(writer.file_name)
+    result = _summary(latencies, len(data), latencies.sum())
+    result['rows_dropped'] = writer.stats()['rows_dropped']
+    return result
+
+
+def bench_log_writer(rate, minutes, repeats, directory):
+    """
+    Streaming the whole flight through the log writer as fast as it accepts the rows,
+    ops/s are rows per s including the end of flight close
+    """
+    from log_writer import FlightLogWriter
+
+    data = synthetic_telemetry(rate, minutes)
+    rows = list(zip(*(data[name].tolist() for name in TELEMETRY_DTYPE.names)))
+    writer = FlightLogWriter(os.path.join(directory, "writer.txt"), "header\n")
+    latencies = np.zeros(len(rows))
+    clock = time.perf_counter
+    start = clock()
+    writer.start()
+    for i, row in enumerate(rows):
+        put_start = clock()
+        while not writer.put(row):
+            time.sleep(0.0005)
+            put_start = clock()
+        latencies[i] = clock() - put_start
+    close_start = clock()
+    writer.close()
+    end = clock()
+    os.remove(writer.file_name)
+    result = _summary(latencies, len(rows), end - start)
+    result['close_time'] = end - close_start
+    return result
+
+
+def bench_import_logging_data(rate, minutes, repeats, directory):
+    """
+    Reading a text log with cf_data.import_logging_data (pandas), ops/s are samples per s
+    """
+    import cf_data
+    file = _synthetic_log(directory, rate, minutes)
+    data, times = _timed(lambda: cf_data.import_logging_data(file), repeats)
+    return _summary(times, len(data[0]) * repeats, sum(times))
+
+
+def bench_load_flight(rate, minutes, repeats, directory):
+    """
+    Reading a text log with cf_data.load_flight, ops/s are samples per s
+    """
+    import cf_data
+    file = _synthetic_log(directory, rate, minutes)
+    flight, times = _timed(lambda: cf_data.load_flight(file), repeats)
+    return _summary(times, len(flight) * repeats, sum(times))
+
+
+def bench_load_binary_log(rate, minutes, repeats, directory):
+    """
+    Loading the binary copy of a log and touching all samples, ops/s are samples per s
+    """
+    import binlog
+    import cf_data
+    file = binlog.binary_file_name(_synthetic_log(directory, rate, minutes))
+    if not os.path.exists(file):
+        binlog.convert_text_log(file[:-len(binlog.BINARY_EXTENSION)] + ".txt", file)
+
+    def load():
+        flight = cf_data.load_flight(file)
+        flight.batterylevel.min()
+        return flight
+    flight, times = _timed(load, repeats)
+    return _summary(times, len(flight) * repeats, sum(times))
+
+
+def bench_add_scatter_points(rate, minutes, repeats, directory):
+    """
+    Adding the flight to a scatter plot and rendering it (Agg), ops/s are points per s
+    """
+    import matplotlib.pyplot as plt
+    import cf_data
+    data = synthetic_telemetry(rate, minutes)
+    draw_times = list()
+
+    def plot():
+        fig, ax = plt.subplots()
+        plot_data = cf_data.ScatterPlot(ax)
+        cf_data.add_scatter_points(plot_data, data['x'], data['y'], color='green', label='Flight')
+        start = time.perf_counter()
+        fig.canvas.draw()
+        draw_times.append(time.perf_counter() - start)
+        plt.close(fig)
+    _, times = _timed(plot, repeats)
+    result = _summary(times, len(data) * repeats, sum(times))
+    result['draw_time'] = float(np.median(draw_times))
+    return result
+
+
+def bench_plot_decimated(rate, minutes, repeats, directory):
+    """
+    Plotting the flight path and the battery level decimated to cf_data.PLOT_BUDGET and rendering
+    it (Agg), ops/s are points per s
+    """
+    import matplotlib.pyplot as plt
+    import cf_data
+    data = synthetic_telemetry(rate, minutes)
+    draw_times = list()
+
+    def plot():
+        fig, (ax_path, ax_battery) = plt.subplots(2)
+        plot_data = cf_data.ScatterPlot(ax_path, budget=cf_data.PLOT_BUDGET)
+        cf_data.add_scatter_points(plot_data, data['x'], data['y'], color='green', label='Flight')
+        cf_data.plot_time_series(ax_battery, data['timestamp'], data['batterylevel'], method='minmax')
+        start = time.perf_counter()
+        fig.canvas.draw()
+        draw_times.append(time.perf_counter() - start)
+        plt.close(fig)
+    _, times = _timed(plot, repeats)
+    result = _summary(times, len(data) * repeats, sum(times))
+    result['draw_time'] = float(np.median(draw_times))
+    return result
+
+
+def bench_resample(rate, minutes, repeats, directory):
+    """
+    Resampling the flight onto a uniform time grid (linear, with gap detection), ops/s are samples per s
+    """
+    import cf_data
+    data = synthetic_telemetry(rate, minutes)
+    columns = {name: data[name] for name in TELEMETRY_DTYPE.names if name != 'timestamp'}
+    _, times = _timed(lambda: cf_data.resample(data['timestamp'], columns, period=1000 / rate), repeats)
+    return _summary(times, len(data) * repeats, sum(times))
+
+
+def bench_create_trajectory(rate, minutes, repeats, directory):
+    """
+    The predefined circle of cf_data.create_trajectory
+    """
+    import cf_data
+    _, times = _timed(lambda: cf_data.create_trajectory(1, 1.5, 1.5), TRAJECTORY_REPEATS)
+    return _summary(times, len(times), sum(times))
+
+
+def bench_trajectory_create(rate, minutes, repeats, directory):
+    """
+    Arc-length parameterized trajectories of trajectory.create, without the cache (cold)
+    """
+    import trajectory
+
+    def create():
+        trajectory._create.cache_clear()
+        return trajectory.create('eight', (1.5, 1.5))
+    _, times = _timed(create, TRAJECTORY_REPEATS)
+    return _summary(times, len(times), sum(times))
+
+
+def bench_sim_log_stream(rate, minutes, repeats, directory):
+    """
+    Logging from the simulated crazyflie through cflib for SIM_DURATION s,
+    ops/s are the delivered samples per s, latency is the time in the log callback
+    """
+    import cflib.crtp
+    from cflib.crazyflie import Crazyflie
+    from cflib.crazyflie.log import LogConfig
+    from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+    import sim_link
+    from telemetry import TelemetryStore
+
+    cflib.crtp.init_drivers()
+    sim_link.register()
+    uri = f"sim://benchmark?rate={rate}&seed=0"
+    telemetry = TelemetryStore(capacity=int(rate * SIM_DURATION * 2), ring=True)
+    latencies = list()
+
+    def log_callback(timestamp, data, logconf):
+        start = time.perf_counter()
+        telemetry.append(timestamp, data['stateEstimate.x'], data['stateEstimate.y'], data['stateEstimate.z'], data['pm.vbat'])
+        latencies.append(time.perf_counter() - start)
+
+    with SyncCrazyflie(uri, cf=Crazyflie()) as scf:
+        logconf = LogConfig(name='Position', period_in_ms=10)
+        for variable in ('stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z', 'pm.vbat'):
+            logconf.add_variable(variable, 'float')
+        scf.cf.log.add_config(logconf)
+        logconf.data_received_cb.add_callback(log_callback)
+        logconf.start()
+        time.sleep(SIM_DURATION)
+        logconf.stop()
+    result = _summary(latencies, telemetry.total, SIM_DURATION)
+    result['sent'] = sim_link.simulated_crazyflie(uri).counters['log_packets']
+    return result
+
+
+def bench_import_demo(rate, minutes, repeats, directory):
+    """
+    Import time of demo.py (everything before the first prompt) in a fresh interpreter, measured with
+    python -X importtime. The heavy modules that are imported at the start are listed in 'eager_modules'.
+    """
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    check = "import sys, demo; print(' '.join(m for m in %r if m in sys.modules))" % (LAZY_MODULES,)
+    times = list()
+    for _ in range(IMPORT_REPEATS):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', check], cwd=here, capture_output=True, text=True, check=True)
+        # Lines: "import time: self [us] | cumulative | imported package"
+        for line in process.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == 'demo':
+                times.append(int(fields[1]) / 1e6)
+    result = _summary(times, len(times), sum(times))
+    result['eager_modules'] = process.stdout.split()
+    return result
+
+
+# name -> (function, dimensions the case depends on)
+CASES = {
+    'log_callback': (bench_log_callback, 'flight'),
+    'log_writer': (bench_log_writer, 'flight'),
+    'import_logging_data': (bench_import_logging_data, 'flight'),
+    'load_flight': (bench_load_flight, 'flight'),
+    'load_binary_log': (bench_load_binary_log, 'flight'),
+    'add_scatter_points': (bench_add_scatter_points, 'flight'),
+    'plot_decimated': (bench_plot_decimated, 'flight'),
+    'resample': (bench_resample, 'flight'),
+    'create_trajectory': (bench_create_trajectory, None),
+    'trajectory_create': (bench_trajectory_create, None),
+    'sim_log_stream': (bench_sim_log_stream, 'rate'),
+    'import_demo': (bench_import_demo, None),
+}
+
+
+def _peak_rss():
+    # Peak resident set size of this process in MB
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def run_case(name, rate, minutes, repeats, directory):
+    """
+    Runs one benchmark case, meant to run in a fresh process to measure its peak memory
+
+    Returns:
+    Dictionary with the case, its size and the measures
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    function, _ = CASES[name]
+    base_rss = _peak_rss()
+    result = {'case': name, 'rate': rate, 'minutes': minutes}
+    result.update(function(rate, minutes, repeats, directory))
+    result['base_rss_mb'] = base_rss
+    result['peak_rss_mb'] = _peak_rss()
+    return result
+
+
+def plan_cases(names, rates, durations):
+    """
+    Returns:
+    List of (case, rate, minutes) for all selected cases and sizes
+    """
+    plan = list()
+    for name in names:
+        dimensions = CASES[name][1]
+        if dimensions == 'flight':
+            plan.extend((name, rate, minutes) for minutes in durations for rate in rates)
+        elif dimensions == 'rate':
+            plan.extend((name, rate, None) for rate in rates)
+        else:
+            plan.append((name, None, None))
+    return plan
+
+
+def _key(result):
+    return result['case'], result['rate'], result['minutes']
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Compares results with a baseline run
+
+    Args:
+    results: List of result dictionaries
+    baseline: List of result dictionaries of the baseline run
+    threshold: Relative drop of ops/s or rise of the p99 latency counted as regression
+
+    Returns:
+    List of (result, baseline result, ops/s change, p99 change, regression), for all results with a baseline
+    """
+    reference = {_key(result): result for result in baseline}
+    comparison = list()
+    for result in results:
+        base = reference.get(_key(result))
+        if base is None:
+            continue
+        ops_change = result['ops_per_s'] / base['ops_per_s'] - 1 if base['ops_per_s'] else 0.0
+        p99_change = result['p99'] / base['p99'] - 1 if base.get('p99') and result.get('p99') is not None else 0.0
+        regression = ops_change < -threshold or p99_change > threshold
+        # A lazily imported module that is imported eagerly again is a regression of the startup
+        regression |= bool(set(result.get('eager_modules', ())) - set(base.get('eager_modules', ())))
+        comparison.append((result, base, ops_change, p99_change, regression))
+    return comparison
+
+
+def _label(result):
+    rate = f"{result['rate']} Hz" if result['rate'] is not None else "-"
+    minutes = f"{result['minutes']} min" if result['minutes'] is not None else "-"
+    return f"{result['case']:<20} {rate:>8} {minutes:>8}"
+
+
+def format_result(result):
+    p50 = result['p50'] * 1000 if result['p50'] is not None else float('nan')
+    p99 = result['p99'] * 1000 if result['p99'] is not None else float('nan')
+    peak = result['peak_rss_mb'] if result['peak_rss_mb'] is not None else float('nan')
+    line = f"{_label(result)} {result['ops_per_s']:>14.1f} ops/s  p50 {p50:9.4f} ms  p99 {p99:9.4f} ms  peak {peak:8.1f} MB"
+    if result.get('eager_modules'):
+        line += f"  imported at start: {', '.join(result['eager_modules'])}"
+    return line
+
+
+# Benchmark suite of the telemetry, logging and plotting hot paths, no radio needed
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the telemetry, logging and plotting hot paths")
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES), metavar='CASE',
+                        help=f"cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument('--rates', nargs='+', type=int, default=RATES, help="logging rates in Hz")
+    parser.add_argument('--minutes', nargs='+', type=float, default=DURATIONS, help="flight durations in min")
+    parser.add_argument('--repeats', type=int, default=REPEATS, help="repetitions of the bulk operations")
+    parser.add_argument('-o', '--output', default=RESULTS_FILE, help="results file (json)")
+    parser.add_argument('--baseline', help="results file of an earlier run to compare with")
+    parser.add_argument('--update-baseline', action='store_true', help="store the results as new baseline")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD, help="relative change counted as regression")
+    args = parser.parse_args(argv)
+
+    results = list()
+    context = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as directory:
+        for name, rate, minutes in plan_cases(args.cases, args.rates, args.minutes):
+            # Every case in a fresh process, so the peak memory belongs to the case alone
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_case, name, rate, minutes, args.repeats, directory).result()
+            results.append(result)
+            print(format_result(result), flush=True)
+
+    run = {
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(run, f, indent=1)
+    print(f"Results saved in {args.output}")
+
+    status = 0
+    if args.baseline and not args.update_baseline and not os.path.exists(args.baseline):
+        print(f"Baseline {args.baseline} not found, store one with --update-baseline")
+    elif args.baseline and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison = compare(results, baseline['results'], args.threshold)
+        print(f"Compared with {args.baseline} ({baseline['created']}):")
+        for result, _, ops_change, p99_change, regression in comparison:
+            print(f"{_label(result)} ops/s {ops_change:+8.1%}  p99 {p99_change:+8.1%}{'  REGRESSION' if regression else ''}")
+        regressions = sum(1 for *_, regression in comparison if regression)
+        print(f"{regressions} regressions of {len(comparison)} compared cases (threshold {args.threshold:.0%})")
+        status = 1 if regressions else 0
+    elif args.baseline and args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=1)
+        print(f"Baseline saved in {args.baseline}")
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import numpy as np
+
+import cf_data
+
+# Binary log layout (little endian):
+# - fixed header of HEADER_SIZE bytes: magic, version, number of samples, metadata length, metadata (JSON)
+# - one contiguous column per entry of COLUMNS, in that order, each 8 byte aligned
+MAGIC = b'CFLOG\x00\x00\x01'
+VERSION = 1
+HEADER_SIZE = 1024 # in bytes
+HEADER_STRUCT = struct.Struct('<8sIQI')
+COLUMNS = [
+    ('Timestamp', np.dtype('<f8')),
+    ('X', np.dtype('<f4')),
+    ('Y', np.dtype('<f4')),
+    ('Z', np.dtype('<f4')),
+    ('Batterylevel', np.dtype('<f4')),
+]
+BINARY_EXTENSION = ".cflog"
+
+
+def _column_offsets(n):
+    # Offsets of the columns in the file for n samples
+    offsets = list()
+    offset = HEADER_SIZE
+    for _, dtype in COLUMNS:
+        offsets.append(offset)
+        offset += -(-n * dtype.itemsize // 8) * 8
+    return offsets, offset
+
+
+def write_binary_log(file, metadata, columns):
+    """
+    Writes a binary log file, the file is written to a temporary file first and renamed afterwards
+
+    Args:
+    file: The file path of the binary log
+    metadata: Dictionary with the metadata (command, date, param, loco_file)
+    columns: Dictionary with one array per column name in COLUMNS
+
+    Returns:
+    The number of samples written
+    """
+    meta = json.dumps(metadata).encode('utf-8')
+    if HEADER_STRUCT.size + len(meta) > HEADER_SIZE:
+        raise ValueError(f"Metadata does not fit into the {HEADER_SIZE} byte header")
+    n = len(columns['Timestamp'])
+    offsets, _ = _column_offsets(n)
+
+    tmp_file = f"{file}.tmp"
+    with open(tmp_file, 'wb') as f:
+        f.write(HEADER_STRUCT.pack(MAGIC, VERSION, n, len(meta)))
+        f.write(meta)
+        for (name, dtype), offset in zip(COLUMNS, offsets):
+            column = np.asarray(columns[name], dtype=dtype)
+            if len(column) != n:
+                raise ValueError(f"Column {name} has {len(column)} samples, expected {n}")
+            f.write(b'\x00' * (offset - f.tell()))
+            column.tofile(f)
+        f.write(b'\x00' * (-f.tell() % 8))
+    os.replace(tmp_file, file)
+    return n
+
+
+def read_binary_metadata(file):
+    """
+    Reads only the fixed header of a binary log file
+
+    Args:
+    file: The file path of the binary log
+
+    Returns:
+    metadata: Dictionary with the metadata (command, date, param, loco_file)
+    n: The number of samples
+    """
+    with open(file, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    return _parse_header(header, file)
+
+
+def _parse_header(header, file):
+    magic, version, n, meta_length = HEADER_STRUCT.unpack_from(header)
+    if magic != MAGIC:
+        raise ValueError(f"'{file}' is not a binary crazyflie log")
+    if version != VERSION:
+        raise ValueError(f"Unsupported binary log version {version} in '{file}'")
+    metadata = json.loads(bytes(header[HEADER_STRUCT.size:HEADER_STRUCT.size + meta_length]).decode('utf-8'))
+    return metadata, n
+
+
+def load_binary_log(file):
+    """
+    Loads a binary log file through np.memmap, the columns are read-only views of the file (no copies)
+
+    Args:
+    file: The file path of the binary log
+
+    Returns:
+    metadata: Dictionary with the metadata (command, date, param, loco_file)
+    columns: Dictionary with one array per column name in COLUMNS
+    """
+    data = np.memmap(file, dtype=np.uint8, mode='r')
+    metadata, n = _parse_header(data[:HEADER_SIZE], file)
+    offsets, size = _column_offsets(n)
+    if len(data) < size:
+        raise ValueError(f"'{file}' is truncated")
+    columns = dict()
+    for (name, dtype), offset in zip(COLUMNS, offsets):
+        columns[name] = data[offset:offset + n * dtype.itemsize].view(dtype)
+    return metadata, columns
+
+
+def binary_file_name(file):
+    """
+    Returns:
+    The file path of the binary log belonging to the text log `file`
+    """
+    return os.path.splitext(file)[0] + BINARY_EXTENSION
+
+
+def convert_text_log(file, binary_file=None):
+    """
+    Converts a text log (csv format) into a binary log
+
+    Args:
+    file: The file path of the text log
+    binary_file: The file path of the binary log, defaults to the text log path with BINARY_EXTENSION
+
+    Returns:
+    The file path of the binary log
+    """
+    if binary_file is None:
+        binary_file = binary_file_name(file)
+    flight = cf_data.load_flight(file)
+    metadata = {'command': flight.command, 'date': flight.date, 'param': flight.param, 'loco_file': flight.loco_file}
+    columns = {'Timestamp': flight.time, 'X': flight.x, 'Y': flight.y, 'Z': flight.z, 'Batterylevel': flight.batterylevel}
+    write_binary_log(binary_file, metadata, columns)
+    return binary_file
+
+
+# Converter for the existing text log archive
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert crazyflie text logs into the binary log format")
+    parser.add_argument('files', nargs='+', help="text log files (csv format)")
+    parser.add_argument('--force', action='store_true', help="convert also logs with an up to date binary log")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for file in args.files:
+        binary_file = binary_file_name(file)
+        if not args.force and os.path.exists(binary_file) and os.path.getmtime(binary_file) >= os.path.getmtime(file):
+            continue
+        try:
+            convert_text_log(file, binary_file)
+            print(f"Converted {file} -> {binary_file}")
+        except (OSError, ValueError, KeyError, IndexError) as e:
+            print(f"Could not convert {file}: {e}")
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,10 @@
 import sys
 import datetime as date
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-import yaml 
 import random
 from pathlib import Path
 import re
+from dataclasses import dataclass
 
 # Import the logging data from the txt file
 def import_logging_data(file):
@@ -23,6 +21,9 @@ def import_logging_data(file):
     batterylevel: The battery level data
     """
 
+    # pandas is only needed here, it is imported on first use to keep the start of the flight scripts fast
+    import pandas as pd
+
     # Read the txt file with a two-row header
     df = pd.read_csv(file, skiprows= 3, delimiter= ',')
 
@@ -51,27 +52,248 @@ def extract_metadata(file):
             data.append(file.readline())
             print(data[i])
 
-        # Access command and date from the metadata
-        # Logging data from ['demo.py'] at 2024-08-13_10-50-58
-        # Regular expressions to capture command and date
-        command_pattern = r"from \[(.*?)\]"
-        date_pattern = r"at (.+)"
-
-        # Access parameters
-        # Parameters: 1, 3, 2
-        param = data[1].split(":")[1].split(",")
-        param = [int(i) for i in param]
-
-        #loco setup file
-        loco_file = data[2].split(':')[1].strip()
-
-        # Search for the patterns in the metadata
-        command_match = re.search(command_pattern, data[0])
-        command = command_match.group(1) if command_match else None
-        date_match = re.search(date_pattern, data[0])
-        date = date_match.group(1) if date_match else None
-    
-    return command, date,param, loco_file
+    return parse_metadata(data)
+
+def parse_metadata(lines):
+    """
+    Parses the three metadata lines at the beginning of a log file
+
+    Args:
+    lines: The first three lines of the log file
+
+    Returns:
+    command: The command the log was created by
+    date: The date of the log
+    param: The flight parameters (demo_type, trajectory_type, num_waypoints)
+    loco_file: The anchor setup file
+    """
+    # Access command and date from the metadata
+    # Logging data from ['demo.py'] at 2024-08-13_10-50-58
+    # Regular expressions to capture command and date
+    command_pattern = r"from \[(.*?)\]"
+    date_pattern = r"at (.+)"
+
+    # Access parameters
+    # Parameters: 1, 3, 2
+    param = lines[1].split(":")[1].split(",")
+    param = [int(i) for i in param]
+
+    #loco setup file
+    loco_file = lines[2].split(':')[1].strip()
+
+    # Search for the patterns in the metadata
+    command_match = re.search(command_pattern, lines[0])
+    command = command_match.group(1) if command_match else None
+    date_match = re.search(date_pattern, lines[0])
+    date = date_match.group(1) if date_match else None
+
+    return command, date, param, loco_file
+
+
+@dataclass
+class Flight:
+    """
+    One logged flight, metadata and data columns (None if only the header was loaded)
+    """
+    file: str
+    command: str
+    date: str
+    param: list
+    loco_file: str
+    time: np.ndarray = None
+    x: np.ndarray = None
+    y: np.ndarray = None
+    z: np.ndarray = None
+    batterylevel: np.ndarray = None
+
+    @property
+    def loaded(self):
+        return self.time is not None
+
+    def __len__(self):
+        return len(self.time) if self.loaded else 0
+
+
+# Load a flight log with a single read of the file
+def load_flight(file, header_only=False):
+    """
+    Loads a flight log, header and data are parsed from one open of the file, nothing is printed.
+    Binary logs (see binlog.py) are memory-mapped instead of parsed.
+
+    Args:
+    file: The file path of the log (txt or binary)
+    header_only: If True, only the metadata is parsed (e.g. for listing logs)
+
+    Returns:
+    Flight object
+    """
+    if str(file).endswith(".cflog"):
+        import binlog
+        if header_only:
+            metadata, _ = binlog.read_binary_metadata(file)
+            return Flight(str(file), metadata['command'], metadata['date'], metadata['param'], metadata['loco_file'])
+        metadata, columns = binlog.load_binary_log(file)
+        return Flight(str(file), metadata['command'], metadata['date'], metadata['param'], metadata['loco_file'],
+                      columns['Timestamp'], columns['X'], columns['Y'], columns['Z'], columns['Batterylevel'])
+
+    with open(file, 'r') as f:
+        lines = [f.readline() for _ in range(3)]
+        command, date, param, loco_file = parse_metadata(lines)
+        flight = Flight(str(file), command, date, param, loco_file)
+        if header_only:
+            return flight
+
+        # Map the columns by name, the order is given by the column header
+        names = [name.strip() for name in f.readline().split(',')]
+        data = np.loadtxt(f, delimiter=',', ndmin=2)
+    if data.shape[0] == 0:
+        data = np.zeros((0, len(names)))
+    columns = {name: data[:, i] for i, name in enumerate(names)}
+    flight.time = columns['Timestamp']
+    flight.x = columns['X']
+    flight.y = columns['Y']
+    flight.z = columns['Z']
+    flight.batterylevel = columns['Batterylevel']
+    return flight
+
+
+RESAMPLE_PERIOD = 10 # in ms, step of the uniform time grid (the logging period)
+GAP_THRESHOLD = 30 # in ms, three times the logging period
+RESAMPLE_METHODS = ('linear', 'hold')
+
+
+# Sort the samples by time and drop repeated timestamps
+def deduplicate(t, columns):
+    """
+    Sorts the samples by timestamp (stable) and keeps the first sample of every timestamp, vectorized
+
+    Args:
+    t: The timestamps in ms
+    columns: Dictionary name -> data column of the same length
+
+    Returns:
+    Tuple (timestamps, dictionary of the columns, number of dropped samples)
+    """
+    t = np.asarray(t)
+    columns = {name: np.asarray(values) for name, values in columns.items()}
+    if len(t) > 1 and np.any(t[1:] < t[:-1]):
+        order = np.argsort(t, kind='stable')
+        t = t[order]
+        columns = {name: values[order] for name, values in columns.items()}
+    keep = np.empty(len(t), dtype=bool)
+    keep[:1] = True
+    np.not_equal(t[1:], t[:-1], out=keep[1:])
+    dropped = len(t) - int(np.count_nonzero(keep))
+    if dropped == 0:
+        return t, columns, 0
+    return t[keep], {name: values[keep] for name, values in columns.items()}, dropped
+
+
+# Packet gaps of a log
+def find_gaps(t, threshold=GAP_THRESHOLD):
+    """
+    Finds the intervals between two samples longer than the threshold
+
+    Args:
+    t: The sorted timestamps in ms (see deduplicate)
+    threshold: Time in ms between two samples, above which a packet gap is counted
+
+    Returns:
+    Tuple (index of the last sample before each gap, gap durations in ms)
+    """
+    dt = np.diff(np.asarray(t, dtype=float))
+    index = np.flatnonzero(dt > threshold)
+    return index, dt[index]
+
+
+@dataclass
+class ResampledLog:
+    """
+    Log columns on a uniform time grid, grid points inside packet gaps are marked as not valid
+    """
+    time: np.ndarray # in ms, uniform grid
+    columns: dict
+    valid: np.ndarray # False for grid points inside a gap (interpolated or held over the gap)
+    period: float # in ms
+    gap_start: np.ndarray # in ms, time of the last sample before each gap
+    gap_duration: np.ndarray # in ms
+    duplicates: int # samples dropped for a repeated timestamp
+
+    def __len__(self):
+        return len(self.time)
+
+    def derivative(self, name):
+        """
+        Rate of change of a column per s (central differences), NaN where a gap is involved
+
+        Args:
+        name: Name of the column, e.g. 'x' or 'batterylevel'
+
+        Returns:
+        Array with one value per grid point
+        """
+        values = self.columns[name]
+        if len(values) < 2:
+            return np.full(len(values), np.nan)
+        rate = np.gradient(values.astype(float), self.period / 1000)
+        # The differences at a grid point use both neighbours
+        invalid = ~self.valid
+        invalid[1:] |= ~self.valid[:-1]
+        invalid[:-1] |= ~self.valid[1:]
+        rate[invalid] = np.nan
+        return rate
+
+
+# Align a log onto a uniform time grid
+def resample(t, columns, period=RESAMPLE_PERIOD, method='linear', gap_threshold=GAP_THRESHOLD):
+    """
+    Resamples log columns onto a uniform time grid in one vectorized pass, after removing
+    duplicate timestamps
+
+    Args:
+    t: The timestamps in ms
+    columns: Dictionary name -> data column of the same length
+    period: Step of the grid in ms
+    method: 'linear' interpolates between the neighbouring samples, 'hold' keeps the last sample
+    gap_threshold: Time in ms between two samples, above which the grid points in between are not valid
+
+    Returns:
+    ResampledLog, the grid starts at the first sample
+    """
+    if method not in RESAMPLE_METHODS:
+        raise ValueError(f"Unknown resampling method '{method}', choose from {', '.join(RESAMPLE_METHODS)}")
+    if period <= 0:
+        raise ValueError("The resampling period has to be positive")
+    t, columns, duplicates = deduplicate(t, columns)
+    t = t.astype(float)
+    if len(t) == 0:
+        empty = np.zeros(0)
+        return ResampledLog(empty, {name: values[:0] for name, values in columns.items()}, np.zeros(0, dtype=bool),
+                            period, empty, empty, duplicates)
+
+    grid = t[0] + np.arange(int(np.floor((t[-1] - t[0]) / period + 1e-9)) + 1) * period
+    # Index of the last sample at or before every grid point
+    before = np.searchsorted(t, grid, side='right') - 1
+    if method == 'linear':
+        resampled = {name: np.interp(grid, t, values) for name, values in columns.items()}
+    else:
+        resampled = {name: values[before] for name, values in columns.items()}
+
+    gap_index, gap_duration = find_gaps(t, gap_threshold)
+    gap_after = np.zeros(len(t), dtype=bool)
+    gap_after[gap_index] = True
+    valid = ~gap_after[before] | (grid == t[before])
+    return ResampledLog(grid, resampled, valid, period, t[gap_index], gap_duration, duplicates)
+
+
+# Resample the data columns of a flight
+def resample_flight(flight, period=RESAMPLE_PERIOD, method='linear', gap_threshold=GAP_THRESHOLD):
+    """
+    Returns:
+    ResampledLog with the columns x, y, z and batterylevel of the flight (see resample)
+    """
+    columns = {'x': flight.x, 'y': flight.y, 'z': flight.z, 'batterylevel': flight.batterylevel}
+    return resample(flight.time, columns, period, method, gap_threshold)
 
 # List all files and directories in a given directory
 def list_files_in_directory(directory):
@@ -111,6 +333,8 @@ def obtain_anchor_positions(file):
     z_values: The z position data
     """
 
+    import yaml
+
     # Initialize lists to store x, y, and z values
     values = []
 
@@ -127,12 +351,13 @@ def obtain_anchor_positions(file):
     return np.array(values)
 
 # collect user-defined waypoints
-def set_waypoints(count, x_log, y_log, z_log):
+def set_waypoints(count, telemetry):
     """
     Asks the user to press enter to capture positions at each waypoint and stores them in an array.
 
     Args:
     count (int): Number of waypoints to capture.
+    telemetry (TelemetryStore): Store the position samples are logged to.
 
     Returns:
     Array of captured waypoints with columns representing x, y, and z coordinates.
@@ -144,10 +369,12 @@ def set_waypoints(count, x_log, y_log, z_log):
     for i in range(count):
         input(f"Click enter for set position {i} ...\n")
 
-        positions[i, 0] = sum(x_log[-10:])/10
-        positions[i, 1] = sum(y_log[-10:])/10
-        positions[i, 2] = sum(z_log[-10:])/10
-        print(f"Position {i}: x={positions[i, 0]}, y={positions[i, 1]}, z={positions[i, 2]}\n")
+        # Average the last 10 samples, the store hands out a view without copying
+        samples = telemetry.last(10)
+        positions[i, 0] = samples['x'].mean()
+        positions[i, 1] = samples['y'].mean()
+        positions[i, 2] = samples['z'].mean()
+        print(f"Position {i}: x={positions[i, 0]:.3f}, y={positions[i, 1]:.3f}, z={positions[i, 2]:.3f}\n")
 
     return positions
 
@@ -196,6 +423,48 @@ def create_trajectory(param, x_init, y_init):
     return np.array(pos)
 
 
+# Center of the flight area, the trajectories are flown around it
+def initial_position(anchor_pos):
+    """
+    Computes the initial position from the anchor positions
+
+    Args:
+    anchor_pos: The anchor positions (see obtain_anchor_positions)
+
+    Returns:
+    x_init: The initial x position
+    y_init: The initial y position
+    """
+    return anchor_pos[1,0] / 2, anchor_pos[2,1] / 2
+
+# Planned path of the predefined trajectories
+def planned_trajectory(trajectory_type, x_init, y_init):
+    """
+    Computes the planned path of a predefined trajectory (demo type 2)
+
+    Args:
+    trajectory_type: 1 for circle, 2 for square, 3 for eight
+    x_init: The initial x position
+    y_init: The initial y position
+
+    Returns:
+    Array with one row per point and columns x, y (circle: also t),
+    for the eight the ground path predicted from its velocity setpoints
+    """
+    if trajectory_type == 1:
+        # Circle for small environment, setpoints evenly spaced along the arc length
+        import trajectory
+        return trajectory.create('circle', (x_init, y_init), radius=0.8)
+    if trajectory_type == 2:
+        #starting in middle and flying to the corners (endpoints 1.6,1.6)
+        return np.array([[0.2,0.2],[x_init * 2 - 0.2, 0.2],[x_init * 2 - 0.2, y_init * 2 - 0.2],[0.2, y_init * 2 - 0.2], [x_init,y_init]])
+    if trajectory_type == 3:
+        # The eight starts where the crazyflie is placed, assumed in the initial position
+        import scheduler
+        return scheduler.dead_reckon(scheduler.EIGHT_SEGMENTS, x0=x_init, y0=y_init)[:, :2]
+    return None
+
+
 # Printing trajectory which is planned to fly
 def printing_trajectory(x,y, labelx, labely):
     """
@@ -211,6 +480,7 @@ def printing_trajectory(x,y, labelx, labely):
     The plot of the trajectory
     """
 
+    import matplotlib.pyplot as plt
     plt.scatter(x, y)
     plt.xlabel(labelx)
     plt.ylabel(labely)
@@ -219,48 +489,333 @@ def printing_trajectory(x,y, labelx, labely):
     plt.show()
 
 
-def add_scatter_points(plot_data,x, y, color=None, label=None):
-    # List of predefined colors
-    color_options = ['red', 'blue', 'green', 'orange', 'purple', 'brown', 'pink', 'gray', 'cyan', 'magenta']
+# Decimation of long flights for plotting, the full data is kept for zooming
+PLOT_BUDGET = 2000 # points per series drawn at once
+GRID_MAX_SIDE = 1024 # cells per axis of the thinning grid
+GRID_ITERATIONS = 4 # refinements of the thinning grid towards the budget
 
-    # If color is not provided, choose a random color from the list
-    if color is None:
-        color = random.choice(color_options)
-    
-    # If label is not provided, set a default label
-    if label is None:
-        label = f"Set {len(plot_data['x'])+1}"
-
-    # Add new points and color to the plot data
-    plot_data['x'].extend(x)
-    plot_data['y'].extend(y)
-    plot_data['colors'].extend([color] * len(x))
-    plot_data['labels'].extend([label] * len(x))
-    
-    # Clear the current plot
-    plt.clf()
-    
-    # Scatter plot with the stored data
-    # Plot each set of points separately to assign them to the legend
-    for i in range(len(plot_data['x'])):
-        plt.scatter(plot_data['x'][i], plot_data['y'][i], c=plot_data['colors'][i], label=plot_data['labels'][i])
-
-    # Optionally, set labels, title, and grid
-    plt.xlabel('X')
-    plt.ylabel('Y')
-    plt.title('Trajectory of the crazyflie')
-    plt.grid(True)
-
-    # Only show one entry per label in the legend
-    handles, labels = plt.gca().get_legend_handles_labels()
-    by_label = dict(zip(labels, handles))
-    plt.legend(by_label.values(), by_label.keys())
-    
-    
-    # Show the plot
-    #plt.show(block=False)
 
+def _first_per_bucket(candidates, bucket):
+    # First candidate index of every bucket, candidates sorted
+    if len(candidates) == 0:
+        return candidates
+    buckets = bucket[candidates]
+    return candidates[np.concatenate(([True], buckets[1:] != buckets[:-1]))]
+
+
+def lttb(x, y, budget=PLOT_BUDGET):
+    """
+    Largest triangle three buckets downsampling of a time series, vectorized over all buckets.
+
+    The inner points are split into budget-2 buckets, from every bucket the point forming the largest
+    triangle with the neighbouring buckets is kept, so peaks and dips (e.g. battery sag) stay visible.
+    Unlike the sequential LTTB, the left corner of the triangle is the average of the previous bucket
+    instead of the point selected there, which makes all buckets independent.
+
+    Args:
+    x: The time data (sorted)
+    y: The values
+    budget: Number of points to keep
 
+    Returns:
+    Sorted indices of the kept points, the first and last point are always kept
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n <= budget or budget < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, budget - 1).astype(np.int64)
+    starts, counts = edges[:-1] - 1, np.diff(edges)
+    inner_x, inner_y = x[1:-1], y[1:-1]
+    mean_x = np.add.reduceat(inner_x, starts) / counts
+    mean_y = np.add.reduceat(inner_y, starts) / counts
+    # Triangle corners: average of the previous bucket (a) and of the next bucket (c)
+    ax_, ay_ = np.concatenate(([x[0]], mean_x[:-1])), np.concatenate(([y[0]], mean_y[:-1]))
+    cx_, cy_ = np.concatenate((mean_x[1:], [x[-1]])), np.concatenate((mean_y[1:], [y[-1]]))
+    bucket = np.repeat(np.arange(len(counts)), counts)
+    area = np.abs((ax_ - cx_)[bucket] * (inner_y - ay_[bucket]) - (ax_[bucket] - inner_x) * (cy_ - ay_)[bucket])
+    largest = np.maximum.reduceat(area, starts)
+    selected = _first_per_bucket(np.flatnonzero(area == largest[bucket]), bucket)
+    return np.concatenate(([0], selected + 1, [n - 1]))
+
+
+def minmax(y, budget=PLOT_BUDGET):
+    """
+    Min-max downsampling of a time series: the minimum and maximum of every bucket are kept,
+    so all extremes are drawn exactly
 
+    Args:
+    y: The values
+    budget: Number of points to keep (two per bucket)
 
+    Returns:
+    Sorted indices of the kept points
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= budget or budget < 2:
+        return np.arange(n)
+    edges = np.linspace(0, n, budget // 2 + 1).astype(np.int64)
+    starts, counts = edges[:-1], np.diff(edges)
+    bucket = np.repeat(np.arange(len(counts)), counts)
+    low = _first_per_bucket(np.flatnonzero(y == np.minimum.reduceat(y, starts)[bucket]), bucket)
+    high = _first_per_bucket(np.flatnonzero(y == np.maximum.reduceat(y, starts)[bucket]), bucket)
+    return np.union1d(low, high)
+
+
+def _first_per_cell(x, y, xlim, ylim, side):
+    # Index of the first point in every occupied cell of a side x side grid, sorted
+    n = len(x)
+    ix = np.clip(((x - xlim[0]) * (side / max(xlim[1] - xlim[0], 1e-12))).astype(np.int64), 0, side - 1)
+    iy = np.clip(((y - ylim[0]) * (side / max(ylim[1] - ylim[0], 1e-12))).astype(np.int64), 0, side - 1)
+    first = np.full(side * side, n, dtype=np.int64)
+    # Written in reverse, so the first point of a cell is written last
+    first[(ix * side + iy)[::-1]] = np.arange(n - 1, -1, -1)
+    return np.sort(first[first < n])
+
+
+def grid_thin(x, y, budget=PLOT_BUDGET, xlim=None, ylim=None):
+    """
+    Thins an XY path to one point per cell of a grid over the visible area. The grid is refined
+    until about `budget` cells are occupied, the order of the points is kept.
 
+    Args:
+    x: The x position data
+    y: The y position data
+    budget: Maximal number of points to keep
+    xlim: Visible x range (min, max), None for the range of the data
+    ylim: Visible y range (min, max), None for the range of the data
+
+    Returns:
+    Sorted indices of the kept points (only points within the visible area)
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    index = np.arange(len(x))
+    if xlim is not None and ylim is not None:
+        index = np.flatnonzero((x >= min(xlim)) & (x <= max(xlim)) & (y >= min(ylim)) & (y <= max(ylim)))
+    if len(index) <= budget:
+        return index
+    x, y = x[index], y[index]
+    xlim = (x.min(), x.max()) if xlim is None else (min(xlim), max(xlim))
+    ylim = (y.min(), y.max()) if ylim is None else (min(ylim), max(ylim))
+
+    # A grid with at most budget cells always fits, paths occupy only a fraction of the cells
+    side = max(1, int(np.sqrt(budget)))
+    kept = _first_per_cell(x, y, xlim, ylim, side)
+    for _ in range(GRID_ITERATIONS):
+        if side >= GRID_MAX_SIDE or len(kept) >= 0.8 * budget:
+            break
+        side = min(GRID_MAX_SIDE, max(side + 1, int(side * np.sqrt(budget / max(len(kept), 1)))))
+        finer = _first_per_cell(x, y, xlim, ylim, side)
+        if len(finer) > budget:
+            break
+        kept = finer
+    return index[kept]
+
+
+class DecimatedLine:
+    """
+    Line plot of a long time series, drawn with at most `budget` points of the visible time range.
+    The full data is kept, zooming re-decimates from it.
+    """
+
+    def __init__(self, ax, t, y, budget=PLOT_BUDGET, method='lttb', **kwargs):
+        """
+        Args:
+        ax: Matplotlib axes to draw on
+        t: The time data (sorted)
+        y: The values
+        budget: Number of points drawn at once
+        method: 'lttb' or 'minmax'
+        kwargs: Further arguments of ax.plot
+        """
+        self.t = np.asarray(t, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.budget = budget
+        self.method = method
+        self.ax = ax
+        t_visible, y_visible = self._decimate(None)
+        self.line, = ax.plot(t_visible, y_visible, **kwargs)
+        ax.callbacks.connect('xlim_changed', self._on_xlim)
+
+    def _decimate(self, xlim):
+        first, last = 0, len(self.t)
+        if xlim is not None:
+            # One point beyond both edges, so the line reaches the border of the plot
+            first = max(0, np.searchsorted(self.t, min(xlim)) - 1)
+            last = min(len(self.t), np.searchsorted(self.t, max(xlim), side='right') + 1)
+        t, y = self.t[first:last], self.y[first:last]
+        index = lttb(t, y, self.budget) if self.method == 'lttb' else minmax(y, self.budget)
+        return t[index], y[index]
+
+    def _on_xlim(self, ax):
+        self.line.set_data(*self._decimate(ax.get_xlim()))
+
+
+def plot_time_series(ax, t, y, budget=PLOT_BUDGET, method='lttb', **kwargs):
+    """
+    Plots a time series decimated to the budget (see DecimatedLine)
+
+    Returns:
+    The DecimatedLine
+    """
+    return DecimatedLine(ax, t, y, budget=budget, method=method, **kwargs)
+
+
+# List of predefined colors
+COLOR_OPTIONS = ['red', 'blue', 'green', 'orange', 'purple', 'brown', 'pink', 'gray', 'cyan', 'magenta']
+
+
+class ScatterPlot:
+    """
+    Incremental scatter plot of the crazyflie trajectories.
+
+    Keeps one collection per label. New points of an existing label are appended to its
+    collection via set_offsets, so adding N points costs O(N) once instead of recreating
+    an artist for every point that was ever plotted. With blitting enabled, appends that
+    do not change the axis limits only redraw the changed collection.
+    With a budget, every label draws at most `budget` points of the visible area (grid_thin),
+    zooming re-thins from the full data.
+    """
+
+    def __init__(self, ax=None, blit=False, budget=None):
+        """
+        Args:
+        ax: Matplotlib axes to draw on, defaults to the current axes on the first update
+        blit: If True, redraw only the changed collection when possible
+        budget: Maximal number of points drawn per label, None to draw all points
+        """
+        self._ax = ax
+        self.blit = blit
+        self.budget = budget
+        self.series = dict() # label -> [collection, offsets buffer, number of points]
+        self._background = None
+        self._limits_connected = False
+        self._autoscaling = False
+        if ax is not None:
+            self._setup_axes()
+
+    @property
+    def ax(self):
+        if self._ax is None:
+            import matplotlib.pyplot as plt
+            self._ax = plt.gca()
+            self._setup_axes()
+        return self._ax
+
+    def _setup_axes(self):
+        self._ax.set_xlabel('X')
+        self._ax.set_ylabel('Y')
+        self._ax.set_title('Trajectory of the crazyflie')
+        self._ax.grid(True)
+        if self.blit:
+            self._ax.figure.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, event):
+        # Store the background after every full redraw to blit onto it
+        self._background = event.canvas.copy_from_bbox(self._ax.bbox)
+
+    def _visible(self, points):
+        # Points drawn of a series, thinned to the budget within the current view
+        if self.budget is None:
+            return points
+        return points[grid_thin(points[:, 0], points[:, 1], self.budget, self._ax.get_xlim(), self._ax.get_ylim())]
+
+    def _autoscale(self, points):
+        # Autoscaling changes both limits, the series are thinned once afterwards
+        self._autoscaling = True
+        try:
+            self._ax.update_datalim(points)
+            self._ax.autoscale_view()
+        finally:
+            self._autoscaling = False
+
+    def _on_limits(self, ax):
+        if self._autoscaling:
+            return
+        for collection, buffer, n in self.series.values():
+            collection.set_offsets(self._visible(buffer[:n]))
+
+    def add_points(self, x, y, color=None, label=None):
+        """
+        Adds points to the plot
+
+        Args:
+        x: The x position data
+        y: The y position data
+        color: The color of the points, a random color is chosen if None
+        label: The label of the points, points with an existing label are appended to it
+
+        Returns:
+        The collection the points were added to
+        """
+        ax = self.ax
+        points = np.column_stack((np.asarray(x, dtype=float), np.asarray(y, dtype=float)))
+        if self.budget is not None and not self._limits_connected:
+            ax.callbacks.connect('xlim_changed', self._on_limits)
+            ax.callbacks.connect('ylim_changed', self._on_limits)
+            self._limits_connected = True
+
+        # If label is not provided, set a default label
+        if label is None:
+            label = f"Set {len(self.series)+1}"
+
+        if label not in self.series:
+            # If color is not provided, choose a random color from the list
+            if color is None:
+                color = random.choice(COLOR_OPTIONS)
+            if self.budget is None:
+                collection = ax.scatter(points[:, 0], points[:, 1], c=color, label=label)
+            else:
+                # The limits are set from all points, only the thinned points are drawn
+                collection = ax.scatter(points[:0, 0], points[:0, 1], c=color, label=label)
+                self._autoscale(points)
+                collection.set_offsets(self._visible(points))
+            buffer = np.empty((max(len(points), 16), 2))
+            buffer[:len(points)] = points
+            self.series[label] = [collection, buffer, len(points)]
+            ax.legend()
+            ax.figure.canvas.draw_idle()
+            return collection
+
+        # Append to the existing collection, grow the buffer geometrically
+        entry = self.series[label]
+        collection, buffer, n = entry
+        if n + len(points) > len(buffer):
+            grown = np.empty((max(2 * len(buffer), n + len(points)), 2))
+            grown[:n] = buffer[:n]
+            buffer = entry[1] = grown
+        buffer[n:n + len(points)] = points
+        entry[2] = n = n + len(points)
+
+        # Only redraw everything if the new points leave the current view
+        xlim, ylim = ax.get_xlim(), ax.get_ylim()
+        self._autoscale(points)
+        collection.set_offsets(self._visible(buffer[:n]))
+        canvas = ax.figure.canvas
+        if self.blit and self._background is not None and xlim == ax.get_xlim() and ylim == ax.get_ylim():
+            canvas.restore_region(self._background)
+            ax.draw_artist(collection)
+            canvas.blit(ax.bbox)
+        else:
+            canvas.draw_idle()
+        return collection
+
+
+def add_scatter_points(plot_data, x, y, color=None, label=None):
+    """
+    Adds points to a scatter plot
+
+    Args:
+    plot_data: The ScatterPlot to add the points to
+    x: The x position data
+    y: The y position data
+    color: The color of the points, a random color is chosen if None
+    label: The label of the points
+
+    Returns:
+    The collection the points were added to
+    """
+    return plot_data.add_points(x, y, color=color, label=label)
@@ -0,0 +1,172 @@
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+TOC_CACHE_DIRECTORY = str(Path(__file__).resolve().parent / "toc_cache") # cflib TOC cache, one file per TOC CRC
+TOC_CACHE_ENTRIES = 32 # newest cache files kept, older ones are removed
+PARAM_TIMEOUT = 10 # in s, maximal time to wait for the parameter values after connecting
+DECK_TIMEOUT = 5 # in s
+# Connection phases in order, each ends with the named cflib event
+PHASES = ('link_open', 'toc_fetch', 'param_sync', 'deck_detect')
+
+
+def prepare_cache(directory=TOC_CACHE_DIRECTORY, entries=TOC_CACHE_ENTRIES):
+    """
+    Creates the TOC cache directory and removes all but the newest `entries` cache files.
+
+    cflib stores the log and param TOC as <CRC>.json, the CRC changes with the firmware, so files
+    of older firmware are never read again.
+
+    Returns:
+    The directory (str), to be passed as rw_cache to the Crazyflie
+    """
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    files = sorted(path.glob('*.json'), key=lambda file: file.stat().st_mtime, reverse=True)
+    for file in files[entries:]:
+        file.unlink()
+    return str(path)
+
+
+def crazyflie(cache_directory=TOC_CACHE_DIRECTORY):
+    """
+    Returns:
+    A Crazyflie with the managed TOC cache, None as directory disables the cache
+    """
+    from cflib.crazyflie import Crazyflie
+    if cache_directory is None:
+        return Crazyflie()
+    return Crazyflie(rw_cache=prepare_cache(cache_directory))
+
+
+class ConnectionTimer:
+    """
+    Timing of the connection phases of a crazyflie, from the cflib connection events:
+    - link_open: open requested until the first packet arrived
+    - toc_fetch: platform information, log TOC, memories and param TOC (from the cache if the CRC is known)
+    - param_sync: values of all parameters
+    - deck_detect: until mark('deck_detect') is called, e.g. when the loco deck was seen
+
+    Has to be created before the link is opened. The events can be waited on instead of fixed sleeps.
+    """
+
+    def __init__(self, cf, cache_directory=TOC_CACHE_DIRECTORY):
+        """
+        Args:
+        cf: Crazyflie (not connected yet)
+        cache_directory: TOC cache of the Crazyflie, to report whether the TOCs came from the cache
+        """
+        self.times = dict()
+        self.cache_directory = cache_directory
+        self._cached_files = self._cache_files()
+        self.connected = threading.Event()
+        self.params_updated = threading.Event()
+        cf.connection_requested.add_callback(lambda uri: self.mark('start'))
+        cf.link_established.add_callback(lambda uri: self.mark('link_open'))
+        cf.connected.add_callback(self._connected)
+        cf.fully_connected.add_callback(self._fully_connected)
+
+    def _cache_files(self):
+        if self.cache_directory is None:
+            return set()
+        return set(Path(self.cache_directory).glob('*.json'))
+
+    def _connected(self, uri):
+        self.mark('toc_fetch')
+        self.connected.set()
+
+    def _fully_connected(self, uri):
+        self.mark('param_sync')
+        self.params_updated.set()
+
+    def mark(self, phase):
+        # Only the first time counts, e.g. on reconnects
+        self.times.setdefault(phase, time.perf_counter())
+
+    @property
+    def toc_cached(self):
+        """
+        Returns:
+        True if no TOC had to be downloaded (no new cache file was written)
+        """
+        return self.cache_directory is not None and not (self._cache_files() - self._cached_files)
+
+    def phases(self):
+        """
+        Returns:
+        Dictionary phase -> duration in s for the finished phases, and 'total'
+        """
+        durations = dict()
+        previous = self.times.get('start')
+        for phase in PHASES:
+            if phase not in self.times or previous is None:
+                break
+            durations[phase] = self.times[phase] - previous
+            previous = self.times[phase]
+        if durations:
+            durations['total'] = previous - self.times['start']
+        return durations
+
+    def report(self):
+        phases = self.phases()
+        parts = ', '.join(f"{phase.replace('_', ' ')} {duration * 1000:.0f} ms" for phase, duration in phases.items() if phase != 'total')
+        cache = "TOC from cache" if self.toc_cached else "TOC downloaded"
+        return f"Connected in {phases.get('total', 0.0):.2f} s ({parts}; {cache})"
+
+
+def wait_for_deck(scf, timer, deck_event, timeout=DECK_TIMEOUT):
+    """
+    Waits for the parameter values and the loco deck, on events instead of fixed sleeps
+
+    Args:
+    scf: Connected SyncCrazyflie
+    timer: ConnectionTimer of the crazyflie
+    deck_event: Event set by the deck.bcLoco update callback
+    timeout: Maximal time to wait for the deck in s
+
+    Returns:
+    True if the loco deck is attached
+    """
+    if timer.params_updated.wait(timeout=PARAM_TIMEOUT) and not deck_event.is_set():
+        # The update callback may have been added after the values arrived
+        if int(scf.cf.param.get_value('deck.bcLoco')):
+            deck_event.set()
+    attached = deck_event.wait(timeout=timeout)
+    if attached:
+        timer.mark('deck_detect')
+    return attached
+
+
+# Connect repeatedly and print the timing of the connection phases, cold and with the TOC cache
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the connection phases of a crazyflie")
+    parser.add_argument('--uri', default="sim://connection", help="e.g. radio://0/100/2M/E7E7E7E701")
+    parser.add_argument('--count', type=int, default=3, help="number of connections")
+    parser.add_argument('--cache', default=TOC_CACHE_DIRECTORY, help="TOC cache directory")
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args(argv)
+
+    import cflib.crtp
+    from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+    import sim_link
+    cflib.crtp.init_drivers()
+    sim_link.register()
+    cache = None if args.no_cache else args.cache
+    simulated = sim_link.simulated_crazyflie(args.uri) if args.uri.startswith(sim_link.SIM_SCHEME) else None
+    for i in range(args.count):
+        sent = simulated.counters['uplink'] if simulated else 0
+        cf = crazyflie(cache)
+        timer = ConnectionTimer(cf, cache)
+        deck_event = threading.Event()
+        cf.param.add_update_callback(group='deck', name='bcLoco', cb=lambda _, value: int(value) and deck_event.set())
+        with SyncCrazyflie(args.uri, cf=cf) as scf:
+            attached = wait_for_deck(scf, timer, deck_event)
+        packets = f", {simulated.counters['uplink'] - sent} packets sent" if simulated else ""
+        print(f"{i + 1}: {timer.report()}{packets}" + ("" if attached else ", no loco deck"))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,450 @@
+import argparse
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from collections import deque
+import numpy as np
+
+from telemetry import TelemetryStore, TELEMETRY_DTYPE
+
+DASHBOARD_FPS = 20 # in Hz, refresh rate of the dashboard
+FRAME_QUEUE_SIZE = 2 # frames in flight to the dashboard process, further frames are coalesced
+TIME_WINDOW = 60 # in s, time range of the height and battery plots
+PATH_BUDGET = 2000 # points of the flown path drawn at once
+SERIES_BUDGET = 1000 # points per time series drawn at once
+LOGGING_RATE = 10 # in ms, expected log period, used to count packet gaps
+SERIES_CAPACITY = 2 * TIME_WINDOW * 1000 // LOGGING_RATE # samples kept by the dashboard process for the time series
+CLOSE_TIMEOUT = 2 # in s, time the dashboard process gets to exit
+MAX_PENDING = 60000 # samples kept for a dashboard that falls behind, older ones are dropped
+PUBLISH_TIMES = 10000 # publishing times kept for stats_summary
+
+
+class LinkMonitor:
+    """
+    Latest link statistics of a crazyflie (cf.link_statistics), updated by the cflib callbacks
+    """
+
+    def __init__(self, cf=None):
+        self.values = dict()
+        if cf is None:
+            return
+        statistics = cf.link_statistics
+        for name in ('latency', 'link_quality', 'uplink_rssi', 'uplink_rate', 'downlink_rate'):
+            getattr(statistics, name + '_updated').add_callback(self._setter(name))
+
+    def _setter(self, name):
+        def update(value):
+            self.values[name] = value
+        return update
+
+    def snapshot(self):
+        """
+        Returns:
+        Copy of the latest values, e.g. {'latency': 12.3, 'link_quality': 100.0}
+        """
+        return dict(self.values)
+
+
+class LiveDashboard:
+    """
+    Live telemetry dashboard rendered in a separate process.
+
+    A publisher thread in the flight process reads the new samples of the telemetry store at the
+    refresh rate and sends them as one frame through a small non-blocking queue. If the dashboard
+    falls behind, the frame is not sent and its samples are coalesced into the next frame, so frames
+    are dropped but samples are not. The flight process never calls matplotlib and never waits
+    for the dashboard.
+    """
+
+    def __init__(self, telemetry, anchors=None, planned=None, fps=DASHBOARD_FPS, stats=None, backend=None):
+        """
+        Args:
+        telemetry: TelemetryStore fed by the log callback
+        anchors: Array (N, 2+) of the anchor positions, drawn in the XY plot
+        planned: Array (M, 2+) of the planned trajectory, drawn in the XY plot
+        fps: Refresh rate in Hz
+        stats: Callable returning a dictionary of link statistics (e.g. LinkMonitor.snapshot), sent with every frame
+        backend: Matplotlib backend of the dashboard process, None for the default
+        """
+        self.telemetry = telemetry
+        self.anchors = None if anchors is None else np.asarray(anchors, dtype=float)[:, :2]
+        self.planned = None if planned is None else np.asarray(planned, dtype=float)[:, :2]
+        self.fps = fps
+        self.stats = stats
+        self.backend = backend
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.publish_times = deque(maxlen=PUBLISH_TIMES)
+        self.samples_dropped = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = None
+        self._queue = None
+
+    def start(self):
+        # A fresh interpreter, the dashboard shares no locks or threads with the flight process
+        context = multiprocessing.get_context('spawn')
+        self._queue = context.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self._process = context.Process(target=run_dashboard, name='dashboard', daemon=True,
+                                        args=(self._queue, self.anchors, self.planned, self.fps, self.backend))
+        self._process.start()
+        self._thread = threading.Thread(target=self._publish, name='dashboard-publisher', daemon=True)
+        self._thread.start()
+
+    def _publish(self):
+        period = 1.0 / self.fps
+        read = self.telemetry.total
+        pending = list()
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            deadline += period
+            if not self._stop.wait(max(0.0, deadline - time.monotonic())):
+                if not self._process.is_alive():
+                    # The window was closed or the dashboard died, stop publishing for the rest of the flight
+                    break
+                start = time.perf_counter()
+                rows, read = self.telemetry.since(read)
+                if len(rows):
+                    # Only the fields drawn by the dashboard, whatever the telemetry profile logs
+                    pending.append(rows[list(TELEMETRY_DTYPE.names)].astype(TELEMETRY_DTYPE))
+                frame = (np.concatenate(pending) if len(pending) > 1 else (pending[0] if pending else rows[:0].copy()),
+                         self.stats() if self.stats is not None else dict())
+                try:
+                    self._queue.put_nowait(frame)
+                    pending = list()
+                    self.frames_sent += 1
+                except queue.Full:
+                    # Keep the samples for the next frame, bounded so a stalled dashboard costs no memory
+                    pending = [frame[0][-MAX_PENDING:]]
+                    self.samples_dropped += max(0, len(frame[0]) - MAX_PENDING)
+                    self.frames_dropped += 1
+                self.publish_times.append(time.perf_counter() - start)
+
+    def close(self):
+        """
+        Stops publishing and closes the dashboard window
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        try:
+            self._queue.put(None, timeout=CLOSE_TIMEOUT)
+        except queue.Full:
+            pass
+        self._process.join(CLOSE_TIMEOUT)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._queue.cancel_join_thread()
+        self._thread = None
+
+    def stats_summary(self):
+        """
+        Returns:
+        Dictionary with the sent and dropped frames, the samples dropped for a stalled dashboard and the
+        publishing time per frame (in s, the latest PUBLISH_TIMES frames)
+        """
+        times = np.array(self.publish_times) if self.publish_times else np.zeros(1)
+        return {
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'samples_dropped': self.samples_dropped,
+            'publish_p50': float(np.percentile(times, 50)),
+            'publish_max': float(times.max()),
+        }
+
+
+class _PathBuffer:
+    # Flown path with at most `budget` points: new samples are appended and the buffer is thinned
+    # again when it is full, so the cost per frame does not grow with the length of the flight
+    def __init__(self, budget=PATH_BUDGET):
+        self.budget = budget
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+
+    def extend(self, x, y):
+        import cf_data
+        self.x = np.concatenate((self.x, x))
+        self.y = np.concatenate((self.y, y))
+        if len(self.x) > self.budget:
+            # Thinned to half the budget, the latest point is kept so the path reaches the crazyflie
+            kept = np.append(cf_data.grid_thin(self.x[:-1], self.y[:-1], self.budget // 2), len(self.x) - 1)
+            self.x, self.y = self.x[kept], self.y[kept]
+
+
+class _FlightData:
+    # Samples received by the dashboard process. Every frame is appended with one copy, the path and
+    # the packet gaps are updated from the new samples only, the time series keep the last samples
+    def __init__(self):
+        self.series = TelemetryStore(capacity=SERIES_CAPACITY, ring=True)
+        self.path = _PathBuffer()
+        self.start = None # timestamp of the first sample, in ms
+        self.gaps = 0
+        self.gap_max = 0 # in ms
+
+    @property
+    def samples(self):
+        return self.series.total
+
+    def extend(self, samples):
+        if not len(samples):
+            return
+        timestamps = samples['timestamp']
+        latest = self.series.latest()
+        if latest is None:
+            self.start = int(timestamps[0])
+        previous = timestamps[:1] if latest is None else [latest['timestamp']]
+        periods = np.diff(timestamps, prepend=previous)
+        self.gaps += int(np.count_nonzero(periods > 1.5 * LOGGING_RATE))
+        self.gap_max = max(self.gap_max, int(periods.max()))
+        self.series.extend(samples)
+        self.path.extend(samples['x'].astype(float), samples['y'].astype(float))
+
+
+class _DashboardFigure:
+    # Figure of the dashboard process, all data artists are animated and blitted
+    def __init__(self, plt, anchors, planned):
+        self.plt = plt
+        self.fig = plt.figure('Crazyflie live', figsize=(11, 6))
+        grid = self.fig.add_gridspec(3, 2, width_ratios=(3, 2))
+        self.ax_path = self.fig.add_subplot(grid[:, 0])
+        self.ax_height = self.fig.add_subplot(grid[0, 1])
+        self.ax_battery = self.fig.add_subplot(grid[1, 1], sharex=self.ax_height)
+        self.ax_text = self.fig.add_subplot(grid[2, 1])
+        self.ax_text.axis('off')
+
+        self.ax_path.set_xlabel('x [m]')
+        self.ax_path.set_ylabel('y [m]')
+        self.ax_path.set_aspect('equal', adjustable='box')
+        self.ax_path.grid(True)
+        reference = [np.zeros((0, 2))]
+        if anchors is not None:
+            self.ax_path.scatter(anchors[:, 0], anchors[:, 1], c='red', label='Anchors')
+            reference.append(anchors)
+        if planned is not None:
+            self.ax_path.plot(planned[:, 0], planned[:, 1], '--', color='blue', label='Trajectory')
+            reference.append(planned)
+        self.path, = self.ax_path.plot([], [], color='green', label='Flight', animated=True)
+        self.position, = self.ax_path.plot([], [], 'o', color='black', animated=True)
+        self.ax_path.legend(loc='upper right')
+        reference = np.vstack(reference)
+        if len(reference):
+            self._set_limits(self.ax_path, reference[:, 0], reference[:, 1])
+
+        self.ax_height.set_ylabel('Height [m]')
+        self.ax_height.set_ylim(0, 1.5)
+        self.ax_height.grid(True)
+        self.height, = self.ax_height.plot([], [], color='green', animated=True)
+        self.ax_battery.set_ylabel('Battery [V]')
+        self.ax_battery.set_xlabel('Time [s]')
+        self.ax_battery.set_ylim(3.0, 4.3)
+        self.ax_battery.grid(True)
+        self.battery, = self.ax_battery.plot([], [], color='orange', animated=True)
+        self.ax_height.set_xlim(0, TIME_WINDOW)
+        self.text = self.ax_text.text(0, 1, '', va='top', family='monospace', animated=True)
+
+        self.artists = (self.path, self.position, self.height, self.battery, self.text)
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _set_limits(self, ax, x, y, margin=0.3):
+        ax.set_xlim(np.min(x) - margin, np.max(x) + margin)
+        ax.set_ylim(np.min(y) - margin, np.max(y) + margin)
+
+    def _on_draw(self, event):
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def update(self, data, text):
+        """
+        Updates the artists, returns True if the limits changed and the figure needs a full redraw
+        """
+        import cf_data
+        redraw = False
+        flight = data.series.view()
+        if len(flight):
+            x, y = data.path.x, data.path.y
+            self.path.set_data(x, y)
+            self.position.set_data([x[-1]], [y[-1]])
+            (x0, x1), (y0, y1) = self.ax_path.get_xlim(), self.ax_path.get_ylim()
+            if not (x0 <= x[-1] <= x1 and y0 <= y[-1] <= y1):
+                # The limits already contain the older points
+                self._set_limits(self.ax_path, np.append(x, (x0, x1)), np.append(y, (y0, y1)), margin=0.1)
+                redraw = True
+
+            t = (flight['timestamp'] - data.start) / 1000
+            t0, t1 = self.ax_height.get_xlim()
+            if t[-1] > t1:
+                # Scroll by half a window, a full redraw every TIME_WINDOW/2 s only
+                t0 = t[-1] - TIME_WINDOW / 2
+                self.ax_height.set_xlim(t0, t0 + TIME_WINDOW)
+                redraw = True
+            first = np.searchsorted(t, t0)
+            for line, ax, values in ((self.height, self.ax_height, flight['z']), (self.battery, self.ax_battery, flight['batterylevel'])):
+                values = values[first:].astype(float)
+                kept = cf_data.minmax(values, SERIES_BUDGET)
+                line.set_data(t[first:][kept], values[kept])
+                low, high = ax.get_ylim()
+                if values.min() < low or values.max() > high:
+                    ax.set_ylim(min(low, values.min() - 0.1), max(high, values.max() + 0.1))
+                    redraw = True
+        self.text.set_text(text)
+        return redraw
+
+    def render(self, redraw):
+        canvas = self.fig.canvas
+        if redraw or self.background is None:
+            canvas.draw()
+        else:
+            canvas.restore_region(self.background)
+            for artist in self.artists:
+                self.fig.draw_artist(artist)
+            canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+
+def _status_text(data, stats, frames, render_time):
+    # Link and dashboard statistics shown below the plots
+    lines = [f"samples        {data.samples}"]
+    recent = data.series.last(1000)
+    if len(recent) > 1:
+        period = np.diff(recent['timestamp'])
+        lines.append(f"log rate       {1000 / max(np.mean(period), 1e-9):.1f} Hz")
+        lines.append(f"packet gaps    {data.gaps} (max {data.gap_max} ms)")
+        lines.append(f"battery        {recent['batterylevel'][-1]:.2f} V")
+    for name, unit in (('latency', 'ms'), ('link_quality', '%'), ('uplink_rssi', 'dBm'), ('uplink_rate', 'pk/s'), ('downlink_rate', 'pk/s')):
+        if name in stats:
+            lines.append(f"{name.replace('_', ' '):<15}{stats[name]:.1f} {unit}")
+    lines.append(f"frames         {frames}, render {render_time * 1000:.1f} ms")
+    return "\n".join(lines)
+
+
+def run_dashboard(frames, anchors=None, planned=None, fps=DASHBOARD_FPS, backend=None):
+    """
+    Main loop of the dashboard process: collects the frames and redraws at most `fps` times per second.
+    Returns when None is received or the window is closed.
+
+    Args:
+    frames: Queue of (samples, link statistics) frames, None to stop
+    anchors: Array (N, 2) of the anchor positions
+    planned: Array (M, 2) of the planned trajectory
+    fps: Refresh rate in Hz
+    backend: Matplotlib backend, None for the default
+    """
+    import matplotlib
+    if backend is not None:
+        matplotlib.use(backend)
+    import matplotlib.pyplot as plt
+    figure = _DashboardFigure(plt, anchors, planned)
+    plt.show(block=False)
+    data = _FlightData()
+    stats = dict()
+    count = 0
+    render_times = deque(maxlen=PUBLISH_TIMES) # bounded, the median is taken every frame
+    period = 1.0 / fps
+    deadline = time.monotonic()
+    running = True
+    while running:
+        # Collect all frames that arrived since the last redraw
+        try:
+            frame = frames.get(timeout=max(0.0, deadline - time.monotonic()))
+            while frame is not None:
+                samples, stats = frame
+                data.extend(samples)
+                frame = frames.get_nowait()
+            running = False
+        except queue.Empty:
+            pass
+        if time.monotonic() < deadline and running:
+            continue
+        deadline = max(deadline + period, time.monotonic())
+        if not plt.fignum_exists(figure.fig.number):
+            break
+        start = time.perf_counter()
+        figure.render(figure.update(data, _status_text(data, stats, count, np.median(render_times) if render_times else 0.0)))
+        render_times.append(time.perf_counter() - start)
+        count += 1
+    if render_times:
+        times = np.array(render_times) * 1000
+        print(f"Dashboard: {count} frames, render p50 {np.percentile(times, 50):.1f} ms, p99 {np.percentile(times, 99):.1f} ms")
+    plt.close(figure.fig)
+
+
+def _feed(telemetry, data, rate, stop):
+    # Appends the samples in real time, like the log callback
+    period = 1.0 / rate
+    start = time.monotonic()
+    for i, sample in enumerate(data.tolist()):
+        if stop.is_set():
+            return
+        remaining = start + i * period - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        telemetry.append(*sample)
+
+
+def _null_commander():
+    class Commander:
+        def send_hover_setpoint(self, *args):
+            pass
+        def send_stop_setpoint(self):
+            pass
+    return Commander()
+
+
+def measure_jitter(duration, fps=DASHBOARD_FPS, dashboard=True, backend=None, rate=100):
+    """
+    Streams setpoints at 50 Hz on a null commander while synthetic telemetry is fed at `rate` Hz,
+    with or without the dashboard
+
+    Returns:
+    Tuple (jitter of the setpoint scheduler, dashboard statistics or None)
+    """
+    from benchmark import synthetic_telemetry
+    from scheduler import SetpointScheduler, SETPOINT_RATE
+    telemetry = TelemetryStore(capacity=int(rate * duration) + 1, ring=True)
+    data = synthetic_telemetry(rate, duration / 60)
+    live = None
+    if dashboard:
+        live = LiveDashboard(telemetry, anchors=[[0, 0], [3, 0], [3, 3], [0, 3]], fps=fps, backend=backend)
+        live.start()
+        # Let the dashboard process start up, its startup is not part of the flight
+        time.sleep(3)
+    stop = threading.Event()
+    feeder = threading.Thread(target=_feed, args=(telemetry, data, rate, stop))
+    feeder.start()
+    scheduler = SetpointScheduler(_null_commander(), rate=SETPOINT_RATE)
+    scheduler.run(np.zeros((int(duration * SETPOINT_RATE), 4)))
+    stop.set()
+    feeder.join()
+    if live is None:
+        return scheduler.jitter(), None
+    live.close()
+    return scheduler.jitter(), live.stats_summary()
+
+
+# Live dashboard with synthetic telemetry, optionally comparing the setpoint jitter with and without it
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Live telemetry dashboard fed with synthetic telemetry")
+    parser.add_argument('--duration', type=float, default=20, help="in s")
+    parser.add_argument('--fps', type=float, default=DASHBOARD_FPS)
+    parser.add_argument('--backend', default=None, help="matplotlib backend, e.g. Agg without display")
+    parser.add_argument('--compare-jitter', action='store_true', help="also measure the setpoint jitter without the dashboard")
+    args = parser.parse_args(argv)
+
+    runs = [False, True] if args.compare_jitter else [True]
+    for dashboard in runs:
+        jitter, stats = measure_jitter(args.duration, args.fps, dashboard, args.backend)
+        print(f"{'With' if dashboard else 'Without'} dashboard: setpoints at {jitter['rate']:.1f} Hz, lateness p50 {jitter['late_p50']*1000:.2f} ms, "
+              f"p99 {jitter['late_p99']*1000:.2f} ms, max {jitter['late_max']*1000:.2f} ms")
+        if stats is not None:
+            print(f"Frames: {stats['frames_sent']} sent, {stats['frames_dropped']} coalesced, "
+                  f"publishing p50 {stats['publish_p50']*1000:.3f} ms, max {stats['publish_max']*1000:.3f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,21 +1,33 @@
+import time
+LAUNCH_TIME = time.perf_counter() # start of the imports, to measure the startup time
+import importlib.util
 import logging
+import os
 import sys
-import time
 from threading import Event
 import threading
 import numpy as np
 from datetime import date
-from pynput import keyboard
 import cf_data as cf_data
-import matplotlib.pyplot as plt
+from battery import BatterySupervisor, BATTERY_THRESHOLD_LOW, BATTERY_HYSTERESIS, BATTERY_DEBOUNCE
+from log_writer import FlightLogWriter, format_header
+import binlog
+import poly_trajectory
+from scheduler import SetpointScheduler, expand_segments, EIGHT_SEGMENTS
+from motion import InterruptibleMotion, CONTROL_TICK
+import sim_link
+from dashboard import LiveDashboard, LinkMonitor
+from state_bus import StatePublisher
+import anchor_geometry
+import connection
+import telemetry_profiles
 
 import cflib.crtp
-from cflib.crazyflie import Crazyflie
-from cflib.crazyflie.log import LogConfig
 from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
 from cflib.positioning.motion_commander import MotionCommander
 from cflib.utils import uri_helper
-from cflib.positioning.position_hl_commander import PositionHlCommander
+# matplotlib, pandas, yaml and pynput are imported on first use (see benchmark.py import_demo)
+IMPORT_TIME = time.perf_counter() - LAUNCH_TIME
 
 # Address of the Crazyflie
 URI = ""
@@ -23,9 +35,19 @@ URI = ""
 
 # Define Constants
 DEFAULT_HEIGHT = 1 # in m
-BATTERY_THRESHOLD_LOW = 2.8 # in V
-LOGGING_RATE = 10 # in ms
+TELEMETRY_PROFILE = 'compact' # log variables and periods, see telemetry_profiles.py
+SETPOINT_RATE = 50 # in Hz, rate of the hover setpoints of the eight
+TELEMETRY_WINDOW = 60000 # in samples, kept in memory (10 min at 100 Hz), the full flight is streamed to disk
 LOCO_SETUP_FILE = ""
+DEMO_DIRECTORY = os.path.dirname(os.path.abspath(__file__)) # setup files and logs do not depend on the working directory
+SETUP_DIRECTORY = os.path.normpath(os.path.join(DEMO_DIRECTORY, "..", "setup_files"))
+LOG_DIRECTORY = os.path.join(DEMO_DIRECTORY, "log_files")
+TRAJECTORY_UPLOAD = True # fly timed trajectories as uploaded polynomials instead of one go_to per point
+PLOTTING = importlib.util.find_spec('matplotlib') is not None # plots are optional, skipped without matplotlib
+WRITE_BINARY_LOG = True # write a binary copy of the log (see binlog.py) next to the text log
+LIVE_DASHBOARD = True # show the telemetry live during the flight, rendered in a separate process (see dashboard.py)
+STATE_BUS = True # publish the telemetry to shared memory for other local processes (see state_bus.py)
+GDOP_LIMIT = anchor_geometry.GDOP_LIMIT # planned trajectories through cells with a higher GDOP need a confirmation
 
 # Define Events
 deck_attached_event = Event()
@@ -35,20 +57,14 @@ emergency_stop_event = threading.Event()
 
 # Define logging parameters
 logging.basicConfig(level=logging.ERROR)
-x_log = list()
-y_log = list()
-z_log = list()
-timestamp_log = list()
-batteryLevel_log = list()
+telemetry = telemetry_profiles.get_profile(TELEMETRY_PROFILE).create_store(TELEMETRY_WINDOW, ring=True)
+log_writer = None # FlightLogWriter, streams the telemetry to disk while flying
+state_bus = None # StatePublisher, shares the telemetry with local reader processes
+battery_supervisor = BatterySupervisor(land_event, threshold=BATTERY_THRESHOLD_LOW,
+                                       hysteresis=BATTERY_HYSTERESIS, debounce=BATTERY_DEBOUNCE)
 
 # Define plotting dataset
-plot_data = {
-    'x': [],
-    'y': [],
-    'z': [],
-    'colors': [],
-    'labels': []   
-}
+plot_data = cf_data.ScatterPlot(budget=cf_data.PLOT_BUDGET)
     
 
 # Fly created trajectories
@@ -76,30 +92,58 @@ def hl_motion_commander_fly_trajectory(scf,x,y,z, x_init,y_init):
     cf.param.set_value('kalman.resetEstimation', '0')
     time.sleep(2)
     
-    # Fly the trajectory
-    with PositionHlCommander(scf, default_height=DEFAULT_HEIGHT) as mc:
-        if land_event.is_set():
-            land_callback(scf)
+    # Fly the trajectory, every move is preempted by landing or emergency stop
+    motion = InterruptibleMotion(cf, land_event, emergency_stop_event, position=current_position)
+    if not (motion.take_off(DEFAULT_HEIGHT) and motion.wait(1) and motion.go_to(x_init, y_init, z) and motion.wait(1)):
+        flying_done_event.set()
+        return 1
+
+    for i in range(len(x)):
+        # Fly each point of the path
+        if not motion.go_to(x[i], y[i]):
+            flying_done_event.set()
             return 1
 
-        time.sleep(1)
-        mc.go_to(x_init,y_init, z)
-        time.sleep(1)
-
-        for i in range(len(x)):
-            if land_event.is_set():
-                land_callback(scf)
-                return 1
-            # Fly each point of the path
-            mc.go_to(x[i], y[i])
-
-        mc.go_to(x_init, y_init, z)
-        time.sleep(1)
-        # Landing
-        for z in range(15,0,-1):
-            scf.cf.commander.send_hover_setpoint(0, 0, 0, z / 15)
-            time.sleep(0.1)
-        return 0
+    if not (motion.go_to(x_init, y_init, z) and motion.wait(1)):
+        flying_done_event.set()
+        return 1
+    # Landing
+    motion.land()
+    return 0
+
+# Fly created trajectories as polynomials uploaded to the crazyflie
+def hl_commander_fly_uploaded_trajectory(scf, positions, z, x_init, y_init):
+    '''
+    Fits polynomials to the timed trajectory, uploads them once and flies them
+    with a single start command of the high level commander
+
+    Args:
+    scf: SyncCrazyflie object
+    positions: trajectory with columns x, y, t (time in s)
+    z: flight height
+    x_init: initial x position, flown back to before landing
+    y_init: initial y position
+
+    Returns:
+    0: if the flight was successful
+    1: if the flight was interrupted
+    '''
+    cf = scf.cf
+    pieces = poly_trajectory.fit_polynomials(positions, z)
+    poly_trajectory.upload_trajectory(poly_trajectory.trajectory_memory(cf), cf.high_level_commander, pieces)
+
+    # Reset the estimation
+    cf.param.set_value('commander.enHighLevel', '1')
+    cf.param.set_value('kalman.resetEstimation', '1')
+    time.sleep(0.1)
+    cf.param.set_value('kalman.resetEstimation', '0')
+    time.sleep(2)
+
+    motion = InterruptibleMotion(cf, land_event, emergency_stop_event, position=current_position)
+    result = poly_trajectory.fly_uploaded_trajectory(motion, pieces, z, home=(x_init, y_init))
+    if result:
+        flying_done_event.set()
+    return result
 
 def fly_eight(scf):
     '''
@@ -124,73 +168,16 @@ def fly_eight(scf):
         scf.cf.commander.send_stop_setpoint()
         return 1
 
+    # Stream the precomputed eight at a fixed rate
+    scheduler = SetpointScheduler(scf.cf.commander, rate=SETPOINT_RATE, land_event=land_event, emergency_stop_event=emergency_stop_event)
+    result = scheduler.run(expand_segments(EIGHT_SEGMENTS, SETPOINT_RATE))
+    jitter = scheduler.jitter()
+    if jitter['sent']:
+        print(f"Setpoints: {jitter['sent']} sent at {jitter['rate']:.1f} Hz, lateness p50 {jitter['late_p50']*1000:.2f} ms, "
+              f"p99 {jitter['late_p99']*1000:.2f} ms, max {jitter['late_max']*1000:.2f} ms")
+    if result:
+        return 1
 
-    for y in range(10):
-        
-        if emergency_stop_event.is_set():
-            print("Stopping motors")
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-        scf.cf.commander.send_hover_setpoint(0, 0, 0, y / 25)
-        time.sleep(0.1)
-        if land_event.is_set():
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-
-    for _ in range(20):
-        if emergency_stop_event.is_set():
-            print("Stopping motors")
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-        scf.cf.commander.send_hover_setpoint(0, 0, 0, 0.4)
-        time.sleep(0.1)
-        if land_event.is_set():
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-
-    for _ in range(50):
-        
-        if emergency_stop_event.is_set():
-            print("Stopping motors")
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-        scf.cf.commander.send_hover_setpoint(0.5, 0, 36 * 2, 0.4)
-        time.sleep(0.1)
-        if land_event.is_set():
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-
-    for _ in range(50):
-       
-        if emergency_stop_event.is_set():
-            print("Stopping motors")
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-        scf.cf.commander.send_hover_setpoint(0.5, 0, -36 * 2, 0.4)
-        time.sleep(0.1)
-        if land_event.is_set():
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-
-    for _ in range(20):
-        if emergency_stop_event.is_set():
-            print("Stopping motors")
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-        scf.cf.commander.send_hover_setpoint(0, 0, 0, 0.4)
-        time.sleep(0.1)
-
-        if land_event.is_set():
-                scf.cf.commander.send_stop_setpoint()
-                return 1
-
-    for y in range(10):
-        if emergency_stop_event.is_set():
-            print("Stopping motors")
-            scf.cf.commander.send_stop_setpoint()
-            return 1
-        scf.cf.commander.send_hover_setpoint(0, 0, 0, (10 - y) / 25)
-        time.sleep(0.1)
     print("Stopping motors")
     scf.cf.commander.send_stop_setpoint()
     # Hand control over to the high level commander to avoid timeout and locking of the Crazyflie
@@ -198,71 +185,40 @@ def fly_eight(scf):
     return 0
 
 # log callback
-def log_pos_callback(timestamp, data, logconf):
+def log_pos_callback(row):
     """
     logging the latest position, and battery data
-    """
-    global x_log
-    global y_log
-    global z_log
-    global timestamp_log
-    global batteryLevel_log
-
 
-    x_log.append(data['stateEstimate.x'])
-    y_log.append(data['stateEstimate.y'])
-    z_log.append(data['stateEstimate.z'])
-    timestamp_log.append(timestamp)
-    batteryLevel_log.append(data['pm.vbat'])
+    row: timestamp, x, y, z, batterylevel and the extra fields of the telemetry profile
+    """
+    telemetry.append(*row)
+    # The log file and the state bus carry the position and battery columns only
+    if log_writer is not None:
+        log_writer.put(row[:5])
+    bus = state_bus # read once, the flight's finally clears it
+    if bus is not None:
+        bus.publish(*row[:5])
 
 # log default
 def log_default():
     """
     reset the logging data
     """
-    global x_log
-    global y_log
-    global z_log
-    global timestamp_log
-    global batteryLevel_log
-
-    x_log = list()
-    y_log = list()
-    z_log = list()
-    timestamp_log = list()
-    batteryLevel_log = list()
-
-
-# low battery callback and landing
-def land_callback(scf):
-    x,y = x_log[-1],y_log[-1]
-    print(f"Landing at {x},{y}")
-    for z in range(15,0,-1):
-        scf.cf.commander.send_hover_setpoint(0, 0, 0, z / 15)
-        time.sleep(0.1)
-    flying_done_event.set()
+    telemetry.clear()
 
-         
-   
 
-
-# Thread: function to check battery level
-def check_battery_level():
-    while not (len(batteryLevel_log) > 0):
-        pass
-    while True:
-        time.sleep(0.1)
-        battery_level = batteryLevel_log[-1]
-        if (battery_level <= BATTERY_THRESHOLD_LOW and battery_level >= 2):
-            land_event.set()
-            print(f"Low Battery threshold was undercut: {battery_level}")
-            break
-        if flying_done_event.is_set():
-            break
+# current estimated position, used to land from
+def current_position():
+    sample = telemetry.latest()
+    if sample is None:
+        return None
+    return sample['x'], sample['y'], sample['z']
 
 
 # Thread: keyboard inputs
 def keyboard_input():
+    # Imported here, pynput needs a display connection and is not needed before the flight
+    from pynput import keyboard
     # Collect events until released
     listener = keyboard.Listener(on_press=on_press, on_release=on_release)
     listener.start()
@@ -273,10 +229,9 @@ def keyboard_input():
 
 # Thread: emergency stop
 def motor_stop(scf):
-    while not emergency_stop_event.is_set():
+    while not emergency_stop_event.wait(CONTROL_TICK):
         if(flying_done_event.is_set()):
             break
-        time.sleep(0.5)
     print("Stopping motors")
     flying_done_event.set()
     for i in range(10):
@@ -289,22 +244,30 @@ def motor_stop(scf):
 
     
 
+# Show the plot, matplotlib is only imported when something is plotted
+def show_plot(block=True):
+    if PLOTTING:
+        import matplotlib.pyplot as plt
+        plt.show(block=block)
+
+
 # Keyboard methods on press
 def on_press(key):
     try:
+        # Set the events first, the console output must not delay them
         if key.char == 'q':
+            emergency_stop_event.set()
             time.sleep(0.2)
             # Move the cursor back and remove the last character
             sys.stdout.write('\b \b')
             sys.stdout.flush()
             print("Emergency Stop")
-            emergency_stop_event.set()
         if key.char == 'l':
+            land_event.set()
             time.sleep(0.2)
             sys.stdout.write('\b \b')
             sys.stdout.flush()
             print("Landing")
-            land_event.set()
     except AttributeError:
         pass
 
@@ -364,49 +327,50 @@ if __name__ == '__main__':
     #anchor config
     anchor_setup = input("Enter the anchor setup file: 4 anchors (1), 8 anchors (plane)(2), 8 anchors (space)(3), custom(4): ")
     if anchor_setup == '1':
-        LOCO_SETUP_FILE = "../setup_files/anchor_positions_4a.yaml"
+        LOCO_SETUP_FILE = os.path.join(SETUP_DIRECTORY, "anchor_positions_4a.yaml")
     elif anchor_setup == '2':
-        LOCO_SETUP_FILE = "../setup_files/anchor_positions_8a_small.yaml"
+        LOCO_SETUP_FILE = os.path.join(SETUP_DIRECTORY, "anchor_positions_8a_small.yaml")
     elif anchor_setup == '3':
-        LOCO_SETUP_FILE = "../setup_files/anchor_positions_8a_tripod.yaml"
+        LOCO_SETUP_FILE = os.path.join(SETUP_DIRECTORY, "anchor_positions_8a_tripod.yaml")
     elif anchor_setup == '4':
-        LOCO_SETUP_FILE = "../setup_files/anchor_positions_custom.yaml"
+        LOCO_SETUP_FILE = os.path.join(SETUP_DIRECTORY, "anchor_positions_custom.yaml")
     else:
         print("Invalid input")
         sys.exit(1)
     print("Remember to check and set the configuration of the anchors with the crazyflie-client aswell")
         
 
-    # Create the battery monitoring thread, and the key listener thread
-    battery_thread = threading.Thread(target=check_battery_level, args=())
+    # Create the key listener thread, the battery is supervised from the log callback
     key_listener_thread = threading.Thread(target=keyboard_input, args=())
     
     
 
 
     cflib.crtp.init_drivers()
+    # sim:// uris (e.g. CFLIB_URI=sim://1) fly a simulated crazyflie, see sim_link.py
+    sim_link.register()
 
-    with SyncCrazyflie(URI, cf=Crazyflie()) as scf:   #'./cache'
+    # The TOCs are cached by their CRC, reconnecting to the same firmware skips the TOC download
+    cf = connection.crazyflie()
+    connection_timer = connection.ConnectionTimer(cf)
+    with SyncCrazyflie(URI, cf=cf) as scf:
         # Create the motor stop thread
         stop_thread = threading.Thread(target=motor_stop, args=(scf,))
 
         scf.cf.param.add_update_callback(group='deck', name='bcLoco', cb=param_deck_bcloco)
-        time.sleep(0.2)
 
         # logging config
-        logconf = LogConfig(name='Position', period_in_ms=LOGGING_RATE)
-        logconf.add_variable('stateEstimate.x', 'float')
-        logconf.add_variable('stateEstimate.y', 'float')
-        logconf.add_variable('stateEstimate.z', 'float')
-        logconf.add_variable('pm.vbat', 'float')
-        scf.cf.log.add_config(logconf)
-        logconf.data_received_cb.add_callback(log_pos_callback)
-
-        #check loco deck
-        if not deck_attached_event.wait(timeout=5):
+        profile = telemetry_profiles.get_profile(TELEMETRY_PROFILE)
+        # The supervisor gets the fresh battery samples only, not the held value of every pose row
+        logconf = telemetry_profiles.ProfileLogger(profile, scf.cf, log_pos_callback,
+                                                   {'batterylevel': battery_supervisor.update})
+        print(profile.report())
+
+        #check loco deck, waits for the parameter values instead of fixed sleeps
+        if not connection.wait_for_deck(scf, connection_timer, deck_attached_event):
             print('No loco deck detected!')
             sys.exit(1)
-        time.sleep(0.2)
+        print(f"{URI}: imports {IMPORT_TIME:.2f} s. {connection_timer.report()}")
 
         
         scf.cf.commander.send_hover_setpoint
@@ -426,90 +390,120 @@ if __name__ == '__main__':
         
         #plot anchors positions and trajectory
         anchor_pos = np.array(cf_data.obtain_anchor_positions(LOCO_SETUP_FILE))
-        x_init = anchor_pos[1,0] /2
-        y_init = anchor_pos[2,1] /2  
-        cf_data.add_scatter_points(plot_data, anchor_pos[:,0], anchor_pos[:,1], color='red', label='Anchors')
+        x_init, y_init = cf_data.initial_position(anchor_pos)
+        if PLOTTING:
+            cf_data.add_scatter_points(plot_data, anchor_pos[:,0], anchor_pos[:,1], color='red', label='Anchors')
 
         
         # add trajectory to plot data
+        positions = None
         if (demo_type == 1):
             logconf.start()
-            positions = cf_data.set_waypoints(num_waypoints,x_log,y_log,z_log)
+            positions = cf_data.set_waypoints(num_waypoints,telemetry)
             logconf.stop()
             log_default()
         elif (demo_type == 2):
-            if (trajectory_type == 1):
-                positions = cf_data.create_trajectory(3, x_init, y_init)
-            if (trajectory_type == 2):
-                #starting in middle and flying to the corners (endpoints 1.6,1.6)
-                positions = np.array([[0.2,0.2],[x_init * 2 - 0.2, 0.2],[x_init * 2 - 0.2, y_init * 2 - 0.2],[0.2, y_init * 2 - 0.2], [x_init,y_init]])
+            positions = cf_data.planned_trajectory(trajectory_type, x_init, y_init)
 
         #cf_data.printing_trajectory(x,y, "X", "Y")
         
-        if (demo_type == 1 or (demo_type == 2 and not trajectory_type == 3)):
-             cf_data.add_scatter_points(plot_data, positions[:,0], positions[:,1], color='blue', label='Trajectory')
-             plt.show(block=False)
+        if (positions is not None):
+             if PLOTTING:
+                 cf_data.add_scatter_points(plot_data, positions[:,0], positions[:,1], color='blue', label='Trajectory')
+                 show_plot(block=False)
+             # Check the anchor geometry along the planned path, the map is cached per setup file
+             gdop_map, _ = anchor_geometry.load_gdop_map(LOCO_SETUP_FILE)
+             vetting = anchor_geometry.vet_trajectory(gdop_map, positions, DEFAULT_HEIGHT, GDOP_LIMIT, start=(x_init, y_init))
+             print(f"Anchor geometry along the trajectory: GDOP max {vetting['gdop_max']:.2f}, mean {vetting['gdop_mean']:.2f}")
+             if not vetting['ok']:
+                 print(f"{vetting['over_length']:.2f} m of the path are in poorly covered regions (GDOP > {GDOP_LIMIT}), first at {vetting['first_over']}")
+                 if input("Fly anyway? (y/n): ").strip().lower() != 'y':
+                     sys.exit(1)
         input("Place the crazyflie in direction of the positive x-axis. Enter to start: ")
-    
-        logconf.start()
-        battery_thread.start()
-        key_listener_thread.start()
-        stop_thread.start()
-        time.sleep(0.4)
-
-        ## flying
-        if (demo_type == 1 or (demo_type == 2 and not trajectory_type == 3)):
-            hl_motion_commander_fly_trajectory(scf, positions[:,0],positions[:,1],1, x_init,y_init)
-            #pass
-        elif (demo_type == 2 and trajectory_type == 3):
-            fly_eight(scf)
-            #pass
-
-        time.sleep(2)
-        flying_done_event.set()
-        battery_thread.join()
-        key_listener_thread.join()
-        stop_thread.join()
-        logconf.stop()
+
+        # Stream the logging data to disk while flying, the file is renamed or removed afterwards
+        timestamp = time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime())
+        os.makedirs(LOG_DIRECTORY, exist_ok=True)
+        file_name = os.path.join(LOG_DIRECTORY, "cf_logging_" + timestamp + ".txt")
+        log_writer = FlightLogWriter(file_name, format_header(sys.argv, timestamp, (demo_type, trajectory_type, num_waypoints), LOCO_SETUP_FILE))
+        log_writer.start()
+        dashboard = None
+        if LIVE_DASHBOARD and PLOTTING:
+            dashboard = LiveDashboard(telemetry, anchors=anchor_pos, planned=positions, stats=LinkMonitor(scf.cf).snapshot)
+            dashboard.start()
+
+        try:
+            # Created inside the try, the finally removes the shared memory also on early exits
+            if STATE_BUS:
+                state_bus = StatePublisher()
+            logconf.start()
+            battery_supervisor.arm()
+            key_listener_thread.start()
+            stop_thread.start()
+            time.sleep(0.4)
+
+            ## flying
+            if (TRAJECTORY_UPLOAD and demo_type == 2 and trajectory_type == 1):
+                hl_commander_fly_uploaded_trajectory(scf, positions, DEFAULT_HEIGHT, x_init, y_init)
+            elif (demo_type == 1 or (demo_type == 2 and not trajectory_type == 3)):
+                hl_motion_commander_fly_trajectory(scf, positions[:,0],positions[:,1],1, x_init,y_init)
+                #pass
+            elif (demo_type == 2 and trajectory_type == 3):
+                fly_eight(scf)
+                #pass
+
+            time.sleep(2)
+            flying_done_event.set()
+            battery_supervisor.disarm()
+            if battery_supervisor.triggered:
+                stats = battery_supervisor.stats()
+                print(f"Low Battery threshold was undercut: {stats['trigger_battery_level']:.2f} V")
+                print(f"Battery supervisor: landing triggered {stats['trigger_delay_ms']} ms (log time) after the first low sample, "
+                      f"{stats['trigger_latency']*1000:.1f} ms after it arrived")
+            key_listener_thread.join()
+            stop_thread.join()
+        finally:
+            # Stop the log blocks first, so the log callback does not write to the closed log writer
+            # and state bus, also if the flight was interrupted (e.g. Ctrl-C)
+            if logconf.started:
+                logconf.stop()
+            # Finalize the log file
+            log_writer.close()
+            if dashboard is not None:
+                dashboard.close()
+            if state_bus is not None:
+                # Detach the callback first, then remove the shared memory
+                bus, state_bus = state_bus, None
+                bus.close()
         scf.cf.close_link()
 
     #Adding flight data to plot
-    cf_data.add_scatter_points(plot_data, x_log, y_log, color='green', label='Flight')
-    # Show plot
-    plt.show(block=False)
+    flight = telemetry.view()
+    if PLOTTING:
+        cf_data.add_scatter_points(plot_data, flight['x'], flight['y'], color='green', label='Flight')
+        # Show plot
+        show_plot(block=False)
 
     chars_to_strip = "ql"
     store = strip_chars(input("Do you want to save the logging data? (y/n/d(default file name)):").strip().lower(),chars_to_strip)
-    
-    # Format the date and time for the filename
-    timestamp = time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime())
 
-    # Save the logging data to a file
-    file_name = "log_files/cf_logging_" + timestamp + ".txt"
+    # The logging data was already written during the flight
+    stats = log_writer.stats()
+    print(f"Log writer: {stats['rows_written']} rows written, {stats['rows_dropped']} dropped, max queue depth {stats['queue_depth_max']}, "
+          f"write latency mean {stats['write_time_mean']*1000:.3f} ms, max {stats['write_time_max']*1000:.3f} ms")
     if (store == 'n'):
+        os.remove(file_name)
         print("Logging data not saved")
         print("Demo finished")
         sys.exit(0)
     elif (store == 'y'):
-        file_name = input("Enter the file name to save the logging data(without extension): ")
-        file_name = "log_files/" + file_name + "_" + timestamp + ".txt"
+        new_file_name = input("Enter the file name to save the logging data(without extension): ")
+        new_file_name = os.path.join(LOG_DIRECTORY, new_file_name + "_" + timestamp + ".txt")
+        os.replace(file_name, new_file_name)
+        file_name = new_file_name
 
-        
-    with open(file_name, 'w') as file:
-        file.write(f"Logging data from {sys.argv} at {timestamp}\n")
-        file.write(f"Parameters: {demo_type}, {trajectory_type}, {num_waypoints}\n")
-        file.write(f"Loco Setup file: {LOCO_SETUP_FILE}\n")
-        file.write("Timestamp,X,Y,Z,Batterylevel\n")
-        offset = timestamp_log[0]
-        for i in range(len(x_log)):
-            file.write(f"{timestamp_log[i]-offset}, {x_log[i]}, {y_log[i]}, {z_log[i]}, {batteryLevel_log[i]}\n")
+    if WRITE_BINARY_LOG:
+        print(f"Binary logging data saved in {binlog.convert_text_log(file_name)}")
     print(f"Logging data saved in {file_name}")
     print("Demo finished")
-sys.exit(0)
-
-        
-        
-        
-        
-
-
+    sys.exit(0)
@@ -0,0 +1,136 @@
+import argparse
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+
+import cf_data
+import binlog
+import tracking
+
+GAP_THRESHOLD = cf_data.GAP_THRESHOLD # in ms
+REPORT_FIELDS = ['file', 'date', 'demo_type', 'trajectory_type', 'loco_file', 'samples', 'duration',
+                 'tracking_error_rms', 'tracking_error_p95', 'tracking_error_max', 'time_out_of_tolerance', 'drain_rate', 'battery_start', 'battery_min',
+                 'altitude_max', 'altitude_excursion', 'gaps', 'gap_max', 'gap_time', 'duplicates', 'error']
+
+
+def flight_metrics(flight, gap_threshold=GAP_THRESHOLD):
+    """
+    Computes the metrics of one flight, vectorized over all samples
+
+    Args:
+    flight: Flight object with loaded data
+    gap_threshold: Time in ms between two samples, above which a packet gap is counted
+
+    Returns:
+    Dictionary with the metrics (durations in s, battery in V and V/min, altitude in m)
+    """
+    metrics = {'samples': len(flight)}
+    columns = {'x': flight.x, 'y': flight.y, 'z': flight.z, 'batterylevel': flight.batterylevel}
+    timestamps, samples, duplicates = cf_data.deduplicate(flight.time, columns)
+    resampled = cf_data.resample(timestamps, samples, gap_threshold=gap_threshold)
+    if len(resampled) < 2:
+        return metrics
+    # Extremes and the tracking error use the sorted and deduplicated samples, interpolation would
+    # shave off single sample peaks (e.g. a battery sag)
+    z = samples['z'].astype(float)
+    battery = samples['batterylevel'].astype(float)
+    t = resampled.time / 1000
+
+    metrics['duration'] = t[-1] - t[0]
+    # Battery drain rate as slope of a linear least squares fit, on the uniform grid so bursts and
+    # gaps do not weight the fit. With fewer than 2 grid points outside the gaps, all of them are used
+    valid = resampled.valid
+    if np.count_nonzero(valid) < 2:
+        valid = np.ones(len(t), dtype=bool)
+    metrics['drain_rate'] = np.polyfit(t[valid] - t[0], resampled.columns['batterylevel'][valid], 1)[0] * 60
+    metrics['battery_start'] = battery[0]
+    metrics['battery_min'] = battery.min()
+    metrics['altitude_max'] = z.max()
+    metrics['altitude_excursion'] = z.max() - z.min()
+
+    metrics['gaps'] = len(resampled.gap_duration)
+    metrics['gap_max'] = resampled.gap_duration.max(initial=0) / 1000
+    metrics['gap_time'] = resampled.gap_duration.sum() / 1000
+    metrics['duplicates'] = duplicates
+
+    path = tracking.planned_path(flight)
+    if path is not None:
+        error = tracking.tracking_error(timestamps, samples['x'], samples['y'], path, z=z)
+        metrics['tracking_error_rms'] = error['rms']
+        metrics['tracking_error_p95'] = error['p95']
+        metrics['tracking_error_max'] = error['max']
+        metrics['time_out_of_tolerance'] = error['time_out_of_tolerance']
+    return metrics
+
+
+def analyze_file(file, gap_threshold=GAP_THRESHOLD):
+    """
+    Loads one log and computes its metrics, errors are reported in the result instead of raised
+
+    Args:
+    file: The file path of the log, an up to date binary log next to it is used instead
+    gap_threshold: Time in ms between two samples, above which a packet gap is counted
+
+    Returns:
+    Dictionary with one value per entry of REPORT_FIELDS
+    """
+    row = dict.fromkeys(REPORT_FIELDS)
+    row['file'] = Path(file).name
+    try:
+        binary_file = binlog.binary_file_name(file)
+        if os.path.exists(binary_file) and os.path.getmtime(binary_file) >= os.path.getmtime(file):
+            file = binary_file
+        flight = cf_data.load_flight(file)
+        row.update({'date': flight.date, 'demo_type': flight.param[0], 'trajectory_type': flight.param[1],
+                    'loco_file': flight.loco_file})
+        row.update(flight_metrics(flight, gap_threshold))
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        row['error'] = str(e)
+    return row
+
+
+def _format(value):
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.4f}"
+    return "" if value is None else value
+
+
+# Fleet report over the whole log archive
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute per-flight metrics over a crazyflie log archive")
+    parser.add_argument('paths', nargs='*', default=["log_files"], help="log files or directories (default: log_files)")
+    parser.add_argument('-o', '--output', default="fleet_report.csv", help="summary table (csv)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument('--gap-threshold', type=float, default=GAP_THRESHOLD, help="packet gap threshold in ms")
+    args = parser.parse_args(argv)
+
+    files = list()
+    for path in map(Path, args.paths):
+        if path.is_dir():
+            files.extend(sorted(str(p) for p in path.glob("*.txt")))
+        else:
+            files.append(str(path))
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        chunksize = max(1, len(files) // (4 * args.jobs))
+        rows = list(executor.map(analyze_file, files, [args.gap_threshold] * len(files), chunksize=chunksize))
+    elapsed = time.perf_counter() - start
+
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(REPORT_FIELDS)
+        for row in rows:
+            writer.writerow([_format(row[field]) for field in REPORT_FIELDS])
+    failed = sum(1 for row in rows if row['error'])
+    print(f"Analyzed {len(rows) - failed} flights ({failed} failed) in {elapsed:.2f} s with {args.jobs} workers, "
+          f"summary saved in {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
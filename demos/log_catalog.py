@@ -0,0 +1,225 @@
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import cf_data
+
+CATALOG_FILE = ".catalog.sqlite"
+LOG_EXTENSION = ".txt"
+DATE_FORMAT = '%Y-%m-%d_%H-%M-%S'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS logs (
+    file TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    valid INTEGER NOT NULL,
+    command TEXT,
+    date TEXT,
+    start TEXT,
+    demo_type INTEGER,
+    trajectory_type INTEGER,
+    num_waypoints INTEGER,
+    loco_file TEXT,
+    samples INTEGER,
+    duration REAL,
+    battery_min REAL,
+    x_min REAL, x_max REAL,
+    y_min REAL, y_max REAL,
+    z_min REAL, z_max REAL
+)
+"""
+_FIELDS = ['file', 'mtime_ns', 'size', 'valid', 'command', 'date', 'start', 'demo_type', 'trajectory_type',
+           'num_waypoints', 'loco_file', 'samples', 'duration', 'battery_min',
+           'x_min', 'x_max', 'y_min', 'y_max', 'z_min', 'z_max']
+
+
+def _parse_date(date):
+    # Logging dates are formatted as 2024-08-13_10-50-58, stored as ISO for range queries
+    try:
+        return datetime.datetime.strptime(date, DATE_FORMAT).isoformat(sep=' ')
+    except (TypeError, ValueError):
+        return None
+
+
+def summarize_log(file):
+    """
+    Reads one log file and summarizes it for the catalog
+
+    Args:
+    file: The file path of the text log
+
+    Returns:
+    Dictionary with the metadata, the number of samples, the duration in s,
+    the minimal battery level and the bounding box of the flight
+    """
+    flight = cf_data.load_flight(file)
+    time, x, y, z, batterylevel = flight.time, flight.x, flight.y, flight.z, flight.batterylevel
+    param = list(flight.param) + [None] * (3 - len(flight.param))
+    entry = {
+        'command': flight.command, 'date': flight.date, 'start': _parse_date(flight.date),
+        'demo_type': param[0], 'trajectory_type': param[1], 'num_waypoints': param[2],
+        'loco_file': flight.loco_file, 'samples': len(time),
+    }
+    if len(time):
+        entry.update({
+            'duration': float(time[-1] - time[0]) / 1000,
+            'battery_min': float(batterylevel.min()),
+            'x_min': float(x.min()), 'x_max': float(x.max()),
+            'y_min': float(y.min()), 'y_max': float(y.max()),
+            'z_min': float(z.min()), 'z_max': float(z.max()),
+        })
+    return entry
+
+
+class LogCatalog:
+    """
+    Persistent index of the flight logs in a directory, stored as SQLite file in the directory.
+
+    Every log has one entry with its metadata and summary values. `update` only re-reads logs,
+    whose modification time or size changed since they were indexed, and drops removed logs.
+    """
+
+    def __init__(self, directory, catalog_file=None):
+        """
+        Args:
+        directory: The directory of the log files
+        catalog_file: The file path of the index, defaults to CATALOG_FILE in the directory
+        """
+        self.directory = Path(directory)
+        self.catalog_file = catalog_file if catalog_file is not None else self.directory / CATALOG_FILE
+        self._db = sqlite3.connect(self.catalog_file)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute(_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def update(self):
+        """
+        Brings the index up to date with the log directory
+
+        Returns:
+        added: Number of logs (re-)indexed
+        removed: Number of entries of removed logs
+        """
+        indexed = {row['file']: (row['mtime_ns'], row['size'])
+                   for row in self._db.execute("SELECT file, mtime_ns, size FROM logs")}
+        present = set()
+        added = 0
+        with self._db:
+            for entry in os.scandir(self.directory):
+                if not entry.is_file() or not entry.name.endswith(LOG_EXTENSION):
+                    continue
+                present.add(entry.name)
+                stat = entry.stat()
+                if indexed.get(entry.name) == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                row = dict.fromkeys(_FIELDS)
+                row.update({'file': entry.name, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'valid': 0})
+                try:
+                    row.update(summarize_log(entry.path))
+                    row['valid'] = 1
+                except (OSError, ValueError, KeyError, IndexError):
+                    # Keep invalid files in the index, so they are not re-read on every update
+                    pass
+                self._db.execute(f"INSERT OR REPLACE INTO logs ({', '.join(_FIELDS)}) VALUES ({', '.join('?' * len(_FIELDS))})",
+                                 [row[f] for f in _FIELDS])
+                added += 1
+            removed = set(indexed) - present
+            self._db.executemany("DELETE FROM logs WHERE file = ?", [(f,) for f in removed])
+        return added, len(removed)
+
+    def query(self, demo_type=None, trajectory_type=None, loco_file=None, since=None, until=None):
+        """
+        Queries the valid logs of the index, all given conditions have to match
+
+        Args:
+        demo_type: 1 for waypoints, 2 for trajectories
+        trajectory_type: 1 for circle, 2 for square, 3 for eight
+        loco_file: Substring of the anchor setup file, e.g. '8a_tripod'
+        since: Earliest start of the log (datetime, date or ISO string)
+        until: Latest start of the log (datetime, date or ISO string)
+
+        Returns:
+        List of dictionaries, one per log, ordered by start
+        """
+        conditions = ["valid = 1"]
+        values = list()
+        if demo_type is not None:
+            conditions.append("demo_type = ?")
+            values.append(demo_type)
+        if trajectory_type is not None:
+            conditions.append("trajectory_type = ?")
+            values.append(trajectory_type)
+        if loco_file is not None:
+            conditions.append("instr(loco_file, ?) > 0")
+            values.append(loco_file)
+        if since is not None:
+            conditions.append("start >= ?")
+            values.append(str(since))
+        if until is not None:
+            day = _as_date(until)
+            if day is not None:
+                # A date includes the whole day, the stored start has a time of day
+                conditions.append("start < ?")
+                values.append(str(day + datetime.timedelta(days=1)))
+            else:
+                conditions.append("start <= ?")
+                values.append(str(until))
+        rows = self._db.execute(f"SELECT * FROM logs WHERE {' AND '.join(conditions)} ORDER BY start", values)
+        return [dict(row) for row in rows]
+
+
+def _as_date(value):
+    # The date of a date or a date-only ISO string (e.g. '2024-08-31'), None for anything with a time
+    if isinstance(value, datetime.datetime):
+        return None
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def format_entry(entry):
+    """
+    Returns:
+    One line describing a catalog entry
+    """
+    duration = f"{entry['duration']:6.1f} s" if entry['duration'] is not None else "     - s"
+    battery = f"{entry['battery_min']:.2f} V" if entry['battery_min'] is not None else "- V"
+    return (f"{entry['file']:45} {entry['start']}  params {entry['demo_type']}, {entry['trajectory_type']}, "
+            f"{entry['num_waypoints']}  {duration}  min battery {battery}  {Path(entry['loco_file']).stem}")
+
+
+# Query the log catalog from the command line
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the catalog of crazyflie flight logs")
+    parser.add_argument('--directory', default="log_files", help="directory of the log files")
+    parser.add_argument('--demo-type', type=int, help="1 for waypoints, 2 for trajectories")
+    parser.add_argument('--trajectory-type', type=int, help="1 for circle, 2 for square, 3 for eight")
+    parser.add_argument('--loco', help="substring of the anchor setup file, e.g. 8a_tripod")
+    parser.add_argument('--since', help="earliest start, e.g. 2024-08-01")
+    parser.add_argument('--until', help="latest start, e.g. 2024-08-31")
+    args = parser.parse_args(argv)
+
+    with LogCatalog(args.directory) as catalog:
+        catalog.update()
+        for entry in catalog.query(args.demo_type, args.trajectory_type, args.loco, args.since, args.until):
+            print(format_entry(entry))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
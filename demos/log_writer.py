@@ -0,0 +1,166 @@
+import os
+import queue
+import threading
+import time
+
+LOG_HEADER = "Timestamp,X,Y,Z,Batterylevel"
+QUEUE_SIZE = 60000 # rows, ten minutes at 100 Hz
+BATCH_SIZE = 500 # rows per write
+FLUSH_INTERVAL = 0.5 # in s
+
+
+def format_header(command, timestamp, parameters, loco_file):
+    """
+    Formats the header of a flight log file, as expected by cf_data.extract_metadata
+
+    Args:
+    command: The command line the log was created by (sys.argv)
+    timestamp: The formatted start time of the log
+    parameters: Flight parameters (demo_type, trajectory_type, num_waypoints)
+    loco_file: The anchor setup file
+
+    Returns:
+    The header lines including the column names
+    """
+    return (f"Logging data from {command} at {timestamp}\n"
+            f"Parameters: {', '.join(str(p) for p in parameters)}\n"
+            f"Loco Setup file: {loco_file}\n"
+            f"{LOG_HEADER}\n")
+
+
+class FlightLogWriter(threading.Thread):
+    """
+    Background writer streaming flight log rows to disk while the drone flies.
+
+    Rows are handed over by `put` through a bounded queue, so the log callback never touches the disk.
+    The writer drains the queue in batches and flushes every `flush_interval`. While running,
+    the data is written to `<file_name>.part`, which holds everything flushed so far if the
+    process dies. `close` syncs the file and atomically renames it to `file_name`.
+    """
+
+    def __init__(self, file_name, header, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        """
+        Args:
+        file_name: The final file path of the log
+        header: The header written before the rows (see format_header)
+        queue_size: Maximum number of rows waiting to be written
+        batch_size: Maximum number of rows written at once
+        flush_interval: Time in s between flushes to disk
+        """
+        super().__init__(name='FlightLogWriter', daemon=True)
+        self.file_name = file_name
+        self.part_name = file_name + ".part"
+        self.header = header
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = False
+        self._offset = None
+
+        # Statistics
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.queue_depth_max = 0
+        self.writes = 0
+        self.write_time_total = 0.0 # in s
+        self.write_time_max = 0.0 # in s
+
+    def put(self, row):
+        """
+        Queues one row without blocking, called from the log callback
+
+        Args:
+        row: Tuple (timestamp, x, y, z, batterylevel)
+
+        Returns:
+        True if the row was queued, False if the queue was full and the row was dropped
+        """
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.rows_dropped += 1
+            return False
+        return True
+
+    def run(self):
+        with open(self.part_name, 'w') as file:
+            file.write(self.header)
+            file.flush()
+            last_flush = time.monotonic()
+            done = False
+            while not done:
+                try:
+                    row = self._queue.get(timeout=self.flush_interval)
+                except queue.Empty:
+                    file.flush()
+                    continue
+                depth = self._queue.qsize() + 1
+                if depth > self.queue_depth_max:
+                    self.queue_depth_max = depth
+                # Drain the queue up to one batch, None marks the end of the log
+                rows = list()
+                try:
+                    while row is not None:
+                        rows.append(row)
+                        if len(rows) == self.batch_size:
+                            break
+                        row = self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+                done = row is None
+                if not rows:
+                    continue
+
+                start = time.perf_counter()
+                file.write(self._format_rows(rows))
+                now = time.monotonic()
+                if now - last_flush >= self.flush_interval:
+                    file.flush()
+                    last_flush = now
+                elapsed = time.perf_counter() - start
+                self.rows_written += len(rows)
+                self.writes += 1
+                self.write_time_total += elapsed
+                self.write_time_max = max(self.write_time_max, elapsed)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _format_rows(self, rows):
+        # Timestamps are stored relative to the first row, the values with the 7 significant digits
+        # of the logged float32 (no float32 to float64 artifacts like 0.29899999499320984)
+        if self._offset is None:
+            self._offset = rows[0][0]
+        offset = self._offset
+        return "".join([f"{t-offset}, {x:.7g}, {y:.7g}, {z:.7g}, {v:.7g}\n" for t, x, y, z, v in rows])
+
+    def close(self):
+        """
+        Writes the remaining rows, and atomically moves the log to its final file name
+
+        Returns:
+        The file path of the log
+        """
+        if self._closed:
+            return self.file_name
+        self._closed = True
+        if self.is_alive():
+            self._queue.put(None)
+            self.join()
+        if os.path.exists(self.part_name):
+            os.replace(self.part_name, self.file_name)
+        return self.file_name
+
+    def stats(self):
+        """
+        Returns:
+        Dictionary with the statistics of the writer
+        """
+        return {
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'queue_depth': self._queue.qsize(),
+            'queue_depth_max': self.queue_depth_max,
+            'writes': self.writes,
+            'write_time_mean': self.write_time_total / self.writes if self.writes else 0.0,
+            'write_time_max': self.write_time_max,
+        }
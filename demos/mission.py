@@ -0,0 +1,297 @@
+import argparse
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+
+import trajectory
+import poly_trajectory
+import anchor_geometry
+from battery import BATTERY_THRESHOLD_LOW
+
+DEMO_DIRECTORY = Path(__file__).resolve().parent # plans and logs do not depend on the working directory
+PLAN_DIRECTORY = str(DEMO_DIRECTORY / "plan_files")
+LOG_DIRECTORY = str(DEMO_DIRECTORY / "log_files")
+PLAN_EXTENSION = ".plan.npz"
+PLAN_VERSION = 2
+DEFAULT_HEIGHT = 1.0 # in m
+MIN_ANCHORS = 4
+MISSION_KEYS = {'uri', 'anchors', 'trajectory', 'height', 'battery_threshold', 'gdop_limit', 'ranging'}
+TRAJECTORY_KEYS = {'shape', 'center', 'speed', 'spacing'} # further keys are parameters of the shape
+PAUSE = 5 # in s, between two sorties of a batch
+
+
+class MissionPlan:
+    """
+    Compiled mission: everything needed for the flight resolved, validated and precomputed
+    (setpoints, polynomial pieces, anchor positions), so the runner does not ask or compute anything
+    """
+
+    def __init__(self, meta, setpoints, pieces, anchors):
+        """
+        Args:
+        meta: Dictionary with the resolved mission settings (uri, anchors, height, ...) and compile information
+        setpoints: Array (N, 3) with columns x, y, t of the trajectory
+        pieces: Structured array of poly_trajectory.PIECE_DTYPE, uploaded as they are
+        anchors: Array (K, 3) with the anchor positions
+        """
+        self.meta = meta
+        self.setpoints = setpoints
+        self.pieces = pieces
+        self.anchors = anchors
+
+    def __getattr__(self, name):
+        # Mission settings are accessed as attributes, e.g. plan.uri, plan.height
+        try:
+            return self.__dict__['meta'][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def save(self, file):
+        # Written to a temporary file first, so a plan is never read half written
+        file = Path(file)
+        file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = str(file) + ".part"
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, meta=np.array(json.dumps(self.meta)), setpoints=self.setpoints, pieces=self.pieces, anchors=self.anchors)
+        os.replace(tmp_file, file)
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != PLAN_VERSION:
+                raise ValueError(f"{file} was compiled by another version (plan version {meta.get('version')}, expected {PLAN_VERSION}), compile the mission again")
+            return cls(meta, data['setpoints'], data['pieces'].astype(poly_trajectory.PIECE_DTYPE), data['anchors'])
+
+    def check_anchors(self):
+        """
+        Raises:
+        ValueError: If the anchor setup file is missing or changed since the mission was compiled
+        """
+        if not os.path.exists(self.anchors_file):
+            raise ValueError(f"The anchor setup {self.anchors_file} of the plan was not found")
+        if anchor_geometry.file_hash(self.anchors_file) != self.anchors_hash:
+            raise ValueError(f"The anchor setup {self.anchors_file} changed since the mission was compiled, compile it again")
+
+
+def load_mission(file):
+    """
+    Loads a mission file (YAML) and checks its keys
+
+    Returns:
+    Dictionary with the mission, paths are resolved relative to the mission file (absolute paths)
+    """
+    import yaml
+    with open(file, 'r') as f:
+        mission = yaml.safe_load(f) or dict()
+    unknown = set(mission) - MISSION_KEYS
+    if unknown:
+        raise ValueError(f"Unknown keys in {file}: {', '.join(sorted(unknown))} (known: {', '.join(sorted(MISSION_KEYS))})")
+    for key in ('uri', 'anchors', 'trajectory'):
+        if key not in mission:
+            raise ValueError(f"{file} has no '{key}'")
+    anchors = Path(mission['anchors'])
+    if not anchors.is_absolute():
+        anchors = Path(file).parent / anchors
+    mission['anchors'] = str(anchors.resolve())
+    return mission
+
+
+def compile_mission(mission, source="mission"):
+    """
+    Resolves and validates a mission and precomputes everything the flight needs
+
+    Checks: uri, anchor setup, height inside the flight volume, trajectory inside the flight volume and
+    below the GDOP limit (anchor_geometry), polynomial pieces fitting into the trajectory memory.
+
+    Args:
+    mission: Dictionary of the mission (see load_mission)
+    source: Name of the mission, stored in the plan
+
+    Returns:
+    MissionPlan
+
+    Raises:
+    ValueError: If the mission is invalid, with the reason
+    """
+    import cf_data
+    uri = str(mission['uri'])
+    if '://' not in uri:
+        raise ValueError(f"Invalid uri '{uri}', e.g. radio://0/100/2M/E7E7E7E701 or sim://1")
+    anchors_file = mission['anchors']
+    if not os.path.exists(anchors_file):
+        raise ValueError(f"Anchor setup {anchors_file} not found")
+    anchors = cf_data.obtain_anchor_positions(anchors_file)
+    if len(anchors) < MIN_ANCHORS:
+        raise ValueError(f"Anchor setup {anchors_file} has {len(anchors)} anchors, at least {MIN_ANCHORS} are needed")
+
+    height = float(mission.get('height', DEFAULT_HEIGHT))
+    z_range = anchor_geometry.Z_RANGE
+    if not z_range[0] <= height <= z_range[1]:
+        raise ValueError(f"Height {height} m outside of the flight volume ({z_range[0]} to {z_range[1]} m)")
+    battery_threshold = float(mission.get('battery_threshold', BATTERY_THRESHOLD_LOW))
+    if not 0 < battery_threshold < 4.2:
+        raise ValueError(f"Battery threshold {battery_threshold} V is not plausible")
+
+    spec = dict(mission['trajectory'])
+    shape = spec.get('shape')
+    if shape not in trajectory.SHAPES:
+        raise ValueError(f"Unknown trajectory shape '{shape}', choose from {', '.join(trajectory.SHAPES)}")
+    kwargs = {key: spec[key] for key in ('speed', 'spacing') if key in spec}
+    params = {key: value for key, value in spec.items() if key not in TRAJECTORY_KEYS}
+    # The crazyflie is placed in the center and flies from there to the start of the trajectory
+    center = tuple(spec['center']) if 'center' in spec else cf_data.initial_position(anchors)
+    setpoints = trajectory.create(shape, center, **kwargs, **params)
+    setpoints = np.array(setpoints)
+
+    gdop_limit = float(mission.get('gdop_limit', anchor_geometry.GDOP_LIMIT))
+    ranging = mission.get('ranging', 'twr')
+    gdop_map, _ = anchor_geometry.load_gdop_map(anchors_file, mode=ranging)
+    vetting = anchor_geometry.vet_trajectory(gdop_map, setpoints, height, gdop_limit, start=center)
+    if not vetting['ok']:
+        raise ValueError(f"{vetting['over_length']:.2f} m of the path are in poorly covered regions (GDOP > {gdop_limit}), "
+                         f"first at {vetting['first_over']}")
+
+    pieces = poly_trajectory.fit_polynomials(setpoints, height)
+    size = len(poly_trajectory.pack_trajectory(pieces))
+    if size > poly_trajectory.TRAJECTORY_MEMORY_SIZE:
+        raise ValueError(f"Trajectory with {len(pieces)} pieces ({size} bytes) does not fit into the trajectory memory "
+                         f"({poly_trajectory.TRAJECTORY_MEMORY_SIZE} bytes), use a larger spacing")
+
+    meta = {
+        'version': PLAN_VERSION,
+        'source': str(source),
+        'compiled_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'uri': uri,
+        'anchors_file': anchors_file,
+        'anchors_hash': anchor_geometry.file_hash(anchors_file),
+        'trajectory': spec,
+        # The shapes are parametrized, so they do not match the fixed reference paths of the demo types
+        # (cf_data.planned_trajectory), the planned path is logged as unknown
+        'trajectory_type': -1,
+        'height': height,
+        'battery_threshold': battery_threshold,
+        'gdop_limit': gdop_limit,
+        'ranging': ranging,
+        'gdop_max': vetting['gdop_max'],
+        'duration': float(pieces['duration'].sum()),
+        'upload_bytes': size,
+    }
+    return MissionPlan(meta, setpoints, pieces, anchors)
+
+
+def plan_file_name(mission_file, directory=PLAN_DIRECTORY):
+    """
+    Returns:
+    Default plan file of a mission file, e.g. plan_files/circle_4a.plan.npz
+    """
+    return str(Path(directory) / (Path(mission_file).stem + PLAN_EXTENSION))
+
+
+def fly_plan(plan, log_directory=LOG_DIRECTORY, link_factory=None, binary_log=True):
+    """
+    Flies a compiled plan without any prompt: connect, upload the precomputed pieces, fly, log.
+    Ctrl-C lands the crazyflie.
+
+    Args:
+    plan: MissionPlan
+    log_directory: Directory of the flight log
+    link_factory: Creates the SyncCrazyflie for the uri, default: radio link (see swarm.cflib_link)
+    binary_log: Also write the binary log (see binlog.py)
+
+    Returns:
+    Tuple (0 if the flight was successful, 1 if it was interrupted, log file name, battery supervisor)
+    """
+    from swarm import Swarm, Drone, cflib_link
+    from log_writer import format_header
+    plan.check_anchors()
+    swarm = Swarm([plan.uri], link_factory or cflib_link, battery_threshold=plan.battery_threshold)
+    drone = swarm.drones[0]
+    timestamp = time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime())
+    file_name = f"{log_directory}/cf_logging_{timestamp}.txt"
+    os.makedirs(log_directory, exist_ok=True)
+    try:
+        swarm.parallel(Drone.connect)
+        swarm.parallel(Drone.setup)
+        print(f"{plan.uri}: {drone.connection_timer.report()}")
+        swarm.parallel(lambda drone: drone.upload_pieces(plan.pieces))
+        drone.start_logging(file_name, format_header(sys.argv, timestamp, (2, plan.trajectory_type, -1), plan.anchors_file))
+        result = swarm.parallel(lambda drone: drone.fly(plan.pieces, plan.height, threading.Barrier(1)))[0]
+    finally:
+        swarm.parallel(Drone.close)
+    if binary_log:
+        import binlog
+        binlog.convert_text_log(file_name)
+    return result, file_name, drone.battery_supervisor
+
+
+def run_batch(plan_files, pause=PAUSE, log_directory=LOG_DIRECTORY, link_factory=None):
+    """
+    Flies the plans back to back, stops at the first interrupted flight or low battery
+
+    Returns:
+    0 if all flights were successful, 1 otherwise
+    """
+    plans = [MissionPlan.load(file) for file in plan_files]
+    for plan in plans:
+        plan.check_anchors()
+    for i, (file, plan) in enumerate(zip(plan_files, plans)):
+        start = time.perf_counter()
+        print(f"Sortie {i + 1}/{len(plans)}: {file} on {plan.uri}, {plan.duration:.1f} s")
+        result, log_file, supervisor = fly_plan(plan, log_directory, link_factory)
+        print(f"Sortie {i + 1}: {'done' if result == 0 else 'interrupted'} in {time.perf_counter() - start:.1f} s, log {log_file}")
+        if result or supervisor.triggered:
+            print("Batch stopped" + (", battery low" if supervisor.triggered else ""))
+            return 1
+        if i + 1 < len(plans):
+            time.sleep(pause)
+    return 0
+
+
+# Compile missions into plans and fly plans without prompts
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile missions and fly compiled plans")
+    commands = parser.add_subparsers(dest='command', required=True)
+    compile_parser = commands.add_parser('compile', help="resolve and validate missions, write the plans")
+    compile_parser.add_argument('missions', nargs='+', help="mission files (YAML)")
+    compile_parser.add_argument('-d', '--directory', default=PLAN_DIRECTORY, help="directory of the plans")
+    run_parser = commands.add_parser('run', help="fly plans back to back")
+    run_parser.add_argument('plans', nargs='+', help="plan files, a plan can be given several times")
+    run_parser.add_argument('--pause', type=float, default=PAUSE, help="in s, between two sorties")
+    run_parser.add_argument('--log-directory', default=LOG_DIRECTORY, help="directory of the flight logs")
+    args = parser.parse_args(argv)
+
+    if args.command == 'compile':
+        failed = 0
+        for file in args.missions:
+            start = time.perf_counter()
+            try:
+                plan = compile_mission(load_mission(file), source=file)
+            except (ValueError, OSError) as error:
+                print(f"{file}: {error}")
+                failed += 1
+                continue
+            output = plan_file_name(file, args.directory)
+            plan.save(output)
+            print(f"{file} -> {output}: {len(plan.setpoints)} setpoints, {len(plan.pieces)} pieces ({plan.upload_bytes} bytes), "
+                  f"{plan.duration:.1f} s, GDOP max {plan.gdop_max:.2f}, compiled in {time.perf_counter() - start:.2f} s")
+        return 1 if failed else 0
+
+    import cflib.crtp
+    import sim_link
+    cflib.crtp.init_drivers()
+    sim_link.register()
+    try:
+        return run_batch(args.plans, args.pause, args.log_directory)
+    except (ValueError, OSError) as error:
+        print(error)
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
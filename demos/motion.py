@@ -0,0 +1,217 @@
+import argparse
+import math
+import random
+import sys
+import threading
+import time
+import numpy as np
+
+CONTROL_TICK = 0.01 # in s, maximal reaction time on interrupts
+DEFAULT_VELOCITY = 0.5 # in m/s
+LANDING_VELOCITY = 0.5 # in m/s
+STOP_LATENCY_TARGET = 0.05 # in s
+
+
+class InterruptibleMotion:
+    """
+    Motion layer on the high level commander, where every blocking move can be preempted.
+
+    Moves are sent as one high level command and then waited for in control ticks, checking the
+    emergency stop and land events on every tick. On an emergency stop the motors are stopped,
+    on landing the crazyflie lands from its current estimated pose.
+    """
+
+    def __init__(self, cf, land_event, emergency_stop_event, position=None, velocity=DEFAULT_VELOCITY, tick=CONTROL_TICK):
+        """
+        Args:
+        cf: Crazyflie object
+        land_event: threading.Event, lands when set
+        emergency_stop_event: threading.Event, stops the motors when set
+        position: Callable returning the current estimated position (x, y, z), or None if unknown
+        velocity: Velocity of the moves in m/s
+        tick: Time in s between two interrupt checks
+        """
+        self.cf = cf
+        self.land_event = land_event
+        self.emergency_stop_event = emergency_stop_event
+        self.position = position
+        self.velocity = velocity
+        self.tick = tick
+        self.interrupted = False
+        self._target = (0.0, 0.0, 0.0) # last commanded position
+
+    def _current_position(self):
+        if self.position is not None:
+            position = self.position()
+            if position is not None:
+                return tuple(float(p) for p in position)
+        return self._target
+
+    def wait(self, duration):
+        """
+        Waits for the duration, handling interrupts within one control tick
+
+        Args:
+        duration: Time in s
+
+        Returns:
+        True if the time passed, False if the motion was interrupted
+        """
+        deadline = time.monotonic() + duration
+        while True:
+            if self.emergency_stop_event.is_set() or self.land_event.is_set():
+                self.handle_interrupt()
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            # Waking up on the land event directly, the emergency stop is checked every tick
+            self.land_event.wait(min(self.tick, remaining))
+
+    def take_off(self, height):
+        """
+        Takes off from the current position
+
+        Returns:
+        True if the height was reached, False if the motion was interrupted
+        """
+        x, y, z = self._current_position()
+        if self.emergency_stop_event.is_set() or self.land_event.is_set():
+            self.handle_interrupt()
+            return False
+        duration = max(abs(height - z), 0.1) / self.velocity
+        self.cf.high_level_commander.takeoff(height, duration)
+        self._target = (x, y, height)
+        return self.wait(duration)
+
+    def go_to(self, x, y, z=None):
+        """
+        Flies to the position with a straight line at the configured velocity
+
+        Args:
+        x: Target x position
+        y: Target y position
+        z: Target z position, the last target height if None
+
+        Returns:
+        True if the position was reached, False if the motion was interrupted
+        """
+        if self.emergency_stop_event.is_set() or self.land_event.is_set():
+            self.handle_interrupt()
+            return False
+        z = self._target[2] if z is None else z
+        distance = math.dist(self._target, (x, y, z))
+        duration = max(distance / self.velocity, self.tick)
+        self.cf.high_level_commander.go_to(x, y, z, 0.0, duration)
+        self._target = (x, y, z)
+        return self.wait(duration)
+
+    def land(self):
+        """
+        Lands from the current estimated pose and stops the high level commander
+        """
+        x, y, z = self._current_position()
+        print(f"Landing at {x:.3f},{y:.3f}")
+        duration = max(z, 0.1) / LANDING_VELOCITY
+        self.cf.high_level_commander.land(0.0, duration)
+        self._target = (x, y, 0.0)
+        # Landing itself is only preempted by the emergency stop
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            if self.emergency_stop_event.wait(self.tick):
+                self.stop_motors()
+                return
+        self.cf.high_level_commander.stop()
+
+    def stop_motors(self):
+        """
+        Stops the motors immediately
+        """
+        self.cf.commander.send_stop_setpoint()
+        self.cf.high_level_commander.stop()
+
+    def handle_interrupt(self):
+        """
+        Reacts on a set emergency stop or land event
+        """
+        self.interrupted = True
+        if self.emergency_stop_event.is_set():
+            self.stop_motors()
+        else:
+            self.land()
+
+
+class _FakeCommander:
+    # Records the time of the first stop command
+    def __init__(self):
+        self.stop_time = None
+
+    def send_stop_setpoint(self):
+        if self.stop_time is None:
+            self.stop_time = time.perf_counter()
+
+    def stop(self, *args):
+        self.send_stop_setpoint()
+
+    def takeoff(self, *args):
+        pass
+
+    def go_to(self, *args):
+        time.sleep(0.002) # radio round trip
+
+    def land(self, *args):
+        pass
+
+
+class _FakeCrazyflie:
+    def __init__(self):
+        self.commander = _FakeCommander()
+        self.high_level_commander = self.commander
+
+
+def benchmark_stop_latency(trials=50, tick=CONTROL_TICK, leg_time=2.0):
+    """
+    Measures the latency from setting the emergency stop event (keypress) to the first stop
+    setpoint, while an interruptible go_to is in flight on a fake link
+
+    Args:
+    trials: Number of measurements
+    tick: Control tick of the motion layer in s
+    leg_time: Travel time of the interrupted go_to in s
+
+    Returns:
+    Array with the latencies in s
+    """
+    latencies = np.zeros(trials)
+    for i in range(trials):
+        cf = _FakeCrazyflie()
+        land_event = threading.Event()
+        emergency_stop_event = threading.Event()
+        motion = InterruptibleMotion(cf, land_event, emergency_stop_event, velocity=1.0, tick=tick)
+        mover = threading.Thread(target=motion.go_to, args=(leg_time, 0.0, 0.0))
+        mover.start()
+        time.sleep(random.uniform(0.01, leg_time / 2))
+        pressed = time.perf_counter()
+        emergency_stop_event.set()
+        mover.join()
+        latencies[i] = cf.commander.stop_time - pressed
+    return latencies
+
+
+# Benchmark of the stop latency on a fake link
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure keypress to stop setpoint latency on a fake link")
+    parser.add_argument('--trials', type=int, default=50)
+    parser.add_argument('--tick', type=float, default=CONTROL_TICK, help="control tick in s")
+    args = parser.parse_args(argv)
+
+    latencies = benchmark_stop_latency(args.trials, args.tick) * 1000
+    print(f"Stop latency over {args.trials} trials: p50 {np.percentile(latencies, 50):.2f} ms, "
+          f"p99 {np.percentile(latencies, 99):.2f} ms, max {latencies.max():.2f} ms")
+    ok = latencies.max() < STOP_LATENCY_TARGET * 1000
+    print(f"Target {STOP_LATENCY_TARGET * 1000:.0f} ms worst case: {'met' if ok else 'MISSED'}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,27 +3,35 @@ import time
 from matplotlib import pyplot as plt
 
 import cf_data as cfd
+from log_catalog import LogCatalog, format_entry
+import tracking
 import numpy as np
 # script to plot logging data of crazyflie flights
 
-# List all log_files in the directory
-log_files = cfd.list_files_in_directory("log_files")
-print(log_files)
+# List all log_files in the directory, from the cached log catalog
+with LogCatalog("log_files") as catalog:
+    catalog.update()
+    for entry in catalog.query():
+        print(format_entry(entry))
 log_file = input("Enter the log file to plot: ")
 
-# Extracting meta data from the log file
-command, date, param, loco_file= cfd.extract_metadata(f"log_files/{log_file}")
-
-# Extracting data from the log file
-t,x,y,z,batterylevel = cfd.import_logging_data(f"log_files/{log_file}")
-t = [i/1000 for i in np.array(t)]
+# Extracting meta data and data from the log file (one read)
+flight = cfd.load_flight(f"log_files/{log_file}")
+command, date, param, loco_file = flight.command, flight.date, flight.param, flight.loco_file
+t,x,y,z,batterylevel = flight.time / 1000, flight.x, flight.y, flight.z, flight.batterylevel
 
 # Extracting loco_anchor_positions from the loco file
 anchor_values = cfd.obtain_anchor_positions(loco_file) 
 
-# compute flight trajectory
-if param[0] == 2:
-    pos_comp = cfd.create_trajectory(param[1])
+# compute flight trajectory and the tracking error against it
+pos_comp = tracking.planned_path(flight)
+if pos_comp is not None:
+    error = tracking.tracking_error(flight.time, x, y, pos_comp, z=z)
+    if error['rms'] is None:
+        print("Tracking error: no airborne samples")
+    else:
+        print(f"Tracking error: rms {error['rms']:.3f} m, p95 {error['p95']:.3f} m, max {error['max']:.3f} m, "
+              f"{error['time_out_of_tolerance']:.1f} s out of tolerance ({tracking.TRACKING_TOLERANCE} m)")
 
 # type of flight
 if param[0] == 1:
@@ -35,20 +43,14 @@ elif param[0] == 3:
 
 
 # Plotting the data
-plot_data = {
-    'x': list(),
-    'y': list(),    
-    'z': list(),
-    'colors': [],
-    'labels': []
-}
-plot = int(input("Flight (0), Battery (1), Height (2): "))
+plot_data = cfd.ScatterPlot(budget=cfd.PLOT_BUDGET)
+plot = int(input("Flight (0), Battery (1), Height (2), Speed (3): "))
 print(plot)
 if (plot == 0):
     #plotting flight trajectory
     cfd.add_scatter_points(plot_data,anchor_values[:,0], anchor_values[:,1], color='red', label='Anchors')
     cfd.add_scatter_points(plot_data,x, y, color='green', label='Flight')
-    if param[0] == 2:
+    if pos_comp is not None:
         cfd.add_scatter_points(plot_data,pos_comp[:,0], pos_comp[:,1], color='black', label='Computed Trajectory')
     plt.xlabel('x [m]')
     plt.ylabel('x [m]')
@@ -58,8 +60,8 @@ if (plot == 0):
 
 elif(plot == 1):
     print(f"Flight trajectory: {demo_type}")
-    #plotting battery level
-    plt.plot(np.array(t),np.array(batterylevel))
+    #plotting battery level, min-max keeps every voltage sag
+    cfd.plot_time_series(plt.gca(), np.array(t), np.array(batterylevel), method='minmax')
     plt.xlabel('Time [s]')
     plt.ylabel('Battery Level [V]')
     plt.title(f"Battery Level on {date}, executed command: {command}, {demo_type}")
@@ -68,11 +70,24 @@ elif(plot == 1):
 elif (plot ==2):
     print(f"Flight trajectory: {demo_type}")
     #plotting battery level
-    plt.plot(np.array(t),np.array(z))
+    cfd.plot_time_series(plt.gca(), np.array(t), np.array(z))
     plt.xlabel('Time [s]')
     plt.ylabel('Height [m]')
     plt.title(f"Height on {date}, executed command: {command}, {demo_type}")
     plt.grid(True)
     plt.show()
+elif (plot == 3):
+    print(f"Flight trajectory: {demo_type}")
+    #plotting the speed, differentiated on a uniform time grid, gaps are left empty
+    resampled = cfd.resample_flight(flight)
+    speed = np.sqrt(sum(resampled.derivative(axis) ** 2 for axis in ('x', 'y', 'z')))
+    print(f"{len(resampled.gap_duration)} packet gaps ({resampled.gap_duration.sum() / 1000:.2f} s), "
+          f"{resampled.duplicates} duplicate timestamps")
+    cfd.plot_time_series(plt.gca(), resampled.time / 1000, speed)
+    plt.xlabel('Time [s]')
+    plt.ylabel('Speed [m/s]')
+    plt.title(f"Speed on {date}, executed command: {command}, {demo_type}")
+    plt.grid(True)
+    plt.show()
 
 
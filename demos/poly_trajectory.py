@@ -0,0 +1,208 @@
+import numpy as np
+
+POLY_DEGREE = 7 # degree of the polynomials of the Crazyflie trajectory format (Poly4D)
+TRAJECTORY_ID = 1
+TRAJECTORY_MEMORY_SIZE = 4096 # in bytes, default size of the trajectory memory
+
+# Layout of one uncompressed polynomial piece in the trajectory memory (same as Poly4D.pack)
+PIECE_DTYPE = np.dtype([
+    ('x', '<f4', (POLY_DEGREE + 1,)),
+    ('y', '<f4', (POLY_DEGREE + 1,)),
+    ('z', '<f4', (POLY_DEGREE + 1,)),
+    ('yaw', '<f4', (POLY_DEGREE + 1,)),
+    ('duration', '<f4'),
+])
+
+
+def _knot_derivative(values, t):
+    # Derivative at every knot from the neighbouring knots (non-uniform central differences),
+    # zero at the first and last knot so the trajectory starts and ends at rest
+    derivative = np.zeros_like(values)
+    if len(t) > 2:
+        derivative[1:-1] = (values[2:] - values[:-2]) / (t[2:] - t[:-2])[:, None]
+    return derivative
+
+
+def fit_polynomials(setpoints, height=1.0):
+    """
+    Fits piecewise polynomials of degree 7 through timed setpoints.
+
+    Every segment between two setpoints is one polynomial per axis. Position, velocity,
+    acceleration and jerk at the knots are shared by the adjacent segments, so the trajectory is
+    continuous up to the third derivative and passes through every setpoint. The velocities and
+    accelerations at the knots are estimated from the setpoints, the boundary conditions of all
+    segments are solved at once as one batched linear system.
+
+    Args:
+    setpoints: Array (N, 3) with columns x, y, t (time in s), e.g. from trajectory.create
+    height: Flight height in m
+
+    Returns:
+    Structured array (N-1,) of PIECE_DTYPE, one row per segment
+    """
+    setpoints = np.asarray(setpoints, dtype=float)
+    if len(setpoints) < 2:
+        raise ValueError("At least two setpoints are needed to fit a trajectory")
+    t = setpoints[:, 2]
+    durations = np.diff(t)
+    if np.any(durations <= 0):
+        raise ValueError("The setpoint times have to be strictly increasing")
+    position = np.column_stack((setpoints[:, :2], np.full(len(setpoints), height)))
+    velocity = _knot_derivative(position, t)
+    acceleration = _knot_derivative(velocity, t)
+
+    # Boundary conditions: p, p', p'', p''' at the start (tau = 0) and the end (tau = T) of every segment
+    n = POLY_DEGREE + 1
+    k = np.arange(n)
+    T = durations[:, None]
+    A = np.zeros((len(durations), n, n))
+    for d in range(4):
+        # d-th derivative of tau**k is k!/(k-d)! tau**(k-d)
+        factor = np.array([np.prod(np.arange(i - d + 1, i + 1)) if i >= d else 0.0 for i in k])
+        A[:, d, d] = factor[d]
+        A[:, 4 + d, :] = factor * T ** np.clip(k - d, 0, None) * (k >= d)
+    jerk = np.zeros_like(position)
+    b = np.stack((position[:-1], velocity[:-1], acceleration[:-1], jerk[:-1],
+                  position[1:], velocity[1:], acceleration[1:], jerk[1:]), axis=1)
+    coefficients = np.linalg.solve(A, b) # (segments, n, axes)
+
+    pieces = np.zeros(len(durations), dtype=PIECE_DTYPE)
+    pieces['x'] = coefficients[:, :, 0]
+    pieces['y'] = coefficients[:, :, 1]
+    pieces['z'] = coefficients[:, :, 2]
+    pieces['duration'] = durations
+    return pieces
+
+
+def evaluate(pieces, t):
+    """
+    Evaluates piecewise polynomials, vectorized over all times
+
+    Args:
+    pieces: Structured array of PIECE_DTYPE
+    t: Times in s since the start of the trajectory
+
+    Returns:
+    Array (len(t), 3) with the x, y, z positions
+    """
+    t = np.atleast_1d(np.asarray(t, dtype=float))
+    start = np.concatenate(([0.0], np.cumsum(pieces['duration'].astype(float))))
+    index = np.clip(np.searchsorted(start, t, side='right') - 1, 0, len(pieces) - 1)
+    tau = np.clip(t - start[index], 0.0, pieces['duration'][index])
+    powers = tau[:, None] ** np.arange(POLY_DEGREE + 1)
+    return np.column_stack([(pieces[axis][index] * powers).sum(axis=1) for axis in ('x', 'y', 'z')])
+
+
+def pack_trajectory(pieces):
+    """
+    Packs the pieces into the uncompressed trajectory memory format of the Crazyflie
+
+    Args:
+    pieces: Structured array of PIECE_DTYPE
+
+    Returns:
+    bytes, PIECE_DTYPE.itemsize (132) bytes per piece
+    """
+    return np.ascontiguousarray(pieces, dtype=PIECE_DTYPE).tobytes()
+
+
+def unpack_trajectory(data):
+    """
+    Unpacks trajectory memory content (inverse of pack_trajectory)
+
+    Returns:
+    Structured array of PIECE_DTYPE
+    """
+    return np.frombuffer(bytes(data), dtype=PIECE_DTYPE)
+
+
+class _PackedTrajectory:
+    # Trajectory element for TrajectoryMemory, packs all pieces at once
+    def __init__(self, data):
+        self.data = data
+
+    def pack(self):
+        return self.data
+
+
+class FakeTrajectoryMemory:
+    """
+    Stand-in for the trajectory memory of the Crazyflie (cflib TrajectoryMemory), for offline use
+    """
+
+    def __init__(self, size=TRAJECTORY_MEMORY_SIZE):
+        self.size = size
+        self.data = bytearray(size)
+        self.trajectory = list()
+        self.writes = 0
+
+    def write_data_sync(self, start_addr=0x00):
+        data = b''.join(element.pack() for element in self.trajectory)
+        if start_addr + len(data) > self.size:
+            return False
+        self.data[start_addr:start_addr + len(data)] = data
+        self.writes += 1
+        return True
+
+
+def trajectory_memory(cf):
+    """
+    Returns:
+    The trajectory memory of the Crazyflie
+    """
+    from cflib.crazyflie.mem import MemoryElement
+    return cf.mem.get_mems(MemoryElement.TYPE_TRAJ)[0]
+
+
+def upload_trajectory(memory, high_level_commander, pieces, trajectory_id=TRAJECTORY_ID, start_addr=0x00):
+    """
+    Uploads the pieces with one memory write and defines them as trajectory
+
+    Args:
+    memory: Trajectory memory (see trajectory_memory, or FakeTrajectoryMemory)
+    high_level_commander: High level commander of the Crazyflie (cf.high_level_commander)
+    pieces: Structured array of PIECE_DTYPE
+    trajectory_id: Id of the trajectory, used to start it
+    start_addr: Address of the trajectory in the memory
+
+    Returns:
+    Number of bytes uploaded
+    """
+    data = pack_trajectory(pieces)
+    if start_addr + len(data) > memory.size:
+        raise ValueError(f"Trajectory with {len(pieces)} pieces ({len(data)} bytes) does not fit into the trajectory memory ({memory.size} bytes)")
+    memory.trajectory = [_PackedTrajectory(data)]
+    if not memory.write_data_sync(start_addr):
+        raise RuntimeError("Upload of the trajectory failed")
+    high_level_commander.define_trajectory(trajectory_id, start_addr, len(pieces))
+    return len(data)
+
+
+def fly_uploaded_trajectory(motion, pieces, height=1.0, trajectory_id=TRAJECTORY_ID, home=None):
+    """
+    Flies an uploaded trajectory with the high level commander: take off, go to the start,
+    start the trajectory with a single command, return home if given, land. Every phase is
+    preempted by landing or emergency stop (see motion.InterruptibleMotion).
+
+    Args:
+    motion: InterruptibleMotion of the crazyflie
+    pieces: The uploaded pieces (see upload_trajectory)
+    height: Flight height in m
+    trajectory_id: Id of the uploaded trajectory
+    home: x, y position flown back to before landing (e.g. the initial position), None lands at the end
+
+    Returns:
+    0: if the flight was successful
+    1: if the flight was interrupted
+    """
+    start = evaluate(pieces, 0.0)[0]
+    duration = float(pieces['duration'].sum())
+    if not (motion.take_off(height) and motion.go_to(start[0], start[1], height)):
+        return 1
+    motion.cf.high_level_commander.start_trajectory(trajectory_id, 1.0, relative_position=False)
+    if not motion.wait(duration):
+        return 1
+    if home is not None and not (motion.go_to(home[0], home[1], height) and motion.wait(1)):
+        return 1
+    motion.land()
+    return 0
@@ -0,0 +1,148 @@
+import time
+import numpy as np
+
+SETPOINT_RATE = 50 # in Hz
+
+# Figure eight flown with hover setpoints, one row per segment:
+# duration in s, vx in m/s, vy in m/s, yawrate in deg/s, z in m (reached at the end of the segment)
+EIGHT_SEGMENTS = np.array([
+    [1.0, 0.0, 0.0, 0.0, 0.4], # take off
+    [2.0, 0.0, 0.0, 0.0, 0.4], # hover
+    [5.0, 0.5, 0.0, 72.0, 0.4], # first circle
+    [5.0, 0.5, 0.0, -72.0, 0.4], # second circle
+    [2.0, 0.0, 0.0, 0.0, 0.4], # hover
+    [1.0, 0.0, 0.0, 0.0, 0.0], # land
+])
+
+
+def expand_segments(segments, rate=SETPOINT_RATE, z_start=0.0):
+    """
+    Expands a segment table into one hover setpoint per control tick, vectorized over all ticks
+
+    Args:
+    segments: Array (K, 5) with columns duration, vx, vy, yawrate, z
+    rate: Setpoint rate in Hz
+    z_start: Height before the first segment, z is interpolated linearly towards the z of each segment
+
+    Returns:
+    Array (N, 4) with columns vx, vy, yawrate, z
+    """
+    segments = np.asarray(segments, dtype=float)
+    ticks = np.maximum(1, np.round(segments[:, 0] * rate).astype(int))
+    index = np.repeat(np.arange(len(segments)), ticks)
+    # Position of every tick within its segment, in (0, 1]
+    progress = (np.arange(len(index)) - np.repeat(np.cumsum(ticks) - ticks, ticks) + 1) / ticks[index]
+    z_from = np.concatenate(([z_start], segments[:-1, 4]))[index]
+    z = z_from + (segments[index, 4] - z_from) * progress
+    return np.column_stack((segments[index, 1:4], z))
+
+
+def dead_reckon(segments, rate=SETPOINT_RATE, x0=0.0, y0=0.0, yaw0=0.0):
+    """
+    Predicts the ground path of a segment table by integrating the body velocities, vectorized
+
+    Args:
+    segments: Array (K, 5) with columns duration, vx, vy, yawrate, z
+    rate: Setpoint rate in Hz
+    x0: Initial x position
+    y0: Initial y position
+    yaw0: Initial yaw in deg (0: the crazyflie points in the direction of the positive x-axis)
+
+    Returns:
+    Array (N+1, 4) with columns x, y, z, t (time in s)
+    """
+    setpoints = expand_segments(segments, rate)
+    dt = 1.0 / rate
+    # Yaw at the start of every tick
+    yaw = np.radians(yaw0 + np.concatenate(([0.0], np.cumsum(setpoints[:-1, 2] * dt))))
+    vx = setpoints[:, 0] * np.cos(yaw) - setpoints[:, 1] * np.sin(yaw)
+    vy = setpoints[:, 0] * np.sin(yaw) + setpoints[:, 1] * np.cos(yaw)
+    x = x0 + np.concatenate(([0.0], np.cumsum(vx * dt)))
+    y = y0 + np.concatenate(([0.0], np.cumsum(vy * dt)))
+    z = np.concatenate(([0.0], setpoints[:, 3]))
+    t = np.arange(len(x)) * dt
+    return np.column_stack((x, y, z, t))
+
+
+class SetpointScheduler:
+    """
+    Streams precomputed hover setpoints at a fixed rate against a monotonic deadline clock.
+
+    The deadline of setpoint i is start + i / rate, so delays of single ticks do not accumulate.
+    Landing and emergency stop are checked in one place before every setpoint.
+    The actual send times are recorded to measure the jitter.
+    """
+
+    def __init__(self, commander, rate=SETPOINT_RATE, land_event=None, emergency_stop_event=None):
+        """
+        Args:
+        commander: Commander of the crazyflie (scf.cf.commander)
+        rate: Setpoint rate in Hz
+        land_event: threading.Event, stops streaming when set
+        emergency_stop_event: threading.Event, stops the motors when set
+        """
+        self.commander = commander
+        self.rate = rate
+        self.land_event = land_event
+        self.emergency_stop_event = emergency_stop_event
+        self.deadlines = np.zeros(0)
+        self.send_times = np.zeros(0)
+        self.sent = 0
+
+    def _interrupted(self):
+        # Single place for all interrupt checks
+        if self.emergency_stop_event is not None and self.emergency_stop_event.is_set():
+            print("Stopping motors")
+            self.commander.send_stop_setpoint()
+            return True
+        if self.land_event is not None and self.land_event.is_set():
+            self.commander.send_stop_setpoint()
+            return True
+        return False
+
+    def run(self, setpoints):
+        """
+        Streams the setpoints, blocking until all are sent or the flight is interrupted
+
+        Args:
+        setpoints: Array (N, 4) with columns vx, vy, yawrate, z (see expand_segments)
+
+        Returns:
+        0: if all setpoints were sent
+        1: if the flight was interrupted
+        """
+        setpoints = np.asarray(setpoints, dtype=float).tolist()
+        period = 1.0 / self.rate
+        self.send_times = np.zeros(len(setpoints))
+        self.sent = 0
+        start = time.monotonic()
+        self.deadlines = start + np.arange(len(setpoints)) * period
+        send = self.commander.send_hover_setpoint
+        for i, (vx, vy, yawrate, z) in enumerate(setpoints):
+            remaining = start + i * period - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+            if self._interrupted():
+                return 1
+            self.send_times[i] = time.monotonic()
+            send(vx, vy, yawrate, z)
+            self.sent = i + 1
+        return 0
+
+    def jitter(self):
+        """
+        Returns:
+        Dictionary with the lateness of the sent setpoints against their deadlines (in s)
+        and the achieved rate (in Hz)
+        """
+        if self.sent == 0:
+            return {'sent': 0}
+        late = self.send_times[:self.sent] - self.deadlines[:self.sent]
+        duration = self.send_times[self.sent - 1] - self.send_times[0]
+        return {
+            'sent': self.sent,
+            'late_p50': float(np.percentile(late, 50)),
+            'late_p99': float(np.percentile(late, 99)),
+            'late_max': float(late.max()),
+            'rate': float((self.sent - 1) / duration) if duration > 0 else float(self.rate),
+        }
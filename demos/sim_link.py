@@ -0,0 +1,659 @@
+import argparse
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+import cflib.crtp
+from cflib.crtp.crtpdriver import CRTPDriver
+from cflib.crtp.crtpstack import CRTPPacket, CRTPPort
+from cflib.crtp.exceptions import WrongUriType
+
+import poly_trajectory
+
+SIM_SCHEME = 'sim'
+PROTOCOL_VERSION = 10 # CRTP protocol version reported to cflib
+PHYSICS_RATE = 100 # in Hz, minimal rate of the kinematic model
+MIN_LOG_PERIOD = 0.001 # in s, log blocks stream at most at 1 kHz
+COMMANDER_TIMEOUT = 0.5 # in s, without setpoints the crazyflie stops moving
+COMMANDER_SHUTDOWN = 2.0 # in s, without setpoints the motors are stopped
+HOVER_TIME_CONSTANT = 0.2 # in s, first order lag towards the setpoint height or position
+FALL_VELOCITY = 2.0 # in m/s, descent after the motors are stopped in the air
+TRAJECTORY_MEMORY_SIZE = 4096 # in bytes
+MEMORY_ID_TRAJECTORY = 0
+MEMORY_TYPE_TRAJECTORY = 0x12
+
+# Battery voltage over the flight time with running motors: flight time in s, voltage in V
+BATTERY_CURVE = np.array([
+    [0, 4.15],
+    [30, 3.95],
+    [120, 3.80],
+    [300, 3.65],
+    [390, 3.45],
+    [420, 3.20],
+    [450, 2.90],
+    [470, 2.60],
+])
+BATTERY_SAG = 0.15 # in V, voltage drop with running motors
+BATTERY_IDLE_DRAIN = 0.05 # drain on the ground relative to flying
+
+# Log TOC: group, name, type id (see cflib LogTocElement.types)
+LOG_TOC = [
+    ('stateEstimate', 'x', 0x07),
+    ('stateEstimate', 'y', 0x07),
+    ('stateEstimate', 'z', 0x07),
+    ('stateEstimate', 'vx', 0x07),
+    ('stateEstimate', 'vy', 0x07),
+    ('stateEstimate', 'vz', 0x07),
+    ('stateEstimate', 'yaw', 0x07),
+    ('stateEstimateZ', 'x', 0x05), # in mm
+    ('stateEstimateZ', 'y', 0x05),
+    ('stateEstimateZ', 'z', 0x05),
+    ('pm', 'vbat', 0x07),
+    ('pm', 'vbatMV', 0x02),
+    ('pm', 'batteryLevel', 0x01),
+    ('stateEstimateZ', 'vx', 0x05), # in mm/s
+    ('stateEstimateZ', 'vy', 0x05),
+    ('stateEstimateZ', 'vz', 0x05),
+]
+
+# Param TOC: group, name, type id (see cflib ParamTocElement.types, 0x40: read only), default value
+PARAM_TOC = [
+    ('deck', 'bcLoco', 0x08 | 0x40, 1),
+    ('kalman', 'resetEstimation', 0x08, 0),
+    ('commander', 'enHighLevel', 0x08, 0),
+    ('stabilizer', 'estimator', 0x08, 2),
+    ('stabilizer', 'controller', 0x08, 1),
+]
+
+LOG_TYPES = {0x01: '<B', 0x02: '<H', 0x03: '<L', 0x04: '<b', 0x05: '<h', 0x06: '<i', 0x07: '<f', 0x08: '<e'}
+PARAM_TYPES = {0x08: '<B', 0x09: '<H', 0x0A: '<L', 0x00: '<b', 0x01: '<h', 0x02: '<i', 0x06: '<f', 0x07: '<d'}
+
+
+def _toc_crc(toc):
+    # Stable checksum of a TOC, changes when an entry changes (like the firmware TOC CRC)
+    return zlib.crc32(repr([entry[:3] for entry in toc]).encode())
+
+
+def _packet(port, channel, data):
+    pk = CRTPPacket()
+    pk.set_header(port, channel)
+    pk.data = data
+    return pk
+
+
+def _encode(value, fmt):
+    # Packs a float into a log/param type, integers are rounded and saturated
+    if fmt in ('<f', '<d', '<e'):
+        return struct.pack(fmt, value)
+    bits = struct.calcsize(fmt) * 8
+    low, high = (0, 2 ** bits - 1) if fmt[1].isupper() else (-2 ** (bits - 1), 2 ** (bits - 1) - 1)
+    return struct.pack(fmt, int(min(max(round(value), low), high)))
+
+
+def _smooth_step(tau):
+    # Polynomial of degree 7 from 0 to 1 with zero velocity, acceleration and jerk at both ends,
+    # the shape of the high level planner for takeoff, land and go_to
+    tau = min(max(tau, 0.0), 1.0)
+    return tau ** 4 * (35 - 84 * tau + 70 * tau ** 2 - 20 * tau ** 3)
+
+
+class SimulatedCrazyflie:
+    """
+    Firmware side of a simulated crazyflie: log and param TOC, log blocks, parameters,
+    trajectory memory, commander and high level commander on a simple kinematic model
+    with a battery drain curve.
+
+    Setpoints move the model directly (no attitude dynamics). Height and position setpoints are
+    approached with a first order lag, high level commands follow the planner polynomials exactly.
+    The estimate is the model state with gaussian noise.
+    """
+
+    def __init__(self, name='0', rate=None, loss=0.0, noise=0.002, drain=1.0, battery_curve=BATTERY_CURVE,
+                 x=0.0, y=0.0, loco=1, seed=None):
+        """
+        Args:
+        name: Name of the crazyflie (the part after sim://)
+        rate: Log rate in Hz for all blocks (up to 1000), None to use the period of every block
+        loss: Probability of losing a packet, in each direction
+        noise: Standard deviation of the position estimate in m
+        drain: Speed factor of the battery drain (e.g. 10 for a ten times faster discharge)
+        battery_curve: Array (K, 2) with the flight time in s and the voltage in V
+        x: Initial x position
+        y: Initial y position
+        loco: 1 if the loco deck is attached, 0 if not
+        seed: Seed of the random generator (noise and packet loss)
+        """
+        self.name = name
+        self.rate = rate
+        self.loss = loss
+        self.noise = noise
+        self.drain = drain
+        self.battery_curve = np.asarray(battery_curve, dtype=float)
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.RLock()
+        self.boot_time = time.monotonic()
+
+        self.param_values = [default for *_, default in PARAM_TOC]
+        self.param_values[0] = int(loco)
+        self.memory = bytearray(TRAJECTORY_MEMORY_SIZE)
+        self.trajectories = dict() # id -> (offset, number of pieces)
+        self.blocks = dict() # id -> {'variables': [(log index, fetch format)], 'period': s, 'started': bool, 'due': t}
+
+        self.position = np.array([x, y, 0.0])
+        self.velocity = np.zeros(3)
+        self.yaw = 0.0 # in deg
+        self.mode = 'off' # off, hover, position, velocity, planner
+        self.setpoint = np.zeros(4)
+        self.setpoint_time = None
+        self.plan = None # callable time -> position
+        self.plan_end = 0.0
+        self.plan_lands = False
+        self.flight_time = 0.0 # battery usage in s of flight
+        self.last_step = None
+
+        self.counters = dict(uplink=0, downlink=0, uplink_lost=0, downlink_lost=0, log_packets=0,
+                             setpoints=0, hl_commands=0, stops=0)
+        self.stop_time = None # perf_counter time of the last stop command
+
+    # state
+
+    def motors_running(self):
+        return self.mode != 'off'
+
+    def battery_voltage(self):
+        voltage = np.interp(self.flight_time, self.battery_curve[:, 0], self.battery_curve[:, 1])
+        return float(voltage - (BATTERY_SAG if self.motors_running() else 0.0))
+
+    def _stop_motors(self):
+        self.mode = 'off'
+        self.plan = None
+        self.counters['stops'] += 1
+        self.stop_time = time.perf_counter()
+
+    def _start_plan(self, plan, duration, lands=False):
+        now = time.monotonic()
+        self.mode = 'planner'
+        self.plan = lambda t, start=now: plan(t - start)
+        self.plan_end = now + duration
+        self.plan_lands = lands
+
+    def _plan_segment(self, target, duration):
+        start = self.position.copy()
+        target = np.asarray(target, dtype=float)
+        duration = max(duration, 1e-3)
+        return lambda t: start + (target - start) * _smooth_step(t / duration)
+
+    def step(self, now):
+        """
+        Advances the kinematic model and the battery to the time now (time.monotonic)
+        """
+        with self.lock:
+            dt = 0.0 if self.last_step is None else now - self.last_step
+            self.last_step = now
+            if dt <= 0:
+                return
+            previous = self.position.copy()
+            if self.mode in ('hover', 'position', 'velocity'):
+                idle = now - self.setpoint_time
+                if idle > COMMANDER_SHUTDOWN:
+                    self._stop_motors()
+                elif idle > COMMANDER_TIMEOUT:
+                    self.setpoint = np.zeros(4)
+                    self.mode = 'velocity'
+            lag = min(1.0, dt / HOVER_TIME_CONSTANT)
+            if self.mode == 'hover':
+                vx, vy, yawrate, z = self.setpoint
+                yaw = np.radians(self.yaw)
+                self.position[0] += (vx * np.cos(yaw) - vy * np.sin(yaw)) * dt
+                self.position[1] += (vx * np.sin(yaw) + vy * np.cos(yaw)) * dt
+                self.position[2] += (z - self.position[2]) * lag
+                self.yaw += yawrate * dt
+            elif self.mode == 'position':
+                self.position += (self.setpoint[:3] - self.position) * lag
+            elif self.mode == 'velocity':
+                self.position += self.setpoint[:3] * dt
+                self.yaw += self.setpoint[3] * dt
+            elif self.mode == 'planner':
+                self.position = np.asarray(self.plan(min(now, self.plan_end)), dtype=float)
+                if now >= self.plan_end and self.plan_lands:
+                    self._stop_motors()
+            elif self.position[2] > 0:
+                self.position[2] = max(0.0, self.position[2] - FALL_VELOCITY * dt)
+            self.position[2] = max(self.position[2], 0.0)
+            self.velocity = (self.position - previous) / dt
+            self.flight_time += dt * self.drain * (1.0 if self.motors_running() else BATTERY_IDLE_DRAIN)
+
+    def log_values(self):
+        """
+        Returns:
+        List with the current value of every log TOC entry
+        """
+        x, y, z = self.position + self.rng.normal(0.0, self.noise, 3) if self.noise else self.position
+        vbat = self.battery_voltage()
+        return [x, y, z, *self.velocity, self.yaw, x * 1000, y * 1000, z * 1000, vbat, vbat * 1000,
+                np.clip((vbat - 3.0) / 1.2 * 100, 0, 100), *self.velocity * 1000]
+
+    # log port
+
+    def _handle_log(self, pk):
+        channel, data = pk.channel, pk.data
+        if channel == 0: # TOC
+            return self._handle_toc(CRTPPort.LOGGING, LOG_TOC, data)
+        if channel != 1: # settings
+            return []
+        command = data[0]
+        if command == 5: # reset
+            self.blocks.clear()
+            return [_packet(CRTPPort.LOGGING, 1, (5, 0, 0))]
+        block_id = data[1]
+        if command in (0, 6, 1, 7): # create, append (v1 and v2)
+            if command in (0, 6):
+                if block_id in self.blocks:
+                    return [_packet(CRTPPort.LOGGING, 1, (command, block_id, 17))] # EEXIST
+                self.blocks[block_id] = dict(variables=list(), period=0.1, started=False, due=0.0)
+            elif block_id not in self.blocks:
+                return [_packet(CRTPPort.LOGGING, 1, (command, block_id, 2))] # ENOENT
+            block = self.blocks[block_id]
+            step = 3 if command in (6, 7) else 2
+            for i in range(2, len(data) - step + 1, step):
+                index = data[i + 1] | (data[i + 2] << 8) if step == 3 else data[i + 1]
+                block['variables'].append((index, LOG_TYPES[data[i] & 0x0F]))
+            if sum(struct.calcsize(fmt) for _, fmt in block['variables']) > 26:
+                del self.blocks[block_id]
+                return [_packet(CRTPPort.LOGGING, 1, (command, block_id, 7))] # E2BIG
+            return [_packet(CRTPPort.LOGGING, 1, (command, block_id, 0))]
+        if block_id not in self.blocks:
+            return [_packet(CRTPPort.LOGGING, 1, (command, block_id, 2))] # ENOENT
+        block = self.blocks[block_id]
+        if command == 3: # start, period in 10 ms
+            block['period'] = max(MIN_LOG_PERIOD, 1.0 / self.rate if self.rate else data[2] / 100.0)
+            block['started'] = True
+            block['due'] = time.monotonic()
+        elif command == 4: # stop
+            block['started'] = False
+        elif command == 2: # delete
+            del self.blocks[block_id]
+        return [_packet(CRTPPort.LOGGING, 1, (command, block_id, 0))]
+
+    def log_packets(self, now):
+        """
+        Returns:
+        The log data packets of all started blocks, which are due at the time now
+        """
+        packets = list()
+        with self.lock:
+            values = None
+            timestamp = int((now - self.boot_time) * 1000) & 0xFFFFFF
+            for block_id, block in self.blocks.items():
+                if not block['started'] or now < block['due']:
+                    continue
+                # Next deadline from the last one, skipping missed periods instead of bursting
+                block['due'] += block['period']
+                if block['due'] < now:
+                    block['due'] = now + block['period']
+                if values is None:
+                    values = self.log_values()
+                payload = bytearray((block_id,)) + timestamp.to_bytes(3, 'little')
+                for index, fmt in block['variables']:
+                    payload += _encode(values[index], fmt)
+                packets.append(_packet(CRTPPort.LOGGING, 2, payload))
+            self.counters['log_packets'] += len(packets)
+        return packets
+
+    def next_log_due(self):
+        with self.lock:
+            return min((block['due'] for block in self.blocks.values() if block['started']), default=None)
+
+    # param port
+
+    def _handle_toc(self, port, toc, data):
+        command = data[0]
+        if command == 3: # info v2
+            return [_packet(port, 0, struct.pack('<BHI', 3, len(toc), _toc_crc(toc)))]
+        if command == 2: # item v2
+            index = data[1] | (data[2] << 8)
+            group, name, type_id = toc[index][:3]
+            payload = struct.pack('<BHB', 2, index, type_id) + group.encode() + b'\0' + name.encode() + b'\0'
+            return [_packet(port, 0, payload)]
+        return []
+
+    def _handle_param(self, pk):
+        channel, data = pk.channel, pk.data
+        if channel == 0:
+            return self._handle_toc(CRTPPort.PARAM, PARAM_TOC, data)
+        if channel in (1, 2) and len(data) >= 2:
+            index = data[0] | (data[1] << 8)
+            if index >= len(PARAM_TOC):
+                return []
+            fmt = PARAM_TYPES[PARAM_TOC[index][2] & 0x0F]
+            if channel == 2: # write
+                self.param_values[index] = struct.unpack(fmt, bytes(data[2:2 + struct.calcsize(fmt)]))[0]
+                return [_packet(CRTPPort.PARAM, 2, bytes(data[:2]) + _encode(self.param_values[index], fmt))]
+            return [_packet(CRTPPort.PARAM, 1, bytes(data[:2]) + b'\0' + _encode(self.param_values[index], fmt))]
+        return []
+
+    # memory port
+
+    def _handle_memory(self, pk):
+        channel, data = pk.channel, pk.data
+        if channel == 0: # info
+            if data[0] == 1: # number of memories
+                return [_packet(CRTPPort.MEM, 0, (1, 1))]
+            if data[0] == 2 and data[1] == MEMORY_ID_TRAJECTORY: # details
+                payload = struct.pack('<BBBI', 2, MEMORY_ID_TRAJECTORY, MEMORY_TYPE_TRAJECTORY, len(self.memory)) + bytes(8)
+                return [_packet(CRTPPort.MEM, 0, payload)]
+            return []
+        memory_id, address = struct.unpack('<BI', bytes(data[:5]))
+        if channel == 2: # write
+            chunk = bytes(data[5:])
+            ok = memory_id == MEMORY_ID_TRAJECTORY and address + len(chunk) <= len(self.memory)
+            if ok:
+                self.memory[address:address + len(chunk)] = chunk
+            return [_packet(CRTPPort.MEM, 2, struct.pack('<BIB', memory_id, address, 0 if ok else 28))] # ENOSPC
+        if channel == 1: # read
+            length = data[5]
+            chunk = bytes(self.memory[address:address + length])
+            return [_packet(CRTPPort.MEM, 1, struct.pack('<BIB', memory_id, address, 0) + chunk)]
+        return []
+
+    # commander ports
+
+    def _set_setpoint(self, mode, values):
+        self.mode = mode
+        self.plan = None
+        self.setpoint = np.array(values, dtype=float)
+        self.setpoint_time = time.monotonic()
+        self.counters['setpoints'] += 1
+
+    def _handle_commander(self, pk):
+        data = bytes(pk.data)
+        if pk.port == CRTPPort.COMMANDER: # roll, pitch, yawrate, thrust
+            if struct.unpack('<fffH', data[:14])[3] == 0:
+                self._stop_motors()
+            return []
+        if pk.channel == 1: # notify setpoint stop, the high level commander holds the position
+            if self.mode != 'off':
+                self._start_plan(lambda t, p=self.position.copy(): p, 0.0)
+            return []
+        setpoint_type = data[0]
+        if setpoint_type == 0:
+            self._stop_motors()
+        elif setpoint_type in (5, 10): # hover: vx, vy, yawrate, z
+            self._set_setpoint('hover', struct.unpack('<ffff', data[1:17]))
+        elif setpoint_type == 7: # position: x, y, z, yaw
+            self._set_setpoint('position', struct.unpack('<ffff', data[1:17]))
+        elif setpoint_type in (1, 8): # world velocity: vx, vy, vz, yawrate
+            self._set_setpoint('velocity', struct.unpack('<ffff', data[1:17]))
+        return []
+
+    def _handle_high_level(self, pk):
+        data = bytes(pk.data)
+        command = data[0]
+        self.counters['hl_commands'] += 1
+        if command == 3: # stop
+            self._stop_motors()
+        elif command in (7, 8): # takeoff, land: height, yaw, use current yaw, duration
+            _, _, height, _, _, duration = struct.unpack('<BBff?f', data[:16])
+            target = (self.position[0], self.position[1], height)
+            self._start_plan(self._plan_segment(target, duration), duration, lands=command == 8)
+        elif command in (4, 12): # go to
+            if command == 4:
+                _, _, relative, x, y, z, _, duration = struct.unpack('<BBBfffff', data[:23])
+            else:
+                _, _, relative, _, x, y, z, _, duration = struct.unpack('<BBBBfffff', data[:24])
+            target = np.array((x, y, z)) + (self.position if relative else 0.0)
+            self._start_plan(self._plan_segment(target, duration), duration)
+        elif command == 6: # define trajectory
+            _, trajectory_id, _, _, offset, count = struct.unpack('<BBBBIB', data[:9])
+            self.trajectories[trajectory_id] = (offset, count)
+        elif command in (5, 13): # start trajectory
+            if command == 5:
+                _, _, relative, reverse, trajectory_id, time_scale = struct.unpack('<BBBBBf', data[:10])
+            else:
+                _, _, relative, _, reverse, trajectory_id, time_scale = struct.unpack('<BBBBBBf', data[:11])
+            if trajectory_id in self.trajectories:
+                offset, count = self.trajectories[trajectory_id]
+                pieces = poly_trajectory.unpack_trajectory(
+                    self.memory[offset:offset + count * poly_trajectory.PIECE_DTYPE.itemsize]).copy()
+                duration = float(pieces['duration'].sum()) * time_scale
+                shift = self.position - poly_trajectory.evaluate(pieces, 0.0)[0] if relative else 0.0
+                def plan(t):
+                    t = t / time_scale
+                    return poly_trajectory.evaluate(pieces, duration / time_scale - t if reverse else t)[0] + shift
+                self._start_plan(plan, duration)
+        return []
+
+    # link
+
+    def handle(self, pk):
+        """
+        Handles a packet from the host
+
+        Returns:
+        List with the answer packets
+        """
+        with self.lock:
+            port = pk.port
+            if port == CRTPPort.LINKCTRL:
+                if pk.channel == 1: # source: identifies the crazyflie
+                    return [_packet(CRTPPort.LINKCTRL, 1, b'Bitcraze Crazyflie')]
+                if pk.channel == 0: # echo
+                    return [_packet(CRTPPort.LINKCTRL, 0, bytes(pk.data))]
+                return []
+            if port == CRTPPort.PLATFORM:
+                if pk.channel == 1 and pk.data[0] == 0: # protocol version
+                    return [_packet(CRTPPort.PLATFORM, 1, (0, PROTOCOL_VERSION))]
+                return []
+            if port == CRTPPort.LOGGING:
+                return self._handle_log(pk)
+            if port == CRTPPort.PARAM:
+                return self._handle_param(pk)
+            if port == CRTPPort.MEM:
+                return self._handle_memory(pk)
+            if port in (CRTPPort.COMMANDER, CRTPPort.COMMANDER_GENERIC):
+                return self._handle_commander(pk)
+            if port == CRTPPort.SETPOINT_HL:
+                return self._handle_high_level(pk)
+            return []
+
+
+# Simulated crazyflies by name, they keep their state between connections
+_crazyflies = dict()
+_crazyflies_lock = threading.Lock()
+
+
+def parse_uri(uri):
+    """
+    Parses a simulator uri, e.g. sim://1?rate=500&loss=0.01&drain=10
+
+    Returns:
+    name: Name of the crazyflie
+    options: Dictionary with the options of SimulatedCrazyflie
+    """
+    parsed = urlparse(uri)
+    if parsed.scheme != SIM_SCHEME:
+        raise WrongUriType(f"Not a simulator uri: {uri}")
+    options = {key: float(values[-1]) for key, values in parse_qs(parsed.query).items()}
+    for key in ('seed', 'loco'):
+        if key in options:
+            options[key] = int(options[key])
+    return parsed.netloc or '0', options
+
+
+def simulated_crazyflie(uri):
+    """
+    Returns:
+    The simulated crazyflie of the uri, created with the options of the uri on first use
+    """
+    name, options = parse_uri(uri)
+    with _crazyflies_lock:
+        if name not in _crazyflies:
+            _crazyflies[name] = SimulatedCrazyflie(name, **options)
+        return _crazyflies[name]
+
+
+def reset(uri=None):
+    """
+    Forgets the simulated crazyflie of the uri (all of them if None), the next connection starts fresh
+    """
+    with _crazyflies_lock:
+        if uri is None:
+            _crazyflies.clear()
+        else:
+            _crazyflies.pop(parse_uri(uri)[0], None)
+
+
+class SimDriver(CRTPDriver):
+    """
+    CRTP link driver for sim:// uris. The packets are answered by a SimulatedCrazyflie,
+    the log data is streamed from a firmware thread at the rate of the log blocks.
+    """
+
+    def __init__(self):
+        CRTPDriver.__init__(self)
+        self.uri = None
+        self.crazyflie = None
+        self.in_queue = queue.Queue()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def connect(self, uri, radio_link_statistics_callback, link_error_callback):
+        self.crazyflie = simulated_crazyflie(uri)
+        self.uri = uri
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._firmware, name=f"SimFirmware-{self.crazyflie.name}", daemon=True)
+        self._thread.start()
+
+    def _lost(self, direction):
+        crazyflie = self.crazyflie
+        crazyflie.counters[direction] += 1
+        if crazyflie.loss and crazyflie.rng.random() < crazyflie.loss:
+            crazyflie.counters[direction + '_lost'] += 1
+            return True
+        return False
+
+    def _deliver(self, packets):
+        for pk in packets:
+            if not self._lost('downlink'):
+                self.in_queue.put(pk)
+
+    def _firmware(self):
+        # Steps the model at least at PHYSICS_RATE and sends the log data when it is due
+        crazyflie = self.crazyflie
+        period = 1.0 / PHYSICS_RATE
+        next_step = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if now >= next_step:
+                next_step += period
+                if next_step < now:
+                    next_step = now + period
+            crazyflie.step(now)
+            self._deliver(crazyflie.log_packets(now))
+            due = crazyflie.next_log_due()
+            wake = next_step if due is None else min(next_step, due)
+            timeout = wake - time.monotonic()
+            if timeout > 0:
+                self._stop_event.wait(timeout)
+
+    def send_packet(self, pk):
+        if self.crazyflie is None or self._lost('uplink'):
+            return
+        self._deliver(self.crazyflie.handle(pk))
+
+    def receive_packet(self, wait=0):
+        try:
+            if wait == 0:
+                return self.in_queue.get(False)
+            if wait < 0:
+                return self.in_queue.get(True)
+            return self.in_queue.get(True, wait)
+        except queue.Empty:
+            return None
+
+    def get_status(self):
+        return 'Simulated'
+
+    def get_name(self):
+        return 'sim'
+
+    def scan_interface(self, address=None):
+        with _crazyflies_lock:
+            return [[f"{SIM_SCHEME}://{name}", 'Simulated crazyflie'] for name in _crazyflies]
+
+    def enum(self):
+        return self.scan_interface()
+
+    def get_help(self):
+        return 'sim://<name>?rate=<Hz>&loss=<probability>&noise=<m>&drain=<factor>&x=<m>&y=<m>&loco=<0|1>&seed=<n>'
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1)
+        self._thread = None
+
+
+def register():
+    """
+    Registers the simulator driver with cflib, call after cflib.crtp.init_drivers()
+    """
+    if SimDriver not in cflib.crtp.CLASSES:
+        cflib.crtp.CLASSES.insert(0, SimDriver)
+
+
+# Stream the position logging of the demo from a simulated crazyflie and measure the callback throughput
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Log from a simulated crazyflie and measure the callback throughput")
+    parser.add_argument('--uri', default='sim://0', help="simulator uri, options as query, e.g. sim://0?loss=0.01")
+    parser.add_argument('--rate', type=float, default=100, help="log rate in Hz (up to 1000)")
+    parser.add_argument('--duration', type=float, default=5, help="logging time in s")
+    args = parser.parse_args(argv)
+
+    from cflib.crazyflie import Crazyflie
+    from cflib.crazyflie.log import LogConfig
+    from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+    from telemetry import TelemetryStore
+
+    cflib.crtp.init_drivers()
+    register()
+    simulated_crazyflie(args.uri).rate = args.rate
+    telemetry = TelemetryStore(capacity=int(args.rate * args.duration * 2), ring=True)
+    callback_times = list()
+
+    def log_callback(timestamp, data, logconf):
+        start = time.perf_counter()
+        telemetry.append(timestamp, data['stateEstimate.x'], data['stateEstimate.y'], data['stateEstimate.z'], data['pm.vbat'])
+        callback_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with SyncCrazyflie(args.uri, cf=Crazyflie()) as scf:
+        connect_time = time.perf_counter() - start
+        logconf = LogConfig(name='Position', period_in_ms=10)
+        for variable in ('stateEstimate.x', 'stateEstimate.y', 'stateEstimate.z', 'pm.vbat'):
+            logconf.add_variable(variable, 'float')
+        scf.cf.log.add_config(logconf)
+        logconf.data_received_cb.add_callback(log_callback)
+        logconf.start()
+        time.sleep(args.duration)
+        logconf.stop()
+    counters = simulated_crazyflie(args.uri).counters
+
+    samples = telemetry.total
+    callback_times = np.array(callback_times) * 1e6
+    print(f"Connected in {connect_time * 1000:.1f} ms")
+    print(f"Received {samples} samples in {args.duration:.1f} s ({samples / args.duration:.1f} Hz, "
+          f"{counters['log_packets']} sent, {counters['downlink_lost']} lost)")
+    if samples:
+        print(f"Callback time: mean {callback_times.mean():.1f} us, p99 {np.percentile(callback_times, 99):.1f} us, "
+              f"max {callback_times.max():.1f} us")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
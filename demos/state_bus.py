@@ -0,0 +1,274 @@
+import argparse
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+from telemetry import TELEMETRY_DTYPE
+
+STATE_BUS_NAME = "crazyflie_state" # name of the shared memory block
+STATE_BUS_CAPACITY = 6000 # in samples, one minute at 100 Hz
+MAGIC = 0x43465342 # 'CFSB'
+LAYOUT_VERSION = 1
+
+# Header at the start of the shared memory block, padded to one cache line
+HEADER_DTYPE = np.dtype({
+    'names': ['magic', 'version', 'capacity', 'count'],
+    'formats': ['<u4', '<u4', '<u8', '<u8'],
+    'offsets': [0, 4, 8, 16],
+    'itemsize': 64,
+})
+# One slot of the ring: sequence number (odd while written) followed by the sample
+SLOT_DTYPE = np.dtype([('seq', '<u8'), ('sample', TELEMETRY_DTYPE)])
+_SLOT = struct.Struct('<Qq4f') # seq, timestamp, x, y, z, batterylevel
+_SEQ = struct.Struct('<Q')
+_COUNT_OFFSET = HEADER_DTYPE.fields['count'][1]
+
+
+def _attach(name):
+    # Attaches to an existing block without registering it for removal at exit (readers do not own it)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError: # Python < 3.13, attaching always registers the block, skip the registration
+        from multiprocessing import resource_tracker
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None if rtype == 'shared_memory' else register(name, rtype)
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class StatePublisher:
+    """
+    Publishes the telemetry samples to a shared memory ring for local reader processes (see StateReader).
+
+    The ring is guarded by a sequence number per slot (seqlock): the slot of sample k carries 2k+1 while
+    it is written and 2k+2 afterwards, then the total count in the header is increased. There is a single
+    writer and readers never write, so publishing costs the same for any number of readers.
+    """
+
+    def __init__(self, name=STATE_BUS_NAME, capacity=STATE_BUS_CAPACITY):
+        """
+        Args:
+        name: Name of the shared memory block, readers attach by this name
+        capacity: Number of samples kept in the ring
+        """
+        self.name = name
+        self.capacity = int(capacity)
+        size = HEADER_DTYPE.itemsize + self.capacity * SLOT_DTYPE.itemsize
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a crashed flight, this process is the owner now
+            stale = _attach(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._buf = self.shm.buf
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self._buf)
+        self.header['count'] = 0
+        self.header['capacity'] = self.capacity
+        self.header['version'] = LAYOUT_VERSION
+        self.header['magic'] = MAGIC
+        self.count = 0
+
+    def publish(self, timestamp, x, y, z, batterylevel):
+        """
+        Publishes one sample, called from the log callback
+        """
+        count = self.count
+        offset = HEADER_DTYPE.itemsize + (count % self.capacity) * SLOT_DTYPE.itemsize
+        _SLOT.pack_into(self._buf, offset, 2 * count + 1, timestamp, x, y, z, batterylevel)
+        _SEQ.pack_into(self._buf, offset, 2 * count + 2)
+        self.count = count + 1
+        _SEQ.pack_into(self._buf, _COUNT_OFFSET, count + 1)
+
+    def close(self):
+        """
+        Removes the shared memory block, attached readers keep their mapping until they close
+        """
+        self.header = None
+        self._buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class StateReader:
+    """
+    Reader of the state bus, any number of reader processes can attach to one publisher.
+
+    latest() returns the newest sample, tail() returns the samples published since the previous call.
+    The samples of tail() are views into the shared memory (no copy), they stay valid until the
+    publisher wrapped around the ring once more (capacity samples later), like the ring views of
+    TelemetryStore.
+    """
+
+    def __init__(self, name=STATE_BUS_NAME, from_start=False):
+        """
+        Args:
+        name: Name of the shared memory block of the publisher
+        from_start: If True, the first tail() returns all samples still in the ring, otherwise only new ones
+
+        Raises:
+        FileNotFoundError: If no publisher with this name is running
+        """
+        self.shm = _attach(name)
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        if int(self.header['magic']) != MAGIC or int(self.header['version']) != LAYOUT_VERSION:
+            self.close()
+            raise ValueError(f"Shared memory block {name} is not a state bus (layout version {LAYOUT_VERSION})")
+        self.capacity = int(self.header['capacity'])
+        self.slots = np.ndarray((self.capacity,), dtype=SLOT_DTYPE, buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+        self.position = 0 if from_start else self.count
+        self.lost = 0 # samples overwritten before they were read by tail()
+
+    @property
+    def count(self):
+        """
+        Returns:
+        Total number of samples published
+        """
+        return int(self.header['count'])
+
+    def latest(self, retries=100):
+        """
+        Returns:
+        A copy of the newest sample (numpy record), or None if nothing was published yet
+        """
+        for _ in range(retries):
+            count = self.count
+            if count == 0:
+                return None
+            slot = self.slots[(count - 1) % self.capacity]
+            expected = 2 * (count - 1) + 2
+            if slot['seq'] != expected:
+                continue
+            sample = slot['sample'].copy()
+            if slot['seq'] == expected:
+                return sample
+        raise RuntimeError("No consistent sample read, the publisher overwrites the ring too fast")
+
+    def tail(self, max_samples=None):
+        """
+        Returns the samples published since the previous call (oldest first), at most up to the end of
+        the ring, the rest follows with the next call
+
+        Args:
+        max_samples: Maximal number of samples returned
+
+        Returns:
+        Structured view of TELEMETRY_DTYPE (no copy)
+        """
+        count = self.count
+        if count - self.position > self.capacity:
+            # The publisher lapped this reader
+            self.lost += count - self.capacity - self.position
+            self.position = count - self.capacity
+        start = self.position % self.capacity
+        n = min(count - self.position, self.capacity - start)
+        if max_samples is not None:
+            n = min(n, max_samples)
+        slots = self.slots[start:start + n]
+        # Only slots that were completely written for the expected samples are returned
+        expected = 2 * np.arange(self.position, self.position + n, dtype=np.uint64) + 2
+        valid = slots['seq'] == expected
+        if not valid.all():
+            first = int(np.argmin(valid))
+            if first == 0:
+                # Overwritten while reading, start over at the oldest sample still in the ring
+                skipped = max(1, self.count - self.capacity - self.position)
+                self.lost += skipped
+                self.position += skipped
+                return self.slots[:0]['sample']
+            slots = slots[:first]
+        self.position += len(slots)
+        return slots['sample']
+
+    def close(self):
+        self.header = None
+        self.slots = None
+        self.shm.close()
+
+
+def _reader_process(name, duration, ready):
+    # Polls the bus as fast as possible, used to load the publisher in the benchmark
+    reader = StateReader(name)
+    ready.set()
+    end = time.monotonic() + duration
+    samples = 0
+    while time.monotonic() < end:
+        reader.latest()
+        samples += len(reader.tail())
+    reader.close()
+
+
+def benchmark_publish(readers=0, samples=100000, name=STATE_BUS_NAME + "_benchmark"):
+    """
+    Measures the publishing time per sample while `readers` processes poll the bus
+
+    Returns:
+    Array with the publishing time of every sample in s
+    """
+    import multiprocessing
+    publisher = StatePublisher(name)
+    context = multiprocessing.get_context('spawn')
+    processes = list()
+    try:
+        for _ in range(readers):
+            ready = context.Event()
+            process = context.Process(target=_reader_process, args=(name, 3600, ready), daemon=True)
+            process.start()
+            ready.wait(30)
+            processes.append(process)
+        times = np.zeros(samples)
+        clock = time.perf_counter
+        for i in range(samples):
+            start = clock()
+            publisher.publish(i * 10, 1.0, 2.0, 1.0, 3.9)
+            times[i] = clock() - start
+        return times
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+        publisher.close()
+
+
+# Prints the live state of a running flight, or benchmarks the publishing cost
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read the live state of the crazyflie from the shared memory bus")
+    parser.add_argument('--name', default=STATE_BUS_NAME)
+    parser.add_argument('--rate', type=float, default=5, help="in Hz, rate of the printed samples")
+    parser.add_argument('--benchmark', action='store_true', help="measure the publishing cost with 0 to 4 readers")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        for readers in (0, 1, 4):
+            times = benchmark_publish(readers) * 1e6
+            print(f"{readers} readers: publish p50 {np.percentile(times, 50):.2f} us, p99 {np.percentile(times, 99):.2f} us")
+        return 0
+
+    try:
+        reader = StateReader(args.name)
+    except FileNotFoundError:
+        print(f"No state bus {args.name} found, is a flight running?")
+        return 1
+    try:
+        while True:
+            received = len(reader.tail())
+            sample = reader.latest()
+            if sample is not None:
+                print(f"t {sample['timestamp']} ms  x {sample['x']:.2f}  y {sample['y']:.2f}  z {sample['z']:.2f}  "
+                      f"battery {sample['batterylevel']:.2f} V  ({received} new, {reader.lost} lost)")
+            time.sleep(1 / args.rate)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        reader.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
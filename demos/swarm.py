@@ -0,0 +1,339 @@
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import trajectory
+import poly_trajectory
+from battery import BatterySupervisor
+from log_writer import FlightLogWriter, format_header
+from motion import InterruptibleMotion
+import connection
+import telemetry_profiles
+
+TELEMETRY_PROFILE = 'compact' # see telemetry_profiles.py
+DEFAULT_HEIGHT = 1 # in m
+TELEMETRY_WINDOW = 60000 # in samples
+DECK_TIMEOUT = connection.DECK_TIMEOUT # in s
+BARRIER_TIMEOUT = 30 # in s, maximal time to wait for the other drones at the start
+MIN_SEPARATION = 0.35 # in m
+POSITION_TIMEOUT = 2 # in s, maximal time to wait for the first position of every drone
+
+
+def cflib_link(uri):
+    """
+    Creates a SyncCrazyflie for the uri (real radio link), with the shared TOC cache
+    """
+    from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+    return SyncCrazyflie(uri, cf=connection.crazyflie())
+
+
+def offset_missions(setpoints, count):
+    """
+    Shifts a closed trajectory in phase, so the drones fly it evenly spread along the path
+
+    Args:
+    setpoints: Array (M, 3) with columns x, y, t of a closed path (first and last point equal)
+    count: Number of drones
+
+    Returns:
+    List with one array (M, 3) per drone, all with the same timing
+    """
+    setpoints = np.asarray(setpoints, dtype=float)
+    loop = setpoints[:-1, :2]
+    missions = list()
+    for i in range(count):
+        shifted = np.roll(loop, -int(round(i * len(loop) / count)), axis=0)
+        path = np.vstack((shifted, shifted[:1]))
+        missions.append(np.column_stack((path, setpoints[:, 2])))
+    return missions
+
+
+def min_separation(missions):
+    """
+    Minimal distance between any two drones at the same time, vectorized over all pairs and times
+
+    Args:
+    missions: List of arrays (M, 3) with the same timing
+
+    Returns:
+    The minimal distance in m (inf for a single drone)
+    """
+    if len(missions) < 2:
+        return np.inf
+    positions = np.stack([m[:, :2] for m in missions]) # (drones, M, 2)
+    distance = np.linalg.norm(positions[:, None] - positions[None, :], axis=3)
+    i, j = np.triu_indices(len(missions), 1)
+    return float(distance[i, j].min())
+
+
+def _segment_distance(a0, a1, b0, b1):
+    # Minimal distance between the segments a0-a1 and b0-b1 in the plane, 0 if they cross
+    def cross(o, p, q):
+        return (p[0] - o[0]) * (q[1] - o[1]) - (p[1] - o[1]) * (q[0] - o[0])
+    if cross(a0, a1, b0) * cross(a0, a1, b1) < 0 and cross(b0, b1, a0) * cross(b0, b1, a1) < 0:
+        return 0.0
+    import tracking
+    return float(min(tracking.distance_to_path(np.array([b0, b1]), np.array([a0, a1])).min(),
+                     tracking.distance_to_path(np.array([a0, a1]), np.array([b0, b1])).min()))
+
+
+def transit_separation(positions, missions):
+    """
+    Minimal distance between the drones on the way to their start points: take-off at the current
+    position and the straight go_to to the start of the mission. The legs are compared as whole
+    segments, independent of their timing, since the drones start them at different times and wait
+    at their start point for the others.
+
+    Args:
+    positions: List with the current position (x, y, ...) of every drone
+    missions: List of arrays (M, 3) with one trajectory per drone, the transit ends at the first row
+
+    Returns:
+    The minimal distance in m (inf for a single drone)
+    """
+    legs = [(np.asarray(p, dtype=float)[:2], np.asarray(m, dtype=float)[0, :2]) for p, m in zip(positions, missions)]
+    distance = np.inf
+    for i in range(len(legs)):
+        for j in range(i + 1, len(legs)):
+            distance = min(distance, _segment_distance(*legs[i], *legs[j]))
+    return distance
+
+
+class Drone:
+    """
+    One crazyflie of the swarm with its own link, telemetry store, battery supervisor, events and log
+    """
+
+    def __init__(self, uri, index, link_factory=cflib_link, battery_threshold=None):
+        self.uri = uri
+        self.index = index
+        self.link_factory = link_factory
+        self.scf = None
+        self.logconf = None
+        self.log_writer = None
+        self.telemetry = telemetry_profiles.get_profile(TELEMETRY_PROFILE).create_store(TELEMETRY_WINDOW, ring=True)
+        self.land_event = threading.Event()
+        self.emergency_stop_event = threading.Event()
+        self.deck_attached_event = threading.Event()
+        if battery_threshold is None:
+            self.battery_supervisor = BatterySupervisor(self.land_event)
+        else:
+            self.battery_supervisor = BatterySupervisor(self.land_event, threshold=battery_threshold)
+        self.connect_time = None
+        self.connection_timer = None
+
+    # log callback, runs in the receive thread of this drone's link
+    def log_callback(self, row):
+        self.telemetry.append(*row)
+        if self.log_writer is not None:
+            self.log_writer.put(row[:5])
+
+    def current_position(self):
+        sample = self.telemetry.latest()
+        if sample is None:
+            return None
+        return sample['x'], sample['y'], sample['z']
+
+    def wait_for_position(self, timeout=POSITION_TIMEOUT):
+        """
+        Returns:
+        The current position once the first sample is logged, None after the timeout
+        """
+        deadline = time.monotonic() + timeout
+        while self.telemetry.latest() is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.current_position()
+
+    def _deck_callback(self, _, value_str):
+        if int(value_str):
+            self.deck_attached_event.set()
+
+    def connect(self):
+        start = time.perf_counter()
+        self.scf = self.link_factory(self.uri)
+        self.connection_timer = connection.ConnectionTimer(self.scf.cf)
+        self.scf.open_link()
+        self.connect_time = time.perf_counter() - start
+
+    def setup(self):
+        """
+        Checks the loco deck and configures the position logging
+        """
+        cf = self.scf.cf
+        cf.param.add_update_callback(group='deck', name='bcLoco', cb=self._deck_callback)
+        self.logconf = telemetry_profiles.ProfileLogger(telemetry_profiles.get_profile(TELEMETRY_PROFILE), cf, self.log_callback,
+                                                        {'batterylevel': self.battery_supervisor.update})
+        if not connection.wait_for_deck(self.scf, self.connection_timer, self.deck_attached_event, DECK_TIMEOUT):
+            raise RuntimeError(f"No loco deck detected on {self.uri}")
+
+    def start_logging(self, file_name, header):
+        self.log_writer = FlightLogWriter(file_name, header)
+        self.log_writer.start()
+        self.logconf.start()
+        self.battery_supervisor.arm()
+
+    def upload(self, setpoints, height):
+        return self.upload_pieces(poly_trajectory.fit_polynomials(setpoints, height))
+
+    def upload_pieces(self, pieces):
+        cf = self.scf.cf
+        poly_trajectory.upload_trajectory(poly_trajectory.trajectory_memory(cf), cf.high_level_commander, pieces)
+        return pieces
+
+    def fly(self, pieces, height, barrier):
+        """
+        Takes off, flies to the start of the trajectory, waits for the other drones and
+        starts the uploaded trajectory together with them
+
+        Returns:
+        0: if the flight was successful
+        1: if the flight was interrupted
+        """
+        cf = self.scf.cf
+        cf.param.set_value('commander.enHighLevel', '1')
+        cf.param.set_value('kalman.resetEstimation', '1')
+        time.sleep(0.1)
+        cf.param.set_value('kalman.resetEstimation', '0')
+        time.sleep(2)
+
+        motion = InterruptibleMotion(cf, self.land_event, self.emergency_stop_event, position=self.current_position)
+        start = poly_trajectory.evaluate(pieces, 0.0)[0]
+        ready = motion.take_off(height) and motion.go_to(start[0], start[1], height)
+        try:
+            if not ready:
+                barrier.abort()
+            barrier.wait(BARRIER_TIMEOUT)
+        except threading.BrokenBarrierError:
+            # Another drone did not make it to its start, no one starts the trajectory
+            if not motion.interrupted:
+                motion.land()
+            return 1
+        cf.high_level_commander.start_trajectory(poly_trajectory.TRAJECTORY_ID, 1.0, relative_position=False)
+        if not motion.wait(float(pieces['duration'].sum())):
+            return 1
+        motion.land()
+        return 0
+
+    def close(self):
+        self.battery_supervisor.disarm()
+        if self.logconf is not None and self.logconf.started:
+            self.logconf.stop()
+        if self.log_writer is not None:
+            self.log_writer.close()
+        if self.scf is not None:
+            self.scf.close_link()
+
+
+class Swarm:
+    """
+    Runs several crazyflies concurrently, each with its own link, telemetry, supervisor and mission.
+    Connecting, setup, upload and flying happen in parallel, one thread per drone.
+    """
+
+    def __init__(self, uris, link_factory=cflib_link, battery_threshold=None):
+        self.drones = [Drone(uri, i, link_factory, battery_threshold) for i, uri in enumerate(uris)]
+
+    def parallel(self, function, *args):
+        """
+        Calls function(drone, *args) for all drones concurrently.
+        On Ctrl-C all drones are landed before the calls are waited for.
+
+        Returns:
+        List with the results, one per drone, in the order of the drones
+        """
+        with ThreadPoolExecutor(max_workers=len(self.drones)) as executor:
+            futures = [executor.submit(function, drone, *args) for drone in self.drones]
+            try:
+                return [future.result() for future in futures]
+            except KeyboardInterrupt:
+                self.land_all()
+                raise
+
+    def land_all(self):
+        for drone in self.drones:
+            drone.land_event.set()
+
+    def emergency_stop_all(self):
+        for drone in self.drones:
+            drone.emergency_stop_event.set()
+
+    def run(self, missions, height, loco_file, log_directory="log_files", trajectory_type=-1):
+        """
+        Connects all drones, uploads their missions and flies them
+
+        Args:
+        missions: List with one timed trajectory (M, 3) per drone (see offset_missions)
+        height: Flight height in m
+        loco_file: The anchor setup file
+        log_directory: Directory of the flight logs, one log per drone
+        trajectory_type: Trajectory type in the log header (see cf_data.planned_trajectory), -1 unless the
+        missions fly exactly the reference path of a demo type
+
+        Returns:
+        List with the result (0 or 1) per drone
+
+        Raises:
+        ValueError: If a drone reports no position or the drones would come too close on the way to their start
+        """
+        try:
+            self.parallel(Drone.connect)
+            self.parallel(Drone.setup)
+            pieces = self.parallel(lambda drone: drone.upload(missions[drone.index], height))
+
+            timestamp = time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime())
+            def start_logging(drone):
+                file_name = f"{log_directory}/cf_swarm_{drone.index}_{timestamp}.txt"
+                drone.start_logging(file_name, format_header(sys.argv, timestamp, (2, trajectory_type, -1), loco_file))
+            self.parallel(start_logging)
+
+            positions = self.parallel(Drone.wait_for_position)
+            missing = [drone.uri for drone, position in zip(self.drones, positions) if position is None]
+            if missing:
+                raise ValueError(f"No position from {', '.join(missing)}")
+            separation = transit_separation(positions, missions)
+            if separation < MIN_SEPARATION:
+                raise ValueError(f"Drones would come as close as {separation:.2f} m on the way to their start points "
+                                 f"(minimum {MIN_SEPARATION} m), place them closer to their start points")
+
+            barrier = threading.Barrier(len(self.drones))
+            return self.parallel(lambda drone: drone.fly(pieces[drone.index], height, barrier))
+        finally:
+            self.parallel(Drone.close)
+
+
+# Fly several crazyflies on the same trajectory, spread evenly along the path
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fly a swarm of crazyflies on one trajectory")
+    parser.add_argument('uris', nargs='+', help="radio uris, e.g. radio://0/100/2M/E7E7E7E701")
+    parser.add_argument('--loco', default="../setup_files/anchor_positions_4a.yaml", help="anchor setup file")
+    parser.add_argument('--shape', default='circle', choices=['circle', 'ellipse', 'eight', 'square'])
+    parser.add_argument('--height', type=float, default=DEFAULT_HEIGHT)
+    args = parser.parse_args(argv)
+
+    setpoints = trajectory.create_for_setup(args.shape, args.loco)
+    missions = offset_missions(setpoints, len(args.uris))
+    separation = min_separation(missions)
+    if separation < MIN_SEPARATION:
+        print(f"Drones would come as close as {separation:.2f} m (minimum {MIN_SEPARATION} m), use fewer drones or a larger trajectory")
+        return 1
+
+    import cflib.crtp
+    import sim_link
+    cflib.crtp.init_drivers()
+    sim_link.register()
+    try:
+        # The shapes are fitted to the setup and offset per drone, the planned path of the logs is unknown
+        results = Swarm(args.uris).run(missions, args.height, args.loco)
+    except ValueError as error:
+        print(error)
+        return 1
+    for uri, result in zip(args.uris, results):
+        print(f"{uri}: {'done' if result == 0 else 'interrupted'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
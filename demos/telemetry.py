@@ -0,0 +1,193 @@
+import threading
+import numpy as np
+
+# Record layout of one telemetry sample as delivered by the 'Position' log block
+TELEMETRY_DTYPE = np.dtype([
+    ('timestamp', np.int64),
+    ('x', np.float32),
+    ('y', np.float32),
+    ('z', np.float32),
+    ('batterylevel', np.float32),
+])
+
+DEFAULT_CAPACITY = 6000 # samples, one minute at 100 Hz
+DEFAULT_CHUNK = 6000 # samples added at least per growth step
+
+
+class TelemetryStore:
+    """
+    Preallocated store for telemetry samples backed by a NumPy structured array.
+
+    Two modes are supported:
+    - growth mode (default): the buffer grows in chunks when it is full, all samples are kept
+    - ring mode: the buffer is bounded, the oldest samples are overwritten
+
+    In ring mode every sample is written twice (at i and i + capacity), so that any window
+    of the last n <= capacity samples is one contiguous slice and can be returned as a view.
+
+    Appending is O(1) (amortized in growth mode) and never allocates per sample.
+    Readers get views, not copies. Views returned in growth mode stay valid forever,
+    views returned in ring mode are overwritten after another `capacity` samples.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, ring=False, chunk=DEFAULT_CHUNK, dtype=TELEMETRY_DTYPE):
+        """
+        Args:
+        capacity: Number of samples to preallocate (ring mode: number of samples kept)
+        ring: If True, keep only the last `capacity` samples
+        chunk: Minimum number of samples added when the buffer grows (growth mode only)
+        dtype: Structured dtype of one sample
+        """
+        if capacity <= 0:
+            raise ValueError("Capacity must be a positive integer")
+        self.capacity = int(capacity)
+        self.ring = ring
+        self.chunk = int(chunk)
+        self.dtype = np.dtype(dtype)
+        self._lock = threading.Lock()
+        self._buffer = np.zeros(2 * self.capacity if ring else self.capacity, dtype=self.dtype)
+        self._count = 0 # total number of samples appended since the last clear
+
+    def __len__(self):
+        """
+        Returns:
+        Number of samples currently available to readers
+        """
+        return min(self._count, self.capacity) if self.ring else self._count
+
+    @property
+    def total(self):
+        """
+        Returns:
+        Total number of samples appended since the last clear (including overwritten ones)
+        """
+        return self._count
+
+    @property
+    def nbytes(self):
+        """
+        Returns:
+        Size of the preallocated buffer in bytes
+        """
+        return self._buffer.nbytes
+
+    def append(self, *values):
+        """
+        Appends one sample, the values are given in the order of the dtype fields
+
+        Args:
+        values: One value per field, e.g. timestamp, x, y, z, batterylevel
+        """
+        with self._lock:
+            if self.ring:
+                i = self._count % self.capacity
+                self._buffer[i] = values
+                self._buffer[i + self.capacity] = values
+            else:
+                if self._count == self.capacity:
+                    self._grow()
+                self._buffer[self._count] = values
+            self._count += 1
+
+    def extend(self, rows):
+        """
+        Appends several samples with one copy per buffer region, e.g. a frame read with `since`
+
+        Args:
+        rows: Structured array with the fields of the dtype
+        """
+        rows = np.asarray(rows).astype(self.dtype, copy=False)
+        with self._lock:
+            skipped = 0
+            if self.ring:
+                # Samples beyond the capacity would be overwritten by the same call
+                skipped = max(0, len(rows) - self.capacity)
+                rows = rows[skipped:]
+                n = len(rows)
+                i = (self._count + skipped) % self.capacity
+                # i + n <= 2 * capacity, so the rows are contiguous in the doubled buffer,
+                # then the other copy is written: above the capacity for the lower part, below for the rest
+                below = min(n, self.capacity - i)
+                self._buffer[i:i + n] = rows
+                self._buffer[i + self.capacity:i + self.capacity + below] = rows[:below]
+                self._buffer[:n - below] = rows[below:]
+            else:
+                n = len(rows)
+                while self._count + n > self.capacity:
+                    self._grow()
+                self._buffer[self._count:self._count + n] = rows
+            self._count += skipped + n
+
+    def _grow(self):
+        # Grow geometrically (at least one chunk) to keep appends amortized O(1)
+        new_capacity = self.capacity + max(self.chunk, self.capacity // 2)
+        buffer = np.zeros(new_capacity, dtype=self.dtype)
+        buffer[:self.capacity] = self._buffer
+        # Readers holding views on the old buffer keep a consistent snapshot
+        self._buffer = buffer
+        self.capacity = new_capacity
+
+    def _window(self, n):
+        # Returns the contiguous slice of the last n samples, the lock has to be held
+        if self.ring:
+            end = self._count % self.capacity + (self.capacity if self._count >= self.capacity else 0)
+        else:
+            end = self._count
+        return self._buffer[end - n:end]
+
+    def latest(self):
+        """
+        Returns:
+        A copy of the latest sample (numpy record), or None if the store is empty
+        """
+        with self._lock:
+            if self._count == 0:
+                return None
+            return self._window(1)[0].copy()
+
+    def last(self, n):
+        """
+        Returns a view of the last n samples (oldest first)
+
+        Args:
+        n: Number of samples, is clipped to the number of available samples
+
+        Returns:
+        Structured array view, columns are accessed by field name, e.g. store.last(10)['x']
+        """
+        with self._lock:
+            n = max(0, min(int(n), len(self)))
+            return self._window(n)
+
+    def since(self, count):
+        """
+        Returns the samples appended after the first `count` samples, to read the stream incrementally
+
+        Args:
+        count: Total number of samples already read (the total returned by the previous call)
+
+        Returns:
+        Tuple (view of the new samples, oldest first, current total). In ring mode samples that
+        were already overwritten are skipped.
+        """
+        with self._lock:
+            n = max(0, min(self._count - int(count), len(self)))
+            return self._window(n), self._count
+
+    def view(self):
+        """
+        Returns:
+        A view of all available samples (oldest first)
+        """
+        with self._lock:
+            return self._window(len(self))
+
+    def clear(self):
+        """
+        Drops all samples, the preallocated buffer is reused
+        """
+        with self._lock:
+            if not self.ring:
+                # Existing views must not see new samples, so hand out a fresh buffer
+                self._buffer = np.zeros(self.capacity, dtype=self.dtype)
+            self._count = 0
@@ -0,0 +1,287 @@
+import argparse
+import sys
+import time
+import numpy as np
+
+from telemetry import TELEMETRY_DTYPE, TelemetryStore
+
+LOG_PAYLOAD_SIZE = 26 # in bytes, data of one log packet (30 bytes CRTP payload - block id - timestamp)
+LOG_PACKET_OVERHEAD = 5 # in bytes, CRTP header, block id and 24 bit timestamp of every log packet
+# Size in bytes of the cflib log types
+TYPE_SIZES = {'uint8_t': 1, 'int8_t': 1, 'uint16_t': 2, 'int16_t': 2, 'FP16': 2,
+              'uint32_t': 4, 'int32_t': 4, 'float': 4}
+# Fields every profile has to deliver, the rest of the code (battery supervisor, log writer, state bus) uses them
+REQUIRED_FIELDS = tuple(name for name in TELEMETRY_DTYPE.names if name != 'timestamp')
+
+
+class TelemetryVariable:
+    """
+    One log variable of a telemetry profile
+    """
+
+    def __init__(self, name, fetch_as, field, period, scale=1.0):
+        """
+        Args:
+        name: Log variable, e.g. 'stateEstimateZ.x'
+        fetch_as: Type transmitted by the crazyflie, e.g. 'int16_t' or 'FP16' (the firmware converts)
+        field: Field of the telemetry store the value is unpacked into
+        period: Log period in ms
+        scale: Factor from the transmitted value to the field unit, e.g. 0.001 for mm to m
+        """
+        if fetch_as not in TYPE_SIZES:
+            raise ValueError(f"Unknown log type '{fetch_as}', choose from {', '.join(TYPE_SIZES)}")
+        if period < 10 or period > 2550 or period % 10:
+            raise ValueError(f"Log period of {name} has to be a multiple of 10 ms between 10 and 2550 ms")
+        self.name = name
+        self.fetch_as = fetch_as
+        self.field = field
+        self.period = int(period)
+        self.scale = scale
+
+    @property
+    def size(self):
+        return TYPE_SIZES[self.fetch_as]
+
+
+class TelemetryProfile:
+    """
+    Named set of log variables with compact types and individual periods.
+
+    The variables are grouped by period and packed into as few log blocks as fit into one packet
+    each. The samples are unpacked into one store row per sample of the fastest period, variables
+    of slower blocks hold their latest value.
+    """
+
+    def __init__(self, name, variables):
+        """
+        Args:
+        name: Name of the profile, also the prefix of the log block names
+        variables: List of TelemetryVariable, has to cover x, y, z and batterylevel
+        """
+        fields = [variable.field for variable in variables]
+        missing = [field for field in REQUIRED_FIELDS if field not in fields]
+        if missing:
+            raise ValueError(f"Telemetry profile {name} misses the fields {', '.join(missing)}")
+        if len(set(fields)) != len(fields):
+            raise ValueError(f"Telemetry profile {name} unpacks several variables into the same field")
+        self.name = name
+        self.variables = list(variables)
+        extra = [(field, np.float32) for field in fields if field not in REQUIRED_FIELDS]
+        self.dtype = np.dtype(TELEMETRY_DTYPE.descr + extra)
+        self.blocks = self._pack_blocks()
+
+    def _pack_blocks(self):
+        # First fit per period, in the order of the variables, fastest period first
+        blocks = list()
+        for period in sorted({variable.period for variable in self.variables}):
+            packed = list()
+            for variable in (v for v in self.variables if v.period == period):
+                block = next((b for b in packed if sum(v.size for v in b) + variable.size <= LOG_PAYLOAD_SIZE), None)
+                if block is None:
+                    block = list()
+                    packed.append(block)
+                block.append(variable)
+            blocks += [(f"{self.name}_{period}ms_{i}", period, block) for i, block in enumerate(packed)]
+        return blocks
+
+    @property
+    def period(self):
+        """
+        Returns:
+        Period of the store rows in ms (the fastest log period)
+        """
+        return self.blocks[0][1]
+
+    def create_store(self, capacity, ring=False):
+        return TelemetryStore(capacity=capacity, ring=ring, dtype=self.dtype)
+
+    def bandwidth(self):
+        """
+        Returns:
+        List with one dictionary per log block: name, period in ms, variables, data bytes, packet bytes/s
+        """
+        return [{
+            'name': name,
+            'period': period,
+            'variables': len(variables),
+            'bytes': sum(v.size for v in variables),
+            'bytes_per_second': (sum(v.size for v in variables) + LOG_PACKET_OVERHEAD) * 1000 / period,
+        } for name, period, variables in self.blocks]
+
+    def bytes_per_second(self):
+        return sum(block['bytes_per_second'] for block in self.bandwidth())
+
+    def report(self):
+        lines = [f"{self.name}: {len(self.variables)} variables in {len(self.blocks)} blocks, {self.bytes_per_second():.0f} bytes/s"]
+        for block in self.bandwidth():
+            lines.append(f"    {block['name']:<24}{1000 / block['period']:>6.1f} Hz {block['variables']:>3} variables "
+                         f"{block['bytes']:>3} bytes {block['bytes_per_second']:>7.0f} bytes/s")
+        return "\n".join(lines)
+
+
+class ProfileLogger:
+    """
+    Log blocks of a telemetry profile on one crazyflie, replaces a single LogConfig (same start/stop).
+
+    The callback gets one tuple per row in the order of the profile dtype (timestamp, x, y, z,
+    batterylevel, extra fields). Rows are emitted on the last block of the fastest period, once every
+    block delivered a first sample. Variables of slower blocks repeat their held value in these rows,
+    consumers of fresh samples only (e.g. the battery supervisor) are registered as field callbacks.
+    """
+
+    def __init__(self, profile, cf, callback, field_callbacks=None):
+        """
+        Args:
+        profile: TelemetryProfile
+        cf: Connected Crazyflie
+        callback: Called with every row, from the receive thread of the link
+        field_callbacks: Dictionary field -> callable(timestamp, value), called with every packet of
+        the block carrying the field, e.g. {'batterylevel': supervisor.update}
+        """
+        from cflib.crazyflie.log import LogConfig
+        self.profile = profile
+        self.callback = callback
+        self.configs = list()
+        self.packets = dict()
+        self._values = [0] * len(profile.dtype.names)
+        self._unpack = dict()
+        self._field_callbacks = dict()
+        self._waiting = set()
+        self._trigger = [name for name, period, _ in profile.blocks if period == profile.period][-1]
+        for name, period, variables in profile.blocks:
+            config = LogConfig(name=name, period_in_ms=period)
+            for variable in variables:
+                config.add_variable(variable.name, variable.fetch_as)
+            cf.log.add_config(config)
+            config.data_received_cb.add_callback(self._block_callback)
+            self.configs.append(config)
+            self.packets[name] = 0
+            self._unpack[name] = [(v.name, profile.dtype.names.index(v.field), v.scale) for v in variables]
+            self._field_callbacks[name] = [(field_callbacks[v.field], profile.dtype.names.index(v.field))
+                                           for v in variables if field_callbacks and v.field in field_callbacks]
+        self._start_time = None
+        self._elapsed = 0.0
+
+    def _block_callback(self, timestamp, data, logconf):
+        name = logconf.name
+        self.packets[name] += 1
+        values = self._values
+        for variable, index, scale in self._unpack[name]:
+            values[index] = data[variable] * scale
+        for field_callback, index in self._field_callbacks[name]:
+            field_callback(timestamp, values[index])
+        if self._waiting:
+            self._waiting.discard(name)
+            if self._waiting:
+                return
+        if name == self._trigger:
+            values[0] = timestamp
+            self.callback(tuple(values))
+
+    @property
+    def started(self):
+        return any(config.started for config in self.configs)
+
+    def start(self):
+        self._waiting = set(self.packets)
+        self._start_time = time.perf_counter()
+        for config in self.configs:
+            config.start()
+
+    def stop(self):
+        for config in self.configs:
+            config.stop()
+        if self._start_time is not None:
+            self._elapsed += time.perf_counter() - self._start_time
+            self._start_time = None
+
+    def measured_bytes_per_second(self):
+        """
+        Returns:
+        Received log bytes/s (including the packet overhead) over the time the blocks were started
+        """
+        elapsed = self._elapsed + (time.perf_counter() - self._start_time if self._start_time is not None else 0.0)
+        if elapsed <= 0:
+            return 0.0
+        sizes = {block['name']: block['bytes'] + LOG_PACKET_OVERHEAD for block in self.profile.bandwidth()}
+        return sum(self.packets[name] * sizes[name] for name in self.packets) / elapsed
+
+
+PROFILES = {profile.name: profile for profile in (
+    # The original 'Position' block: four floats at 100 Hz
+    TelemetryProfile('position', [
+        TelemetryVariable('stateEstimate.x', 'float', 'x', 10),
+        TelemetryVariable('stateEstimate.y', 'float', 'y', 10),
+        TelemetryVariable('stateEstimate.z', 'float', 'z', 10),
+        TelemetryVariable('pm.vbat', 'float', 'batterylevel', 10),
+    ]),
+    # Pose and velocity as int16 in mm and mm/s, yaw as FP16 at 100 Hz, battery voltage at 10 Hz
+    # (the supervisor needs two samples in a row to land), battery percentage at 2 Hz
+    TelemetryProfile('compact', [
+        TelemetryVariable('stateEstimateZ.x', 'int16_t', 'x', 10, 0.001),
+        TelemetryVariable('stateEstimateZ.y', 'int16_t', 'y', 10, 0.001),
+        TelemetryVariable('stateEstimateZ.z', 'int16_t', 'z', 10, 0.001),
+        TelemetryVariable('stateEstimateZ.vx', 'int16_t', 'vx', 10, 0.001),
+        TelemetryVariable('stateEstimateZ.vy', 'int16_t', 'vy', 10, 0.001),
+        TelemetryVariable('stateEstimateZ.vz', 'int16_t', 'vz', 10, 0.001),
+        TelemetryVariable('stateEstimate.yaw', 'FP16', 'yaw', 10),
+        TelemetryVariable('pm.vbatMV', 'uint16_t', 'batterylevel', 100, 0.001),
+        TelemetryVariable('pm.batteryLevel', 'uint8_t', 'battery_percent', 500),
+    ]),
+    # The same variables as floats, the pose does not fit into one packet any more
+    TelemetryProfile('float', [
+        TelemetryVariable('stateEstimate.x', 'float', 'x', 10),
+        TelemetryVariable('stateEstimate.y', 'float', 'y', 10),
+        TelemetryVariable('stateEstimate.z', 'float', 'z', 10),
+        TelemetryVariable('stateEstimate.vx', 'float', 'vx', 10),
+        TelemetryVariable('stateEstimate.vy', 'float', 'vy', 10),
+        TelemetryVariable('stateEstimate.vz', 'float', 'vz', 10),
+        TelemetryVariable('stateEstimate.yaw', 'float', 'yaw', 10),
+        TelemetryVariable('pm.vbat', 'float', 'batterylevel', 500),
+        TelemetryVariable('pm.batteryLevel', 'uint8_t', 'battery_percent', 500),
+    ]),
+)}
+
+
+def get_profile(name):
+    if name not in PROFILES:
+        raise ValueError(f"Unknown telemetry profile '{name}', choose from {', '.join(PROFILES)}")
+    return PROFILES[name]
+
+
+# Print the bandwidth of the profiles, optionally logging each of them from a crazyflie for a few seconds
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bandwidth of the telemetry profiles")
+    parser.add_argument('profiles', nargs='*', default=list(PROFILES))
+    parser.add_argument('--uri', default=None, help="log the profiles from this crazyflie, e.g. sim://profiles")
+    parser.add_argument('--duration', type=float, default=3, help="in s, logging time per profile")
+    args = parser.parse_args(argv)
+
+    profiles = [get_profile(name) for name in args.profiles]
+    for profile in profiles:
+        print(profile.report())
+    if args.uri is None:
+        return 0
+
+    import cflib.crtp
+    from cflib.crazyflie.syncCrazyflie import SyncCrazyflie
+    import connection
+    import sim_link
+    cflib.crtp.init_drivers()
+    sim_link.register()
+    with SyncCrazyflie(args.uri, cf=connection.crazyflie()) as scf:
+        for profile in profiles:
+            store = profile.create_store(int(args.duration * 1000 / profile.period) * 2, ring=True)
+            logger = ProfileLogger(profile, scf.cf, lambda row: store.append(*row))
+            logger.start()
+            time.sleep(args.duration)
+            logger.stop()
+            for config in logger.configs:
+                config.delete()
+            print(f"{profile.name}: {len(store)} rows, measured {logger.measured_bytes_per_second():.0f} bytes/s, "
+                  f"packets {', '.join(f'{name} {count}' for name, count in logger.packets.items())}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+from functools import lru_cache
+import os
+import numpy as np
+
+import cf_data
+
+TRACKING_TOLERANCE = 0.1 # in m
+MIN_HEIGHT = 0.3 # in m, samples below are treated as on the ground
+DEMO_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+CHUNK_ELEMENTS = 1 << 16 # number of point-segment pairs evaluated at once
+
+
+@lru_cache(maxsize=None)
+def _anchor_positions(loco_file):
+    # Every process loads each anchor setup file only once. Older logs store the path relative to
+    # the demos directory, where the demos were run from
+    if not os.path.isabs(loco_file):
+        loco_file = os.path.join(DEMO_DIRECTORY, loco_file)
+    return cf_data.obtain_anchor_positions(loco_file)
+
+
+def planned_path(flight):
+    """
+    Reconstructs the planned path of a flight from its metadata
+
+    Args:
+    flight: Flight object
+
+    Returns:
+    Array with the planned x, y positions, including the transit from the initial position to the
+    start of the trajectory and back, None if the path is not known (waypoints, unknown shapes)
+    """
+    if flight.param[0] != 2:
+        return None
+    x_init, y_init = cf_data.initial_position(_anchor_positions(flight.loco_file))
+    path = cf_data.planned_trajectory(flight.param[1], x_init, y_init)
+    if path is None:
+        return None
+    # The crazyflie takes off at the initial position and returns there before landing
+    return np.vstack(([x_init, y_init], path[:, :2], [x_init, y_init]))
+
+
+def distance_to_path(points, path):
+    """
+    Computes the distance of every point to the nearest segment of a polyline.
+    Vectorized over all point-segment pairs, evaluated in cache sized chunks with in-place operations.
+
+    Args:
+    points: Array (N, 2) of sample x, y positions
+    path: Array (M, 2) of planned x, y positions, consecutive points form the segments
+
+    Returns:
+    Array (N,) with the distances
+    """
+    points = np.asarray(points, dtype=float)
+    path = np.asarray(path, dtype=float)
+    if len(path) == 1:
+        return np.hypot(points[:, 0] - path[0, 0], points[:, 1] - path[0, 1])
+    sx, sy = path[:-1, 0], path[:-1, 1]
+    dx, dy = path[1:, 0] - sx, path[1:, 1] - sy
+    length2 = dx * dx + dy * dy
+    # Degenerated segments (repeated points) are treated as points
+    inverse_length2 = np.divide(1.0, length2, out=np.zeros_like(length2), where=length2 > 0)
+
+    distance2 = np.empty(len(points))
+    chunk = max(1, CHUNK_ELEMENTS // len(sx))
+    for i in range(0, len(points), chunk):
+        px = points[i:i + chunk, 0, None] - sx
+        py = points[i:i + chunk, 1, None] - sy
+        # Projection onto every segment, clipped to the segment
+        u = px * dx
+        u += py * dy
+        u *= inverse_length2
+        np.clip(u, 0.0, 1.0, out=u)
+        px -= u * dx
+        py -= u * dy
+        px *= px
+        py *= py
+        px += py
+        distance2[i:i + chunk] = px.min(axis=1)
+    return np.sqrt(distance2)
+
+
+def tracking_error(time, x, y, path, tolerance=TRACKING_TOLERANCE, z=None, min_height=MIN_HEIGHT):
+    """
+    Computes the tracking error of a flown path against the planned path
+
+    Args:
+    time: The time data in ms
+    x: The x position data
+    y: The y position data
+    path: Array (M, 2) of the planned x, y positions
+    tolerance: Distance in m, above which a sample is out of tolerance
+    z: The z position data, if given only samples above min_height are evaluated
+    min_height: Minimal height in m of the evaluated samples
+
+    Returns:
+    Dictionary with rms, p95 and max error in m, the time out of tolerance in s
+    and the fraction of samples out of tolerance
+    """
+    time = np.asarray(time, dtype=float) / 1000
+    points = np.column_stack((x, y)).astype(float)
+    if z is not None:
+        airborne = np.asarray(z, dtype=float) > min_height
+        time, points = time[airborne], points[airborne]
+    if len(points) == 0:
+        return {'rms': None, 'p95': None, 'max': None, 'time_out_of_tolerance': 0.0, 'fraction_out_of_tolerance': 0.0}
+
+    distance = distance_to_path(points, path)
+    out = distance > tolerance
+    # Every sample accounts for the time until the next one
+    dt = np.diff(time, append=time[-1])
+    return {
+        'rms': float(np.sqrt(np.mean(distance ** 2))),
+        'p95': float(np.percentile(distance, 95)),
+        'max': float(distance.max()),
+        'time_out_of_tolerance': float(dt[out].sum()),
+        'fraction_out_of_tolerance': float(out.mean()),
+    }
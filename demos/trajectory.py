@@ -0,0 +1,139 @@
+import os
+from functools import lru_cache
+import numpy as np
+
+TRAJECTORY_SPACING = 0.2 # in m, distance between two setpoints
+TRAJECTORY_SPEED = 0.5 # in m/s
+DENSE_SAMPLES = 4096 # samples of a shape before resampling
+
+
+# Parametric shapes, centered around the origin, sampled densely in parameter space
+def circle(radius=0.8, samples=DENSE_SAMPLES):
+    t = np.linspace(0, 2 * np.pi, samples)
+    return np.column_stack((radius * np.cos(t), radius * np.sin(t)))
+
+def ellipse(a=1.25, b=0.625, samples=DENSE_SAMPLES):
+    t = np.linspace(0, 2 * np.pi, samples)
+    return np.column_stack((a * np.cos(t), b * np.sin(t)))
+
+def lemniscate(a=0.8, samples=DENSE_SAMPLES):
+    # Lemniscate of Gerono (figure eight), crossing at the origin
+    t = np.linspace(0, 2 * np.pi, samples)
+    return np.column_stack((a * np.sin(t), a * np.sin(t) * np.cos(t)))
+
+def square(width=1.2, height=None, samples=DENSE_SAMPLES):
+    height = width if height is None else height
+    corners = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1], [-1, -1]]) * [width / 2, height / 2]
+    return corners
+
+def spline(waypoints, samples=DENSE_SAMPLES):
+    """
+    Catmull-Rom spline through the waypoints, vectorized over all segments
+
+    Args:
+    waypoints: Array (N, 2) of x, y positions, the spline passes through all of them
+    samples: Total number of samples of the spline
+    """
+    p = np.asarray(waypoints, dtype=float)[:, :2]
+    if len(p) < 2:
+        return p.copy()
+    # Duplicate the end points, so the spline passes through the first and last waypoint
+    p = np.vstack((p[0], p, p[-1]))
+    n = len(p) - 3
+    u = np.linspace(0, 1, max(2, samples // n), endpoint=False)[:, None, None]
+    p0, p1, p2, p3 = p[:-3], p[1:-2], p[2:-1], p[3:]
+    points = 0.5 * (2 * p1 + (p2 - p0) * u + (2 * p0 - 5 * p1 + 4 * p2 - p3) * u ** 2
+                    + (3 * p1 - p0 - 3 * p2 + p3) * u ** 3)
+    # (samples, segments, 2) -> segment by segment
+    return np.vstack((points.transpose(1, 0, 2).reshape(-1, 2), p[-2]))
+
+SHAPES = {
+    'circle': circle,
+    'ellipse': ellipse,
+    'eight': lemniscate,
+    'square': square,
+    'spline': spline,
+}
+
+
+def resample(path, spacing=TRAJECTORY_SPACING):
+    """
+    Resamples a path to (nearly) equidistant points along its arc length
+
+    Args:
+    path: Array (N, 2) of x, y positions
+    spacing: Target distance in m between two points
+
+    Returns:
+    points: Array (M, 2) of resampled positions, start and end point are kept
+    s: Array (M,) with the arc length of every point
+    """
+    path = np.asarray(path, dtype=float)
+    s = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(path, axis=0).T))))
+    length = s[-1]
+    if length == 0:
+        return path[:1].copy(), np.zeros(1)
+    # Spread the rest evenly, so the last interval is not shorter than the others
+    count = max(1, int(round(length / spacing)))
+    target = np.linspace(0, length, count + 1)
+    points = np.column_stack((np.interp(target, s, path[:, 0]), np.interp(target, s, path[:, 1])))
+    return points, target
+
+
+@lru_cache(maxsize=64)
+def _create(shape, center, spacing, speed, params):
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown trajectory shape '{shape}', choose from {', '.join(SHAPES)}")
+    kwargs = {k: (np.array(v) if isinstance(v, tuple) else v) for k, v in params}
+    points, s = resample(SHAPES[shape](**kwargs), spacing)
+    setpoints = np.column_stack((points + center, s / speed))
+    # The result is shared between callers of the cache
+    setpoints.flags.writeable = False
+    return setpoints
+
+
+def _freeze(value):
+    # Makes shape parameters hashable for the cache
+    if isinstance(value, (np.ndarray, list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def create(shape, center=(0.0, 0.0), spacing=TRAJECTORY_SPACING, speed=TRAJECTORY_SPEED, **params):
+    """
+    Creates a trajectory with setpoints evenly spaced along the path, memoized by its arguments
+
+    Args:
+    shape: One of SHAPES ('circle', 'ellipse', 'eight', 'square', 'spline')
+    center: Position (x, y) the shape is centered around (spline: added to the waypoints)
+    spacing: Distance in m between two setpoints
+    speed: Speed in m/s along the path, used for the time of the setpoints
+    params: Parameters of the shape, e.g. radius=0.8 or waypoints=[[0, 0], [1, 1]]
+
+    Returns:
+    Read-only array with one row per setpoint and columns x, y, t (time in s)
+    """
+    params = tuple(sorted((k, _freeze(v)) for k, v in params.items()))
+    return _create(shape, (float(center[0]), float(center[1])), float(spacing), float(speed), params)
+
+
+@lru_cache(maxsize=16)
+def _setup_center(loco_file, mtime_ns):
+    import cf_data
+    return cf_data.initial_position(cf_data.obtain_anchor_positions(loco_file))
+
+
+def create_for_setup(shape, loco_file, **kwargs):
+    """
+    Creates a trajectory centered in the flight area of an anchor setup, memoized by the setup file
+
+    Args:
+    shape: One of SHAPES
+    loco_file: The anchor setup file (YAML)
+    kwargs: Further arguments of create
+
+    Returns:
+    Read-only array with one row per setpoint and columns x, y, t (time in s)
+    """
+    center = _setup_center(str(loco_file), os.stat(loco_file).st_mtime_ns)
+    return create(shape, center, **kwargs)